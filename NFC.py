@@ -1,76 +1,164 @@
-import RPi.GPIO as GPIO
-from mfrc522 import SimpleMFRC522
 import time
 import csv
-from datetime import datetime
+from datetime import timedelta
 import os
 import sys
+import threading
+import queue
+import contextlib
+import io
+import socket
+
+import alta_masiva
+import almacen_sqlite
+import marcas_tiempo
+import metricas
+import recuperacion_estados
+from escritor_registros import EscritorRegistro
+from lectores import PUERTA_POR_DEFECTO, crear_lectores, liberar_gpio
+from particiones import EscritorParticionado
+from recarga_usuarios import VigilanteUsuarios
+from roster_usuarios import Roster, Usuario, cargar_usuarios, construir_indices
 
 # --- Configuraciones de Archivos (TODOS CSV) ---
 ARCHIVO_USUARIOS = "usuarios.csv"
 ARCHIVO_ESTADOS = "estados.csv"       # Almacena el estado y la hora de la última ENTRADA
 ARCHIVO_ACCESOS = "registro_accesos.csv" # Log de todos los eventos (ENTRADA/SALIDA)
 ARCHIVO_TIEMPOS = "registro_tiempos.csv" # Log de permanencia (Entrada -> Salida)
+ARCHIVO_DIARIO_ESTADOS = "estados_diario.csv" # Diario (append-only) de cambios de estado desde el último snapshot
+
+# Encabezados de los archivos CSV
+ENCABEZADOS = {
+    ARCHIVO_USUARIOS: ['UID', 'Nombre', 'Matricula'],
+    ARCHIVO_ESTADOS: ['UID', 'Estado', 'Ultima_Entrada_Timestamp'],
+    ARCHIVO_ACCESOS: ['Timestamp', 'Matricula', 'Nombre', 'Evento', 'Puerta'],
+    # ¡ENCABEZADO MODIFICADO! Ahora incluye Horas, Minutos, Segundos separados
+    ARCHIVO_TIEMPOS: ['Timestamp_Salida', 'Matricula', 'Nombre', 'Horas', 'Minutos', 'Segundos']
+}
+
+# --- Motor de Almacenamiento ---
+# "csv": archivos CSV de arriba | "sqlite": base de datos en modo WAL (ver almacen_sqlite.py)
+MOTOR_ALMACENAMIENTO = os.environ.get("NFC_ALMACEN", "csv").lower()
+
+# --- Configuración del Diario de Estados ---
+UMBRAL_COMPACTACION = 500  # Registros en el diario antes de compactarlo en ESTADOS.CSV
+HORIZONTE_RECUPERACION = timedelta(days=31)  # Al reconstruir estados desde el registro de accesos,
+                                             # quien no aparece en este periodo se considera fuera
+
+# --- Escritura de Registros (ver escritor_registros.py) ---
+POLITICA_FSYNC = os.environ.get("NFC_FSYNC", "lote")  # "ninguno" | "lote" | "evento"
+MAX_FILAS_LOTE = 32        # Filas acumuladas antes de volcar un lote con un único write()
+MAX_ESPERA_LOTE = 1.0      # Segundos máximos que una fila espera en memoria antes de volcarse
+
+# --- Particionado de Registros (ver particiones.py) ---
+# "ninguno": un único archivo por registro | "diario" / "mensual": una partición por periodo
+PARTICIONADO_REGISTROS = os.environ.get("NFC_PARTICIONES", "ninguno").lower()
+COMPRIMIR_PARTICIONES = True       # Comprimir (gzip) las particiones cerradas al rotar
+DIRECTORIO_PARTICIONES = "registros" # registros/registro_accesos/, registros/registro_tiempos/
+
+# --- Configuración del Lector de Control ---
+MODO_PIPELINE = True       # True: hilo lector + hilo procesador; False: lectura y registro en serie
+VENTANA_REBOTE = 3.0       # Segundos en los que se ignoran relecturas de la MISMA tarjeta
+MAX_LECTURAS_REBOTE = 1024 # Entradas en ULTIMAS_LECTURAS antes de purgar las caducadas
+
+# --- Recarga en Caliente de Usuarios ---
+RECARGA_AUTOMATICA = True  # Vigilar usuarios.csv y aplicar altas/bajas/cambios sin reiniciar
+
+# --- Búsqueda de Usuarios (índices del Roster; ver roster_usuarios.py) ---
+LIMITE_BUSQUEDA = 20       # Resultados máximos que se muestran por búsqueda de nombre
+
+# --- Servicio de Ocupación en Vivo (ver servicio_ocupacion.py) ---
+DIRECCION_OCUPACION = os.environ.get("NFC_OCUPACION", "127.0.0.1:8765")  # "host:puerto" | "no"
+
+# --- Métricas del Lector de Control (ver metricas.py) ---
+METRICAS_ACTIVAS = os.environ.get("NFC_METRICAS", "0") == "1"  # Desactivadas: coste despreciable por tap
+ARCHIVO_METRICAS = "metricas.prom"  # Texto de Prometheus (textfile collector); también en /metrics
+INTERVALO_METRICAS = 60.0           # Segundos entre escrituras del archivo y líneas de resumen
+
+# --- Sincronización con el Colector Central (ver sincronizacion.py) ---
+URL_COLECTOR = os.environ.get("NFC_COLECTOR", "")  # "http://host:puerto/eventos" | "" (desactivada)
+ID_DISPOSITIVO = os.environ.get("NFC_DISPOSITIVO", socket.gethostname())  # Identifica este lector en el colector
+ARCHIVO_BANDEJA = "bandeja_salida.db"  # Eventos aún no confirmados por el colector (sincronizacion.ARCHIVO_BANDEJA)
 
 # --- Estructuras Globales ---
-USUARIOS = {}          # UID: {'nombre': '', 'matricula': ''}
-ESTADOS_ACCESO = {}    # UID: {'estado': 'ENTRADA'/'SALIDA', 'ultima_entrada': 'YYYY-MM-DD HH:MM:SS'}
+USUARIOS = Roster()    # UID: Usuario(nombre, matricula) -> admite usuario['nombre'] (ver roster_usuarios.py)
+ESTADOS_ACCESO = {}    # UID: {'estado': 'ENTRADA'/'SALIDA', 'ultima_entrada': epoch o None} (ver marcas_tiempo.py)
+REGISTROS_DIARIO = 0   # Registros escritos en el diario desde la última compactación
+ULTIMAS_LECTURAS = {}  # UID: instante (time.monotonic()) de la última lectura aceptada
+CERROJO_REBOTE = threading.Lock()
+CERROJO_USUARIOS = threading.RLock()  # Protege USUARIOS/ESTADOS_ACCESO frente a recargas en caliente
+VIGILANTE_USUARIOS = None             # VigilanteUsuarios activo (ver recarga_usuarios.py)
+INDEXADOR_USUARIOS = None             # Hilo que construye los índices de búsqueda del roster tras cargarlo
+PRESENTES = {}                        # UID: {'nombre', 'matricula', 'entrada' (epoch), 'puerta'} de quien está dentro
+SERVICIO_OCUPACION = None             # ServicioOcupacion activo
+EXPORTADOR_METRICAS = None            # ExportadorMetricas activo (sólo con METRICAS_ACTIVAS)
+SINCRONIZADOR = None                  # Sincronizador activo (sólo con URL_COLECTOR)
+ESCRITORES = {}                       # Ruta: EscritorRegistro abierto (diario, accesos, tiempos)
 
-# Crea una instancia del lector
-reader = SimpleMFRC522()
+# Lectores por puerta (se abren en el arranque con crear_lectores(); ver lectores.py).
+# Todos comparten la cola, el hilo procesador, ESTADOS_ACCESO y los escritores.
+LECTORES = {}  # Puerta: lector
+ESPERA_LECTOR = 0.2  # Segundos máximos que un hilo lector espera la IRQ antes de revisar si debe parar
+reader = None  # Lector de la primera puerta (altas de tarjetas y modo en serie)
 
 # ==============================================================================
 # 1. GESTIÓN DE ARCHIVOS Y DATOS
 # ==============================================================================
 
 def inicializar_archivos():
-    """Asegura que los archivos CSV existan y tengan encabezados."""
-    
-    # Definición de encabezados para los archivos CSV
-    archivos_config = {
-        ARCHIVO_USUARIOS: ['UID', 'Nombre', 'Matricula'],
-        ARCHIVO_ESTADOS: ['UID', 'Estado', 'Ultima_Entrada_Timestamp'],
-        ARCHIVO_ACCESOS: ['Timestamp', 'Matricula', 'Nombre', 'Evento'],
-        # ¡ENCABEZADO MODIFICADO! Ahora incluye Horas, Minutos, Segundos separados
-        ARCHIVO_TIEMPOS: ['Timestamp_Salida', 'Matricula', 'Nombre', 'Horas', 'Minutos', 'Segundos']
-    }
-    
-    for nombre_archivo, encabezados in archivos_config.items():
+    """Asegura que los archivos CSV (o la base de datos SQLite) existan y tengan encabezados."""
+    if MOTOR_ALMACENAMIENTO == 'sqlite':
+        almacen_sqlite.conectar()
+        return
+
+    for nombre_archivo, encabezados in ENCABEZADOS.items():
+        if registro_particionado(nombre_archivo):
+            continue  # Sus particiones se crean (con encabezados) al escribir la primera fila
+        if nombre_archivo == ARCHIVO_ESTADOS:
+            continue  # Lo crea cargar_datos(): un snapshot que falta debe detectarse, no rellenarse vacío
         if not os.path.exists(nombre_archivo):
             with open(nombre_archivo, mode='w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
                 writer.writerow(encabezados)
 
 def cargar_datos():
-    """Carga los usuarios y sus estados actuales de los CSV."""
+    """Carga los usuarios y reconstruye sus estados (snapshot + diario) de los CSV."""
     global USUARIOS, ESTADOS_ACCESO
     USUARIOS.clear()
     ESTADOS_ACCESO.clear()
     
     try:
-        # Cargar USUARIOS.CSV
-        with open(ARCHIVO_USUARIOS, mode='r', newline='', encoding='utf-8') as f:
-            lector_csv = csv.reader(f)
-            next(lector_csv) 
-            for uid, nombre, matricula in lector_csv:
-                try:
-                    USUARIOS[int(uid)] = {'nombre': nombre.strip(), 'matricula': matricula.strip()}
-                except ValueError:
-                    continue
-
-        # Cargar ESTADOS.CSV
-        with open(ARCHIVO_ESTADOS, mode='r', newline='', encoding='utf-8') as f:
-            lector_csv = csv.reader(f)
-            next(lector_csv) 
-            # El estado ahora tiene 3 columnas: UID, Estado, Ultima_Entrada_Timestamp
-            for fila in lector_csv:
-                if len(fila) >= 3:
-                    uid, estado, timestamp = fila
-                    try:
-                        ESTADOS_ACCESO[int(uid)] = {'estado': estado.strip(), 'ultima_entrada': timestamp.strip()}
-                    except ValueError:
-                        continue
-                    
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            almacen_sqlite.cargar(USUARIOS, ESTADOS_ACCESO)
+            reconstruir_presentes()
+            iniciar_indices_usuarios()
+            print(f"Sistema inicializado: {len(USUARIOS)} usuarios cargados (SQLite).")
+            return True
+
+        # Cargar USUARIOS.CSV (a través de su caché binaria; ver roster_usuarios.py)
+        USUARIOS.update(cargar_usuarios(ARCHIVO_USUARIOS))
+
+        # Cargar ESTADOS.CSV y aplicar el DIARIO encima del snapshot
+        # (también descarta un posible registro truncado al final)
+        hay_snapshot = os.path.exists(ARCHIVO_ESTADOS)
+        consistente = cargar_snapshot_estados()
+        aplicar_diario_estados()
+
+        # Sin snapshot y sin eventos registrados: instalación nueva, no hay nada que recuperar
+        if not hay_snapshot and not recuperacion_estados.hay_eventos(*fuentes_registro_accesos()):
+            consistente = True
+        # Sin estados pero con eventos registrados: el snapshot se perdió
+        elif not ESTADOS_ACCESO and recuperacion_estados.hay_eventos(*fuentes_registro_accesos()):
+            consistente = False
+
+        if not consistente:
+            recuperar_estados()
+        elif not hay_snapshot or (os.path.exists(ARCHIVO_DIARIO_ESTADOS)
+                                  and os.path.getsize(ARCHIVO_DIARIO_ESTADOS) > 0):
+            guardar_estados()
+
+        reconstruir_presentes()
+        iniciar_indices_usuarios()
         print(f"Sistema inicializado: {len(USUARIOS)} usuarios cargados.")
         return True
     
@@ -78,42 +166,375 @@ def cargar_datos():
         print(f"*** ERROR al cargar datos: {e}")
         return False
 
+def cargar_roster():
+    """
+    Carga sólo USUARIOS, sin leer ni compactar estados: para herramientas
+    (alta_masiva.py) que pueden ejecutarse mientras el proceso de la puerta
+    sigue escribiendo estados.csv y el diario.
+    """
+    USUARIOS.clear()
+    if MOTOR_ALMACENAMIENTO == 'sqlite':
+        almacen_sqlite.cargar(USUARIOS, {})
+    else:
+        USUARIOS.update(cargar_usuarios(ARCHIVO_USUARIOS))
+
+def indexar_usuarios():
+    """
+    Construye los índices de búsqueda del roster (ver roster_usuarios.py).
+    Sólo la copia de las columnas y la instalación toman CERROJO_USUARIOS: la
+    construcción (~1 s con 100k usuarios) no detiene los taps.
+    """
+    with CERROJO_USUARIOS:
+        copia = USUARIOS.copiar_para_indices()
+    indices = construir_indices(*copia)
+    with CERROJO_USUARIOS:
+        USUARIOS.instalar_indices(copia, indices)
+
+def iniciar_indices_usuarios():
+    global INDEXADOR_USUARIOS
+    INDEXADOR_USUARIOS = threading.Thread(target=indexar_usuarios, daemon=True)
+    INDEXADOR_USUARIOS.start()
+
+def esperar_indices_usuarios():
+    """
+    Espera (sin CERROJO_USUARIOS) a que los índices estén listos. Las búsquedas
+    la llaman antes de tomar el cerrojo: si no, los construirían bajo él.
+    """
+    if INDEXADOR_USUARIOS is not None:
+        INDEXADOR_USUARIOS.join()
+
+def reconstruir_presentes():
+    """
+    Rellena PRESENTES desde ESTADOS_ACCESO. Sólo al cargar los datos: después
+    procesar_tarjeta() y las recargas del roster lo mantienen al día.
+    """
+    PRESENTES.clear()
+    for uid, data in ESTADOS_ACCESO.items():
+        usuario = USUARIOS.get(uid)
+        if data['estado'] == 'ENTRADA' and usuario is not None:
+            PRESENTES[uid] = {'nombre': usuario.nombre, 'matricula': usuario.matricula,
+                              'entrada': data['ultima_entrada'], 'puerta': ''}
+
+def cargar_snapshot_estados():
+    """
+    Carga ESTADOS.CSV en ESTADOS_ACCESO. Devuelve False si el archivo falta o
+    está dañado (encabezado incorrecto, fila incompleta o con valores inválidos).
+    """
+    try:
+        with open(ARCHIVO_ESTADOS, mode='rb') as f:
+            contenido = f.read()
+        texto = contenido.decode('utf-8')
+    except (OSError, UnicodeDecodeError):
+        return False
+    if not texto.endswith('\n'):
+        return False  # Vacío o cortado a mitad de una fila
+
+    lector_csv = csv.reader(io.StringIO(texto, newline=''))
+    if next(lector_csv, None) != ENCABEZADOS[ARCHIVO_ESTADOS]:
+        return False
+    # El estado tiene 3 columnas: UID, Estado, Ultima_Entrada_Timestamp
+    for fila in lector_csv:
+        if len(fila) != 3:
+            return False
+        uid, estado, timestamp = (campo.strip() for campo in fila)
+        entrada = marcas_tiempo.a_epoch(timestamp)  # Acepta también el formato de texto anterior
+        if estado not in ('ENTRADA', 'SALIDA') or (estado == 'ENTRADA' and entrada is None):
+            return False
+        try:
+            ESTADOS_ACCESO[int(uid)] = {'estado': estado, 'ultima_entrada': entrada}
+        except ValueError:
+            return False
+    return True
+
+def fuentes_registro_accesos():
+    """(archivo, directorio de particiones) del registro de accesos para recuperacion_estados.py."""
+    directorio = directorio_particiones(ARCHIVO_ACCESOS) if registro_particionado(ARCHIVO_ACCESOS) else None
+    return ARCHIVO_ACCESOS, directorio
+
+def recuperar_estados():
+    """
+    Reconstruye ESTADOS_ACCESO desde el final del registro de accesos (ver
+    recuperacion_estados.py) y escribe un snapshot nuevo. Los estados que sí
+    se pudieron leer se conservan para los usuarios sin eventos recientes.
+    """
+    print(f"*** ADVERTENCIA: '{ARCHIVO_ESTADOS}' falta o está dañado. Reconstruyendo estados "
+          f"desde el registro de accesos...")
+    inicio = time.perf_counter()
+    recuperados, filas = recuperacion_estados.recuperar_estados(
+        USUARIOS, *fuentes_registro_accesos(), horizonte=HORIZONTE_RECUPERACION)
+    ESTADOS_ACCESO.update(recuperados)
+    guardar_estados()
+    dentro = sum(1 for data in ESTADOS_ACCESO.values() if data['estado'] == 'ENTRADA')
+    print(f"   -> {len(recuperados)} estados recuperados ({dentro} dentro) leyendo {filas} filas "
+          f"en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+def registro_particionado(ruta):
+    """True si el registro se reparte en particiones por tiempo (sólo accesos y tiempos)."""
+    return PARTICIONADO_REGISTROS != "ninguno" and ruta in (ARCHIVO_ACCESOS, ARCHIVO_TIEMPOS)
+
+def directorio_particiones(ruta):
+    """'registro_accesos.csv' -> 'registros/registro_accesos'."""
+    return os.path.join(DIRECTORIO_PARTICIONES, os.path.splitext(os.path.basename(ruta))[0])
+
+def obtener_escritor(ruta):
+    """Devuelve el escritor persistente de un registro, abriéndolo la primera vez."""
+    escritor = ESCRITORES.get(ruta)
+    if escritor is None:
+        opciones = dict(max_filas=MAX_FILAS_LOTE, max_espera=MAX_ESPERA_LOTE, politica_fsync=POLITICA_FSYNC)
+        if registro_particionado(ruta):
+            escritor = EscritorParticionado(directorio_particiones(ruta), ENCABEZADOS[ruta],
+                                            PARTICIONADO_REGISTROS, COMPRIMIR_PARTICIONES, **opciones)
+        else:
+            escritor = EscritorRegistro(ruta, **opciones)
+        ESCRITORES[ruta] = escritor
+    return escritor
+
+def cerrar_escritores():
+    """Vuelca los lotes pendientes y cierra todos los registros abiertos."""
+    for escritor in ESCRITORES.values():
+        try:
+            escritor.cerrar()
+        except OSError as e:
+            print(f"*** ERROR al cerrar el registro '{escritor.ruta}': {e}")
+    ESCRITORES.clear()
+
+def leer_diario_estados():
+    """
+    Devuelve los registros completos del diario de estados como filas
+    [UID, Estado, Ultima_Entrada_Timestamp]. Un último registro truncado
+    (p. ej. por un corte de luz a mitad de escritura) se descarta.
+    """
+    if not os.path.exists(ARCHIVO_DIARIO_ESTADOS):
+        return []
+
+    filas = []
+    with open(ARCHIVO_DIARIO_ESTADOS, mode='r', newline='', encoding='utf-8') as f:
+        for linea in f:
+            # Sólo se aceptan registros terminados en salto de línea
+            if not linea.endswith('\n'):
+                break
+            fila = next(csv.reader([linea]), [])
+            if len(fila) == 3:
+                filas.append(fila)
+    return filas
+
+def aplicar_diario_estados():
+    """Reaplica el diario sobre ESTADOS_ACCESO. Devuelve el número de registros leídos."""
+    registros = 0
+    for uid, estado, timestamp in leer_diario_estados():
+        try:
+            ESTADOS_ACCESO[int(uid)] = {'estado': estado.strip(), 'ultima_entrada': marcas_tiempo.a_epoch(timestamp)}
+        except ValueError:
+            continue
+        registros += 1
+    return registros
+
+def guardar_estado(uid):
+    """Añade al diario el estado actual de un único UID (O(1) por cambio de estado)."""
+    global REGISTROS_DIARIO
+    data = ESTADOS_ACCESO[uid]
+    try:
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            with metricas.etapa('diario_estados'):
+                almacen_sqlite.guardar_estado(uid, data['estado'], data['ultima_entrada'])
+            return
+
+        with metricas.etapa('diario_estados'):
+            obtener_escritor(ARCHIVO_DIARIO_ESTADOS).escribir([uid, data['estado'], data['ultima_entrada']])
+        REGISTROS_DIARIO += 1
+    except Exception as e:
+        metricas.contar('errores_io')
+        print(f"*** ERROR al escribir en el diario de estados: {e}")
+        return
+
+    if REGISTROS_DIARIO >= UMBRAL_COMPACTACION:
+        guardar_estados()
+
 def guardar_estados():
-    """Guarda el diccionario ESTADOS_ACCESO al archivo ESTADOS.CSV."""
+    """
+    Compacta ESTADOS_ACCESO en ESTADOS.CSV (snapshot) y vacía el diario.
+    El snapshot se escribe en un temporal y se renombra de forma atómica.
+    """
+    global REGISTROS_DIARIO
+    temporal = ARCHIVO_ESTADOS + ".tmp"
     try:
-        with open(ARCHIVO_ESTADOS, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['UID', 'Estado', 'Ultima_Entrada_Timestamp'])
-            for uid, data in ESTADOS_ACCESO.items():
-                writer.writerow([uid, data['estado'], data['ultima_entrada']])
+        with metricas.etapa('compactacion'):
+            if MOTOR_ALMACENAMIENTO == 'sqlite':
+                almacen_sqlite.guardar_estados(ESTADOS_ACCESO)
+                return
+
+            with open(temporal, mode='w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['UID', 'Estado', 'Ultima_Entrada_Timestamp'])
+                for uid, data in ESTADOS_ACCESO.items():
+                    writer.writerow([uid, data['estado'], data['ultima_entrada']])
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, ARCHIVO_ESTADOS)
+
+            # El snapshot ya contiene todo lo del diario (incluso lo aún no volcado): se puede vaciar
+            obtener_escritor(ARCHIVO_DIARIO_ESTADOS).truncar()
+            REGISTROS_DIARIO = 0
     except Exception as e:
+        metricas.contar('errores_io')
         print(f"*** ERROR al guardar estados: {e}")
         
-def registrar_evento_acceso(datos_usuario, evento):
-    """Guarda el evento (ENTRADA/SALIDA) en el log de accesos (CSV)."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def registrar_evento_acceso(datos_usuario, evento, puerta=PUERTA_POR_DEFECTO):
+    """Guarda el evento (ENTRADA/SALIDA) y la puerta donde ocurrió en el log de accesos (CSV)."""
+    timestamp = marcas_tiempo.ahora()
+    if SINCRONIZADOR is not None:
+        SINCRONIZADOR.encolar('acceso', {'timestamp': timestamp, 'matricula': datos_usuario['matricula'],
+                                         'nombre': datos_usuario['nombre'], 'evento': evento, 'puerta': puerta})
     
     try:
-        with open(ARCHIVO_ACCESOS, mode='a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([timestamp, datos_usuario['matricula'], datos_usuario['nombre'], evento])
-        print(f"   -> Evento {evento} REGISTRADO en '{ARCHIVO_ACCESOS}'")
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            with metricas.etapa('registro_accesos'):
+                almacen_sqlite.registrar_evento(timestamp, datos_usuario, evento, puerta)
+            print(f"   -> Evento {evento} REGISTRADO en '{almacen_sqlite.ARCHIVO_BD}'")
+            return
+
+        escritor = obtener_escritor(ARCHIVO_ACCESOS)
+        with metricas.etapa('registro_accesos'):
+            escritor.escribir([timestamp, datos_usuario['matricula'], datos_usuario['nombre'], evento, puerta])
+        print(f"   -> Evento {evento} REGISTRADO en '{escritor.ruta}' (puerta {puerta})")
     except IOError as e:
+        metricas.contar('errores_io')
         print(f"*** ERROR al escribir en el archivo de accesos: {e}")
+    except almacen_sqlite.sqlite3.Error as e:
+        metricas.contar('errores_io')
+        print(f"*** ERROR al escribir en la base de datos de accesos: {e}")
 
 def registrar_tiempo_permanencia(datos_usuario, horas, minutos, segundos):
     """Guarda los componentes de tiempo en el log de tiempos (CSV)."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    timestamp = marcas_tiempo.ahora()
+    if SINCRONIZADOR is not None:
+        SINCRONIZADOR.encolar('tiempo', {'timestamp': timestamp, 'matricula': datos_usuario['matricula'],
+                                         'nombre': datos_usuario['nombre'],
+                                         'horas': horas, 'minutos': minutos, 'segundos': segundos})
     
     try:
-        with open(ARCHIVO_TIEMPOS, mode='a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            # Escribir la fila con los componentes de tiempo separados
-            writer.writerow([timestamp, datos_usuario['matricula'], datos_usuario['nombre'], 
-                             horas, minutos, segundos])
-        print(f"   -> Tiempo de permanencia GUARDADO en '{ARCHIVO_TIEMPOS}'")
+        if MOTOR_ALMACENAMIENTO == 'sqlite':
+            with metricas.etapa('registro_tiempos'):
+                almacen_sqlite.registrar_tiempo(timestamp, datos_usuario, horas, minutos, segundos)
+            print(f"   -> Tiempo de permanencia GUARDADO en '{almacen_sqlite.ARCHIVO_BD}'")
+            return
+
+        # Escribir la fila con los componentes de tiempo separados
+        escritor = obtener_escritor(ARCHIVO_TIEMPOS)
+        with metricas.etapa('registro_tiempos'):
+            escritor.escribir([timestamp, datos_usuario['matricula'], datos_usuario['nombre'], horas, minutos, segundos])
+        print(f"   -> Tiempo de permanencia GUARDADO en '{escritor.ruta}'")
     except IOError as e:
+        metricas.contar('errores_io')
         print(f"*** ERROR al escribir en el archivo de tiempos: {e}")
+    except almacen_sqlite.sqlite3.Error as e:
+        metricas.contar('errores_io')
+        print(f"*** ERROR al escribir en la base de datos de tiempos: {e}")
+
+def guardar_usuario(uid, nombre, matricula):
+    """Añade un usuario al almacenamiento activo (usuarios.csv o SQLite)."""
+    if MOTOR_ALMACENAMIENTO == 'sqlite':
+        almacen_sqlite.guardar_usuario(uid, nombre, matricula)
+        return
+
+    with open(ARCHIVO_USUARIOS, mode='a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([uid, nombre, matricula])
+
+def guardar_usuarios(filas):
+    """Añade varios usuarios [(uid, nombre, matricula)] con una sola escritura (o transacción)."""
+    if MOTOR_ALMACENAMIENTO == 'sqlite':
+        almacen_sqlite.guardar_usuarios(filas)
+        return
+
+    with open(ARCHIVO_USUARIOS, mode='a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerows(filas)
+
+def aplicar_cambios_usuarios(cambios, bajas):
+    """
+    Aplica al roster en memoria sólo las filas añadidas/modificadas y las bajas.
+    Se hace bajo CERROJO_USUARIOS, así que un tap nunca ve un roster a medias.
+    """
+    with CERROJO_USUARIOS:
+        for uid, usuario in cambios.items():
+            USUARIOS[uid] = usuario
+            ESTADOS_ACCESO.setdefault(uid, {'estado': 'SALIDA', 'ultima_entrada': None})
+            if uid in PRESENTES:
+                PRESENTES[uid] = dict(PRESENTES[uid], nombre=usuario.nombre, matricula=usuario.matricula)
+        for uid in bajas:
+            if uid in USUARIOS:
+                del USUARIOS[uid]
+            ESTADOS_ACCESO.pop(uid, None)
+            PRESENTES.pop(uid, None)
+
+    if cambios or bajas:
+        print(f"\n[RECARGA] '{ARCHIVO_USUARIOS}': {len(cambios)} altas/cambios, {len(bajas)} bajas. "
+              f"{len(USUARIOS)} usuarios registrados.")
+
+def copiar_usuarios():
+    """
+    Copia del roster para el vigilante de usuarios.csv: la toma bajo
+    CERROJO_USUARIOS (altas y recargas no lo cambian a mitad) y la compara
+    sin él, así que un tap no espera a la comparación.
+    """
+    with CERROJO_USUARIOS:
+        return USUARIOS.copia()
+
+def iniciar_recarga_usuarios():
+    """Arranca el vigilante de usuarios.csv (sólo con el motor CSV)."""
+    global VIGILANTE_USUARIOS
+    if not RECARGA_AUTOMATICA or MOTOR_ALMACENAMIENTO != 'csv' or VIGILANTE_USUARIOS is not None:
+        return
+    VIGILANTE_USUARIOS = VigilanteUsuarios(ARCHIVO_USUARIOS, copiar_usuarios, aplicar_cambios_usuarios)
+    VIGILANTE_USUARIOS.iniciar()
+
+def iniciar_servicio_ocupacion():
+    """Arranca el servicio HTTP de ocupación en vivo (si DIRECCION_OCUPACION no lo desactiva)."""
+    global SERVICIO_OCUPACION
+    from servicio_ocupacion import ServicioOcupacion, parsear_direccion  # http.server sólo en los modos con servicios
+    direccion = parsear_direccion(DIRECCION_OCUPACION)
+    if direccion is None or SERVICIO_OCUPACION is not None:
+        return
+    servicio = ServicioOcupacion(PRESENTES, direccion, metricas.texto_prometheus if METRICAS_ACTIVAS else None)
+    try:
+        servicio.iniciar()
+    except OSError as e:
+        print(f"*** ADVERTENCIA: no se pudo iniciar el servicio de ocupación en {DIRECCION_OCUPACION}: {e}")
+        return
+    SERVICIO_OCUPACION = servicio
+    print(f"Ocupación en vivo: http://{servicio.direccion[0]}:{servicio.direccion[1]}/presentes")
+
+def iniciar_metricas():
+    """Activa la instrumentación del lector y su exportación periódica (si METRICAS_ACTIVAS)."""
+    global EXPORTADOR_METRICAS
+    metricas.activar(METRICAS_ACTIVAS)
+    if not METRICAS_ACTIVAS or EXPORTADOR_METRICAS is not None:
+        return
+    EXPORTADOR_METRICAS = metricas.ExportadorMetricas(ARCHIVO_METRICAS, INTERVALO_METRICAS)
+    EXPORTADOR_METRICAS.iniciar()
+    print(f"Métricas: '{ARCHIVO_METRICAS}' y resumen cada {INTERVALO_METRICAS:g} s")
+
+def iniciar_sincronizacion():
+    """Arranca el envío en segundo plano de eventos al colector central (si hay URL_COLECTOR)."""
+    global SINCRONIZADOR
+    if not URL_COLECTOR or SINCRONIZADOR is not None:
+        return
+    import sincronizacion
+    try:
+        SINCRONIZADOR = sincronizacion.Sincronizador(URL_COLECTOR, ID_DISPOSITIVO, ARCHIVO_BANDEJA)
+    except sincronizacion.sqlite3.Error as e:
+        print(f"*** ADVERTENCIA: no se pudo abrir la bandeja de salida '{ARCHIVO_BANDEJA}': {e}")
+        return
+    SINCRONIZADOR.iniciar()
+    print(f"Sincronización con {URL_COLECTOR} como '{ID_DISPOSITIVO}' "
+          f"({len(SINCRONIZADOR.bandeja)} eventos pendientes)")
+
+def transaccion():
+    """Agrupa las escrituras de un tap: una transacción en SQLite, sin efecto en CSV."""
+    if MOTOR_ALMACENAMIENTO == 'sqlite':
+        return almacen_sqlite.transaccion()
+    return contextlib.nullcontext()
 
 # ==============================================================================
 # 2. FUNCIÓN DE REGISTRO (ALTA DE USUARIOS) - Se mantiene igual
@@ -146,14 +567,21 @@ def registrar_usuario():
             time.sleep(2)
             return
             
-        with open(ARCHIVO_USUARIOS, mode='a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([uid_nuevo, nombre, matricula])
-        
-        USUARIOS[uid_nuevo] = {'nombre': nombre, 'matricula': matricula}
-        # Inicializar el estado de este nuevo usuario
-        ESTADOS_ACCESO[uid_nuevo] = {'estado': 'SALIDA', 'ultima_entrada': ''}
-        guardar_estados()
+        esperar_indices_usuarios()
+        with CERROJO_USUARIOS, transaccion():
+            uid_matricula = USUARIOS.uid_por_matricula(matricula)
+            if uid_matricula is not None:
+                print(f"\n*** ERROR: La matrícula {matricula} ya está registrada.")
+                print(f"   - Usuario: {USUARIOS[uid_matricula]['nombre']} (UID: {uid_matricula})")
+                time.sleep(2)
+                return
+
+            guardar_usuario(uid_nuevo, nombre, matricula)
+
+            USUARIOS[uid_nuevo] = Usuario(nombre, matricula)
+            # Inicializar el estado de este nuevo usuario
+            ESTADOS_ACCESO[uid_nuevo] = {'estado': 'SALIDA', 'ultima_entrada': None}
+            guardar_estado(uid_nuevo)
         
         print("\n" + "#"*50)
         print(f"¡USUARIO '{nombre}' REGISTRADO CON ÉXITO!")
@@ -166,108 +594,316 @@ def registrar_usuario():
     except Exception as e:
         print(f"\nError en el registro: {e}")
 
+def buscar_usuarios(consulta, limite=LIMITE_BUSQUEDA):
+    """
+    Matrícula exacta o comienzo de cualquier palabra del nombre (sin distinguir
+    acentos ni mayúsculas). Devuelve [(uid, Usuario, estado)] de hasta 'limite' usuarios.
+    """
+    esperar_indices_usuarios()
+    with CERROJO_USUARIOS:
+        uid = USUARIOS.uid_por_matricula(consulta)
+        uids = [uid] if uid is not None else USUARIOS.buscar_nombre(consulta, limite)
+        return [(uid, USUARIOS[uid], ESTADOS_ACCESO.get(uid, {}).get('estado', 'SALIDA')) for uid in uids]
+
+def consultar_usuarios():
+    """Interfaz de búsqueda de usuarios por matrícula o nombre."""
+    print("\n" + "="*50)
+    print("      BÚSQUEDA DE USUARIOS (Matrícula o Nombre)")
+    print("="*50)
+
+    try:
+        while True:
+            consulta = input("\nMatrícula o nombre (Enter para volver): ").strip()
+            if not consulta:
+                return
+
+            inicio = time.perf_counter()
+            encontrados = buscar_usuarios(consulta, LIMITE_BUSQUEDA + 1)
+            duracion = time.perf_counter() - inicio
+            if not encontrados:
+                print("-> Sin resultados.")
+                continue
+
+            for uid, usuario, estado in encontrados[:LIMITE_BUSQUEDA]:
+                print(f"   {usuario.matricula:<12} {usuario.nombre:<35} UID: {uid:<14} [{estado}]")
+            if len(encontrados) > LIMITE_BUSQUEDA:
+                print(f"   ... más de {LIMITE_BUSQUEDA} resultados: escriba más letras para afinar.")
+            print(f"-> {min(len(encontrados), LIMITE_BUSQUEDA)} resultados ({duracion * 1000:.2f} ms)")
+
+    except KeyboardInterrupt:
+        print("\nBúsqueda cancelada.")
+
+def registrar_usuarios_en_lote(filas):
+    """
+    Da de alta en un único lote las filas {'uid', 'nombre', 'matricula'} de una
+    sesión de alta masiva (ver alta_masiva.py). No escribe estados: un usuario
+    sin estado guardado está en SALIDA, igual que tras registrar_usuario().
+    """
+    with CERROJO_USUARIOS, transaccion():
+        guardar_usuarios([(fila['uid'], fila['nombre'], fila['matricula']) for fila in filas])
+        for fila in filas:
+            USUARIOS[fila['uid']] = Usuario(fila['nombre'], fila['matricula'])
+            ESTADOS_ACCESO.setdefault(fila['uid'], {'estado': 'SALIDA', 'ultima_entrada': None})
+
+def alta_masiva_usuarios():
+    """Importa una lista de alumnos y asigna tarjetas a las filas sin UID, guardando todo en un lote."""
+    print("\n" + "="*50)
+    print("      ALTA MASIVA (LISTA + ASIGNACIÓN DE TARJETAS)")
+    print("="*50)
+
+    try:
+        ruta = input("Ruta de la lista CSV (Nombre, Matricula[, UID]): ").strip()
+        filas, errores = alta_masiva.leer_lista(ruta)
+        esperar_indices_usuarios()
+        with CERROJO_USUARIOS:
+            validas, repetidas = alta_masiva.validar_lista(filas, USUARIOS)
+        for linea, motivo in sorted(errores + repetidas):
+            print(f"   *** línea {linea}: {motivo}")
+
+        altas = [fila for fila in validas if fila['uid'] is not None]
+        pendientes = [fila for fila in validas if fila['uid'] is None]
+        print(f"-> {len(altas)} filas con UID y {len(pendientes)} pendientes de tarjeta "
+              f"({len(errores) + len(repetidas)} rechazadas).")
+
+        restantes = []
+        if pendientes and input("¿Asignar tarjetas ahora? [S/n]: ").strip().lower() != 'n':
+            print("Acerque cada tarjeta cuando se indique el nombre. (Ctrl+C para terminar)")
+            sesion = alta_masiva.SesionAsignacion(pendientes, USUARIOS, reader)
+            altas += sesion.ejecutar()
+            restantes = sesion.restantes
+        else:
+            restantes = pendientes
+
+        if altas and input(f"¿Guardar {len(altas)} altas? [S/n]: ").strip().lower() != 'n':
+            registrar_usuarios_en_lote(altas)
+            print(f"\n¡{len(altas)} USUARIOS REGISTRADOS EN UN LOTE!")
+        if restantes:
+            ruta_pendientes = os.path.splitext(ruta)[0] + ".pendientes.csv"
+            alta_masiva.guardar_pendientes(ruta_pendientes, restantes)
+            print(f"-> {len(restantes)} filas sin tarjeta guardadas en '{ruta_pendientes}'")
+        time.sleep(3)
+
+    except KeyboardInterrupt:
+        print("\nAlta masiva cancelada: no se guardó nada.")
+    except Exception as e:
+        print(f"\nError en el alta masiva: {e}")
+
 # ==============================================================================
 # 3. FUNCIÓN DE CONTROL DE ACCESO (ENTRADA/SALIDA Y CÁLCULO)
 # ==============================================================================
 
-def calcular_permanencia(timestamp_entrada):
+def calcular_permanencia(entrada, salida=None):
     """
-    Calcula la diferencia entre la hora actual y la hora de entrada y 
-    devuelve horas, minutos y segundos por separado.
+    Calcula la diferencia entre la salida (por defecto, ahora) y la entrada,
+    ambas en segundos epoch, y devuelve horas, minutos y segundos por separado.
+    Devuelve None si no hay hora de entrada o si es posterior a la salida
+    (p. ej. el reloj del sistema se atrasó).
     """
-    try:
-        # Convertir la cadena de entrada a objeto datetime
-        dt_entrada = datetime.strptime(timestamp_entrada, "%Y-%m-%d %H:%M:%S")
-        dt_salida = datetime.now()
-        
-        # Calcular la diferencia (timedelta object)
-        diferencia = dt_salida - dt_entrada
-        
-        # Convertir a horas, minutos y segundos
-        segundos_totales = int(diferencia.total_seconds())
-        horas = segundos_totales // 3600
-        minutos = (segundos_totales % 3600) // 60
-        segundos = segundos_totales % 60
-        
-        return horas, minutos, segundos
-        
-    except Exception:
-        return 0, 0, 0 # Devolver cero en caso de error
+    if entrada is None:
+        return None
+    segundos_totales = (salida if salida is not None else marcas_tiempo.ahora()) - entrada
+    if segundos_totales < 0:
+        return None
+
+    horas, resto = divmod(segundos_totales, 3600)
+    minutos, segundos = divmod(resto, 60)
+    return horas, minutos, segundos
+
+def es_rebote(id_unico, ahora=None):
+    """
+    Antirrebote POR TARJETA: devuelve True si este UID ya se aceptó hace menos
+    de VENTANA_REBOTE segundos. Otras tarjetas no se ven afectadas.
+
+    La ventana es común a todas las puertas: si la misma tarjeta se lee a la vez
+    en dos lectores, gana la primera lectura que toma CERROJO_REBOTE y la otra
+    se descarta, así que el estado cambia una sola vez.
+    """
+    if ahora is None:
+        ahora = time.monotonic()
+
+    with CERROJO_REBOTE:
+        ultima = ULTIMAS_LECTURAS.get(id_unico)
+        if ultima is not None and ahora - ultima < VENTANA_REBOTE:
+            metricas.contar('rebotes')
+            return True
+        ULTIMAS_LECTURAS[id_unico] = ahora
+
+        # Purgar lecturas caducadas para que el diccionario no crezca sin límite
+        if len(ULTIMAS_LECTURAS) > MAX_LECTURAS_REBOTE:
+            for uid in [u for u, t in ULTIMAS_LECTURAS.items() if ahora - t >= VENTANA_REBOTE]:
+                del ULTIMAS_LECTURAS[uid]
+    return False
+
+def procesar_tarjeta(id_unico, puerta=PUERTA_POR_DEFECTO):
+    """Aplica la lógica de Entrada/Salida a un UID leído en 'puerta' y registra el evento."""
+    print("-" * 50)
+
+    # El cerrojo impide que una recarga del roster se aplique a mitad de un tap
+    with CERROJO_USUARIOS, metricas.etapa('tap'):
+        inicio_estado = metricas.reloj()
+        datos_usuario = USUARIOS.get(id_unico)
+        if datos_usuario is not None:
+            metricas.contar('concedidos')
+            estado_data = ESTADOS_ACCESO.get(id_unico, {'estado': 'SALIDA', 'ultima_entrada': None})
+            estado_anterior = estado_data['estado']
+
+            datos_para_registro = {
+                "uid": id_unico,
+                "nombre": datos_usuario['nombre'],
+                "matricula": datos_usuario['matricula']
+            }
+
+            if estado_anterior == 'SALIDA':
+                # --- ENTRADA (Check-in) ---
+                nuevo_estado = 'ENTRADA'
+                ahora = marcas_tiempo.ahora()
+
+                print(f"[{nuevo_estado}] Bienvenid@: {datos_usuario['nombre']}")
+
+                # Actualizar estado y registrar hora de entrada
+                ESTADOS_ACCESO[id_unico] = {'estado': nuevo_estado, 'ultima_entrada': ahora}
+                PRESENTES[id_unico] = {'nombre': datos_usuario['nombre'], 'matricula': datos_usuario['matricula'],
+                                       'entrada': ahora, 'puerta': puerta}
+                metricas.observar('estado', inicio_estado)
+                metricas.contar('entradas')
+                registrar_evento_acceso(datos_para_registro, nuevo_estado, puerta)
+
+            else:
+                # --- SALIDA (Check-out) ---
+                nuevo_estado = 'SALIDA'
+
+                print(f"[{nuevo_estado}] Hasta pronto: {datos_usuario['nombre']}")
+
+                # Calcular y registrar el tiempo de permanencia
+                permanencia = calcular_permanencia(estado_data['ultima_entrada'])
+                metricas.observar('estado', inicio_estado)
+                metricas.contar('salidas')
+
+                if permanencia is None:
+                    print("   -> Sin hora de entrada válida (falta o es posterior a la salida): no se registra la permanencia.")
+                elif sum(permanencia) > 0:
+                    horas, minutos, segundos = permanencia
+                    print(f"   -> Permanencia: {horas} horas, {minutos} minutos, {segundos} segundos")
+                    # Registrar los tres componentes de tiempo por separado
+                    registrar_tiempo_permanencia(datos_para_registro, horas, minutos, segundos)
+                else:
+                    print("   -> Permanencia registrada, pero la duración es mínima.")
+
+                # Actualizar estado y borrar hora de entrada
+                ESTADOS_ACCESO[id_unico] = {'estado': nuevo_estado, 'ultima_entrada': None}
+                PRESENTES.pop(id_unico, None)
+                registrar_evento_acceso(datos_para_registro, nuevo_estado, puerta)
+
+            guardar_estado(id_unico) # Añadir el cambio de estado al diario
+
+        else:
+            # TARJETA NO REGISTRADA
+            metricas.contar('denegados')
+            print(f"ACCESO DENEGADO. UID: {id_unico}")
+            print("-> Tarjeta NO registrada. Use la opción '1' para registrar.")
+
+    print("-" * 50)
+
+def leer_tarjetas(cola, detener, lector=None, puerta=PUERTA_POR_DEFECTO):
+    """Hilo LECTOR (uno por puerta): encola (UID, instante, puerta) de cada tarjeta que no sea un rebote."""
+    lector = lector or reader
+    while not detener.is_set():
+        # Con IRQ el hilo duerme hasta que el chip avisa de una tarjeta; con sondeo
+        # esperar_tarjeta() vuelve enseguida. El límite permite revisar 'detener'
+        if not lector.esperar_tarjeta(ESPERA_LECTOR):
+            continue
+        inicio = metricas.reloj()
+        id_unico = lector.read_id_no_block()
+        if id_unico:
+            metricas.observar('lectura_rf', inicio)
+        if id_unico and not es_rebote(id_unico):
+            cola.put((id_unico, time.monotonic(), puerta))
+
+def procesar_cola(cola, al_procesar=None):
+    """
+    Hilo PROCESADOR (único para todas las puertas): aplica estado y registros
+    de cada UID encolado, en orden de llegada, hasta recibir None.
+    """
+    while True:
+        elemento = cola.get()
+        if elemento is None:
+            break
+
+        id_unico, instante_lectura, puerta = elemento
+        metricas.observar_duracion('cola', time.monotonic() - instante_lectura)
+        try:
+            with transaccion():
+                procesar_tarjeta(id_unico, puerta)
+        except Exception as e:
+            print(f"*** ERROR al procesar la tarjeta {id_unico}: {e}")
+        metricas.observar_duracion('lectura_registro', time.monotonic() - instante_lectura)
+
+        if al_procesar is not None:
+            al_procesar(id_unico, instante_lectura)
+
+def iniciar_pipeline(al_procesar=None, lectores=None):
+    """
+    Arranca el pipeline lectores -> cola -> procesador: un hilo lector por
+    puerta de 'lectores' ({puerta: lector}; por defecto LECTORES) y un único
+    hilo procesador. 'al_procesar(uid, instante_lectura)' se llama tras
+    registrar cada tarjeta. Devuelve una función que detiene el pipeline tras
+    vaciar la cola.
+    """
+    lectores = lectores or LECTORES or {PUERTA_POR_DEFECTO: reader}
+    cola = queue.Queue()
+    detener = threading.Event()
+    hilos_lectores = [threading.Thread(target=leer_tarjetas, args=(cola, detener, lector, puerta), daemon=True)
+                      for puerta, lector in lectores.items()]
+    hilo_procesador = threading.Thread(target=procesar_cola, args=(cola, al_procesar), daemon=True)
+    hilo_procesador.start()
+    for hilo in hilos_lectores:
+        hilo.start()
+
+    def detener_pipeline():
+        detener.set()
+        for hilo in hilos_lectores:
+            hilo.join()
+        cola.put(None)
+        hilo_procesador.join()
+
+    return detener_pipeline
 
 def iniciar_lector_control():
     """Función principal de lectura con lógica de Entrada/Salida y cálculo."""
     print("\n" + "="*50)
     print("     MODO CONTROL DE ACCESO (ENTRADA/SALIDA)")
     print(f"   {len(USUARIOS)} usuarios registrados. (Ctrl+C para Menú)")
+    if len(LECTORES) > 1:
+        print(f"   Puertas: {', '.join(LECTORES)}")
     print("="*50)
 
+    detener_pipeline = None
     try:
+        # Con varias puertas hace falta un hilo lector por puerta: siempre en pipeline
+        if MODO_PIPELINE or len(LECTORES) > 1:
+            print("\nEsperando tarjetas...")
+            detener_pipeline = iniciar_pipeline()
+            while True:
+                time.sleep(1)
+
         while True:
             print("\nEsperando tarjeta...")
             id_unico = reader.read_id()
-            
-            if id_unico:
-                print("-" * 50)
-                
-                if id_unico in USUARIOS:
-                    datos_usuario = USUARIOS[id_unico]
-                    estado_data = ESTADOS_ACCESO.get(id_unico, {'estado': 'SALIDA', 'ultima_entrada': ''})
-                    estado_anterior = estado_data['estado']
-                    
-                    datos_para_registro = {
-                        "uid": id_unico,
-                        "nombre": datos_usuario['nombre'],
-                        "matricula": datos_usuario['matricula']
-                    }
-
-                    if estado_anterior == 'SALIDA':
-                        # --- ENTRADA (Check-in) ---
-                        nuevo_estado = 'ENTRADA'
-                        tiempo_actual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        
-                        print(f"[{nuevo_estado}] Bienvenid@: {datos_usuario['nombre']}")
-                        
-                        # Actualizar estado y registrar hora de entrada
-                        ESTADOS_ACCESO[id_unico] = {'estado': nuevo_estado, 'ultima_entrada': tiempo_actual}
-                        registrar_evento_acceso(datos_para_registro, nuevo_estado)
-                        
-                    else:
-                        # --- SALIDA (Check-out) ---
-                        nuevo_estado = 'SALIDA'
-                        timestamp_entrada = estado_data['ultima_entrada']
-                        
-                        print(f"[{nuevo_estado}] Hasta pronto: {datos_usuario['nombre']}")
-                        
-                        # Calcular y registrar el tiempo de permanencia
-                        horas, minutos, segundos = calcular_permanencia(timestamp_entrada)
-                        
-                        if (horas + minutos + segundos) > 0:
-                            print(f"   -> Permanencia: {horas} horas, {minutos} minutos, {segundos} segundos")
-                            # Registrar los tres componentes de tiempo por separado
-                            registrar_tiempo_permanencia(datos_para_registro, horas, minutos, segundos)
-                        else:
-                            print("   -> Permanencia registrada, pero la duración es mínima o inválida.")
-                        
-                        # Actualizar estado y borrar hora de entrada
-                        ESTADOS_ACCESO[id_unico] = {'estado': nuevo_estado, 'ultima_entrada': ''}
-                        registrar_evento_acceso(datos_para_registro, nuevo_estado)
-                        
-                    guardar_estados() # Guardar el estado actualizado
 
-                else:
-                    # TARJETA NO REGISTRADA
-                    print(f"ACCESO DENEGADO. UID: {id_unico}")
-                    print("-> Tarjeta NO registrada. Use la opción '1' para registrar.")
-                
-                print("-" * 50)
-                time.sleep(3) 
+            # Si es la misma tarjeta dentro de la ventana, se ignora sin bloquear a las demás
+            while not id_unico or es_rebote(id_unico):
+                id_unico = reader.read_id()
+
+            with transaccion():
+                procesar_tarjeta(id_unico, next(iter(LECTORES), PUERTA_POR_DEFECTO))
 
     except KeyboardInterrupt:
         print("\nRegresando al menú principal...")
     except Exception as e:
         print(f"*** ERROR crítico en el lector: {e}")
     finally:
-        pass
+        if detener_pipeline is not None:
+            detener_pipeline()
 
 # ==============================================================================
 # 4. FUNCIÓN MENÚ PRINCIPAL
@@ -281,11 +917,15 @@ def menu_principal():
         print("      SISTEMA UNIFICADO DE ACCESO NFC/RFID")
         print("*"*50)
         print(f"Usuarios cargados: {len(USUARIOS)}")
-        print(f"Registro de Tiempos en: {ARCHIVO_TIEMPOS}")
+        registro_tiempos = directorio_particiones(ARCHIVO_TIEMPOS) if registro_particionado(ARCHIVO_TIEMPOS) \
+            else ARCHIVO_TIEMPOS
+        print(f"Registro de Tiempos en: {registro_tiempos}")
         print("\nOpciones:")
         print(" [1] -> REGISTRAR NUEVO USUARIO (Alta de Tarjeta)")
         print(" [2] -> INICIAR LECTOR DE ACCESO (Entrada/Salida)")
-        print(" [3] -> Salir del Programa")
+        print(" [3] -> ALTA MASIVA (Importar lista / Asignar tarjetas)")
+        print(" [4] -> BUSCAR USUARIO (Matrícula o Nombre)")
+        print(" [5] -> Salir del Programa")
         print("-" * 50)
         
         opcion = input("Seleccione una opción: ").strip()
@@ -295,6 +935,10 @@ def menu_principal():
         elif opcion == '2':
             iniciar_lector_control()
         elif opcion == '3':
+            alta_masiva_usuarios()
+        elif opcion == '4':
+            consultar_usuarios()
+        elif opcion == '5':
             print("Saliendo del programa. ¡Hasta pronto!")
             break
         else:
@@ -302,18 +946,68 @@ def menu_principal():
             time.sleep(1)
 
 # ==============================================================================
-# INICIO DEL PROGRAMA
+# 5. ARRANQUE Y PARADA
 # ==============================================================================
 
-if __name__ == '__main__':
+def arrancar(servicios=True):
+    """
+    Abre los lectores, asegura los archivos y carga usuarios y estados. Con
+    'servicios' arranca también la recarga en caliente, las métricas, la
+    sincronización y el servicio de ocupación (menú y modo control).
+    """
+    global reader
+    LECTORES.update(crear_lectores())
+    reader = next(iter(LECTORES.values()))
+    inicializar_archivos()
+    cargar_datos()
+    if servicios:
+        iniciar_recarga_usuarios()
+        iniciar_metricas()
+        iniciar_sincronizacion()
+        iniciar_servicio_ocupacion()
+
+def detener():
+    """Detiene los servicios, vuelca los registros pendientes y libera los lectores."""
+    global SERVICIO_OCUPACION, EXPORTADOR_METRICAS, SINCRONIZADOR, VIGILANTE_USUARIOS, reader
+    if VIGILANTE_USUARIOS is not None:
+        VIGILANTE_USUARIOS.detener()
+        VIGILANTE_USUARIOS = None
+    if SERVICIO_OCUPACION is not None:
+        SERVICIO_OCUPACION.detener()
+        SERVICIO_OCUPACION = None
+    if EXPORTADOR_METRICAS is not None:
+        EXPORTADOR_METRICAS.detener()
+        EXPORTADOR_METRICAS = None
+    if SINCRONIZADOR is not None:
+        SINCRONIZADOR.detener()
+        SINCRONIZADOR = None
+    cerrar_escritores()
+    almacen_sqlite.cerrar()  # Checkpoint del WAL (sin conexión abierta, con el motor CSV, no hace nada)
+    for lector in LECTORES.values():
+        lector.cerrar()
+    LECTORES.clear()
+    reader = None
+    liberar_gpio()  # Una vez, con todas las puertas cerradas
+
+def ejecutar(funcion=None, servicios=True):
+    """
+    Arranca el sistema, ejecuta 'funcion' (por defecto el menú principal) y lo
+    detiene pase lo que pase. Devuelve el código de salida del programa.
+    """
     try:
-        inicializar_archivos()
-        cargar_datos()
-        menu_principal()
-        
+        arrancar(servicios)
+        (funcion or menu_principal)()
+        return 0
     except Exception as e:
         print(f"\n[ERROR CRÍTICO] El programa ha fallado: {e}")
-        
+        return 1
     finally:
-        GPIO.cleanup()
-        print("Limpieza de pines GPIO y salida final.")
\ No newline at end of file
+        detener()
+        print("Limpieza de pines GPIO y salida final.")
+
+# ==============================================================================
+# INICIO DEL PROGRAMA
+# ==============================================================================
+
+if __name__ == '__main__':
+    sys.exit(ejecutar())
@@ -1,14 +1,27 @@
-import RPi.GPIO as GPIO
-from mfrc522 import SimpleMFRC522
+"""
+Lector de matrículas en texto plano: guarda el texto de cada tarjeta (p. ej.
+"S22002198") con la fecha y hora en registro_matriculas.txt.
+
+Uso:
+    python NFC_Sxx.py
+    python nfc_acceso.py texto
+"""
 import time
 from datetime import datetime
 import os
+import sys
+
+from cache_lecturas import CacheTextos, VentanaVistos
+from lectores import crear_lector, liberar_gpio
 
 # --- Configuración del Archivo de Registro ---
 NOMBRE_ARCHIVO = "registro_matriculas.txt"
 
-# Crea una instancia de la clase SimpleMFRC522
-reader = SimpleMFRC522()
+# --- Configuración de las Cachés (ver cache_lecturas.py) ---
+VENTANA_VISTOS = 300.0   # Segundos durante los que no se repite el registro de la misma tarjeta
+MAX_VISTOS = 1024        # Tope de tarjetas recordadas en esa ventana
+MAX_TEXTOS = 4096        # Tope de textos (matrículas) recordados por UID
+VIGENCIA_TEXTOS = 8 * 3600.0  # Segundos antes de volver a leer el texto de una tarjeta conocida
 
 # --- Funciones ---
 
@@ -30,55 +43,72 @@ def registrar_lectura(matricula_leida):
         
     except IOError as e:
         print(f"*** ERROR al escribir en el archivo '{NOMBRE_ARCHIVO}': {e}")
-        
-# --- Programa Principal ---
 
-print("--- Lector de Matrículas NFC (Texto Plano) ---")
-print(f"Los registros se guardarán en: {os.path.abspath(NOMBRE_ARCHIVO)}")
-print("Formato de salida: SNNNNNNNN, AAAA-MM-DD HH:MM:SS")
-print("Coloca tu tarjeta cerca del lector...")
-print("Presiona Ctrl+C para salir.")
+def main(al_arrancar=None):
+    """Bucle de lectura. Con 'al_arrancar' lo llama tras abrir el lector y sale sin leer."""
+    # Crea el lector (MFRC522 o simulado según NFC_LECTOR; ver lectores.py)
+    reader = crear_lector()
 
-try:
-    # Usaremos un set para almacenar las matrículas vistas y evitar spam en el registro
-    matriculas_vistas = set()
-    
-    while True:
-        # read() lee el ID Único (UID) y el TEXTO de la memoria.
-        # Aquí, el texto_leido es "S22002198"
-        id_unico, texto_leido = reader.read()
-        
-        # Limpiamos el texto
-        matricula_leida = texto_leido.strip()
-        
-        if matricula_leida:
-            # Se usa el UID y el texto como una clave combinada para evitar doble registro
-            registro_clave = f"{id_unico}:{matricula_leida}"
-            
-            if registro_clave not in matriculas_vistas:
-                # 1. Imprime la información detectada
-                print("-" * 50)
-                print(f"¡Tarjeta detectada a las {datetime.now().strftime('%H:%M:%S')}!")
-                print(f"MATRÍCULA LEÍDA: {matricula_leida}")
-                
-                # 2. Llama a la función para guardar el registro
-                registrar_lectura(matricula_leida)
-                
-                print("-" * 50)
-                
-                # Agregamos a la lista de vistas y luego esperamos un momento
-                matriculas_vistas.add(registro_clave)
-
-        # Si el texto es nulo, significa que la tarjeta no está en el lector.
-        # Esto permite que la matrícula_vistas se limpie lentamente al retirar la tarjeta.
-        else:
-            # Pequeña pausa para evitar sobrecargar la CPU
-            time.sleep(0.1)
-
-except KeyboardInterrupt:
-    print("\nPrograma detenido por el usuario.")
-
-finally:
-    # Limpia los pines GPIO al finalizar
-    GPIO.cleanup()
-    print("Limpieza de GPIO completada.")
\ No newline at end of file
+    print("--- Lector de Matrículas NFC (Texto Plano) ---")
+    print(f"Los registros se guardarán en: {os.path.abspath(NOMBRE_ARCHIVO)}")
+    print("Formato de salida: SNNNNNNNN, AAAA-MM-DD HH:MM:SS")
+    print("Coloca tu tarjeta cerca del lector...")
+    print("Presiona Ctrl+C para salir.")
+
+    try:
+        if al_arrancar is not None:
+            al_arrancar()
+            return 0
+
+        # Tarjetas registradas en los últimos VENTANA_VISTOS segundos (memoria acotada)
+        matriculas_vistas = VentanaVistos(VENTANA_VISTOS, MAX_VISTOS)
+        # UID -> texto ya leído, para no releer los bloques de datos de tarjetas conocidas
+        textos_por_uid = CacheTextos(MAX_TEXTOS, VIGENCIA_TEXTOS)
+
+        while True:
+            # read_id() sólo obtiene el UID (rápido); el TEXTO de la memoria
+            # (p. ej. "S22002198") se lee con read() sólo si la tarjeta es nueva
+            id_unico = reader.read_id()
+            texto_leido = textos_por_uid.get(id_unico)
+            if texto_leido is None:
+                id_unico, texto_leido = reader.read()
+                if texto_leido.strip():  # Una tarjeta sin texto se relee: quizá aún no se ha escrito
+                    textos_por_uid.guardar(id_unico, texto_leido)
+
+            # Limpiamos el texto
+            matricula_leida = texto_leido.strip()
+
+            if matricula_leida:
+                # Se usa el UID y el texto como una clave combinada para evitar doble registro
+                registro_clave = f"{id_unico}:{matricula_leida}"
+
+                if not matriculas_vistas.visto(registro_clave):
+                    # 1. Imprime la información detectada
+                    print("-" * 50)
+                    print(f"¡Tarjeta detectada a las {datetime.now().strftime('%H:%M:%S')}!")
+                    print(f"MATRÍCULA LEÍDA: {matricula_leida}")
+
+                    # 2. Llama a la función para guardar el registro
+                    registrar_lectura(matricula_leida)
+
+                    print("-" * 50)
+
+            # Tarjeta sin texto (o ya retirada del lector)
+            else:
+                # Pequeña pausa para evitar sobrecargar la CPU
+                time.sleep(0.1)
+
+    except KeyboardInterrupt:
+        print("\nPrograma detenido por el usuario.")
+        return 0
+
+    finally:
+        # Limpia los pines GPIO al finalizar
+        reader.cerrar()
+        liberar_gpio()
+        print("Limpieza de GPIO completada.")
+
+# --- Programa Principal ---
+
+if __name__ == '__main__':
+    sys.exit(main())
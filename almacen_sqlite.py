@@ -0,0 +1,382 @@
+"""
+Motor de almacenamiento SQLite (modo WAL) para usuarios, estados y registros.
+
+Alternativa a los CSV de NFC.py (se activa con NFC_ALMACEN=sqlite). Las tablas
+de registros tienen índices por UID, Matrícula y timestamp, y cada tap se
+escribe en UNA transacción corta (ver transaccion()).
+
+Las marcas de tiempo se guardan como segundos epoch (ver marcas_tiempo.py) en
+las columnas de texto existentes: con 10 dígitos se ordenan igual como texto,
+así que los índices por timestamp siguen sirviendo. Las bases de datos con
+marcas en el formato anterior se convierten con 'marcas_tiempo.py migrar'.
+
+Importar / exportar desde / hacia la estructura CSV actual. La importación
+se niega si la base de datos ya tiene accesos o tiempos (repetirla los
+duplicaría); los registros particionados se leen de su directorio:
+    python almacen_sqlite.py importar
+    python almacen_sqlite.py importar --accesos registros/registro_accesos --tiempos registros/registro_tiempos
+    python almacen_sqlite.py exportar --directorio exportado/
+    python almacen_sqlite.py consultar S22002198 --desde 2026-09-01 --hasta 2026-10-01
+"""
+import argparse
+import csv
+import itertools
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+import particiones
+from marcas_tiempo import a_epoch, formatear
+from roster_usuarios import Usuario
+
+ARCHIVO_BD = "nfc_acceso.db"
+DIRECTORIO_PARTICIONES = "registros"  # Como NFC.DIRECTORIO_PARTICIONES: registros/registro_accesos/...
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    uid       INTEGER PRIMARY KEY,
+    nombre    TEXT NOT NULL,
+    matricula TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_usuarios_matricula ON usuarios(matricula);
+
+CREATE TABLE IF NOT EXISTS estados (
+    uid            INTEGER PRIMARY KEY,
+    estado         TEXT NOT NULL,
+    ultima_entrada TEXT NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS accesos (
+    id        INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    uid       INTEGER,
+    matricula TEXT NOT NULL,
+    nombre    TEXT NOT NULL,
+    evento    TEXT NOT NULL,
+    puerta    TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_accesos_uid ON accesos(uid, timestamp);
+CREATE INDEX IF NOT EXISTS idx_accesos_matricula ON accesos(matricula, timestamp);
+CREATE INDEX IF NOT EXISTS idx_accesos_timestamp ON accesos(timestamp);
+
+CREATE TABLE IF NOT EXISTS tiempos (
+    id               INTEGER PRIMARY KEY,
+    timestamp_salida TEXT NOT NULL,
+    uid              INTEGER,
+    matricula        TEXT NOT NULL,
+    nombre           TEXT NOT NULL,
+    horas            INTEGER NOT NULL,
+    minutos          INTEGER NOT NULL,
+    segundos         INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tiempos_uid ON tiempos(uid, timestamp_salida);
+CREATE INDEX IF NOT EXISTS idx_tiempos_matricula ON tiempos(matricula, timestamp_salida);
+CREATE INDEX IF NOT EXISTS idx_tiempos_timestamp ON tiempos(timestamp_salida);
+"""
+
+class ErrorImportacion(Exception):
+    """La base de datos ya tiene registros: importar los CSV de nuevo los duplicaría."""
+
+# --- Estado de la conexión ---
+_conexion = None
+_profundidad = 0                # Nivel de anidamiento de transaccion()
+_cerrojo = threading.RLock()    # El hilo procesador y el menú comparten la conexión
+
+# ==============================================================================
+# 1. CONEXIÓN Y TRANSACCIONES
+# ==============================================================================
+
+def conectar(ruta=ARCHIVO_BD):
+    """Abre (o crea) la base de datos en modo WAL y asegura el esquema."""
+    global _conexion
+    with _cerrojo:
+        if _conexion is None:
+            # isolation_level=None: las transacciones se controlan con BEGIN/COMMIT explícitos
+            _conexion = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False)
+            _conexion.execute("PRAGMA journal_mode=WAL")
+            _conexion.execute("PRAGMA synchronous=NORMAL")
+            _conexion.executescript(ESQUEMA)
+            _migrar(_conexion)
+        return _conexion
+
+def _migrar(conexion):
+    """Añade las columnas nuevas a bases de datos creadas con un esquema anterior."""
+    columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(accesos)")}
+    if 'puerta' not in columnas:
+        conexion.execute("ALTER TABLE accesos ADD COLUMN puerta TEXT NOT NULL DEFAULT ''")
+
+def cerrar():
+    """Cierra la conexión (hace checkpoint del WAL)."""
+    global _conexion
+    with _cerrojo:
+        if _conexion is not None:
+            _conexion.close()
+            _conexion = None
+
+@contextmanager
+def transaccion():
+    """
+    Agrupa varias escrituras en una sola transacción. Es reentrante: sólo la
+    transacción más externa hace COMMIT (o ROLLBACK si hay una excepción).
+    """
+    global _profundidad
+    with _cerrojo:
+        conexion = conectar()
+        if _profundidad == 0:
+            conexion.execute("BEGIN")
+        _profundidad += 1
+        try:
+            yield conexion
+        except BaseException:
+            _profundidad -= 1
+            if _profundidad == 0:
+                conexion.execute("ROLLBACK")
+            raise
+        _profundidad -= 1
+        if _profundidad == 0:
+            conexion.execute("COMMIT")
+
+# ==============================================================================
+# 2. OPERACIONES DEL SISTEMA DE ACCESO
+# ==============================================================================
+
+def cargar(usuarios, estados):
+    """Rellena los diccionarios USUARIOS y ESTADOS_ACCESO desde la base de datos."""
+    conexion = conectar()
+    with _cerrojo:
+        for uid, nombre, matricula in conexion.execute("SELECT uid, nombre, matricula FROM usuarios"):
+            usuarios[uid] = Usuario(nombre, matricula)
+        for uid, estado, ultima_entrada in conexion.execute("SELECT uid, estado, ultima_entrada FROM estados"):
+            estados[uid] = {'estado': estado, 'ultima_entrada': a_epoch(ultima_entrada)}
+
+def guardar_usuario(uid, nombre, matricula):
+    """Da de alta (o actualiza) un usuario."""
+    with transaccion() as conexion:
+        conexion.execute("INSERT OR REPLACE INTO usuarios (uid, nombre, matricula) VALUES (?, ?, ?)",
+                         (uid, nombre, matricula))
+
+def guardar_usuarios(filas):
+    """Da de alta varios usuarios [(uid, nombre, matricula)] en una transacción."""
+    with transaccion() as conexion:
+        conexion.executemany("INSERT OR REPLACE INTO usuarios (uid, nombre, matricula) VALUES (?, ?, ?)", filas)
+
+def guardar_estado(uid, estado, ultima_entrada):
+    """Guarda el estado de un único UID."""
+    with transaccion() as conexion:
+        conexion.execute("INSERT OR REPLACE INTO estados (uid, estado, ultima_entrada) VALUES (?, ?, ?)",
+                         (uid, estado, '' if ultima_entrada is None else ultima_entrada))
+
+def guardar_estados(estados):
+    """Guarda todos los estados en una transacción."""
+    with transaccion() as conexion:
+        conexion.executemany("INSERT OR REPLACE INTO estados (uid, estado, ultima_entrada) VALUES (?, ?, ?)",
+                             [(uid, d['estado'], '' if d['ultima_entrada'] is None else d['ultima_entrada'])
+                              for uid, d in estados.items()])
+
+def registrar_evento(timestamp, datos_usuario, evento, puerta=''):
+    """Inserta un evento ENTRADA/SALIDA (y la puerta donde ocurrió) en la tabla de accesos."""
+    with transaccion() as conexion:
+        conexion.execute("INSERT INTO accesos (timestamp, uid, matricula, nombre, evento, puerta) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         (timestamp, datos_usuario.get('uid'), datos_usuario['matricula'],
+                          datos_usuario['nombre'], evento, puerta))
+
+def registrar_tiempo(timestamp, datos_usuario, horas, minutos, segundos):
+    """Inserta una permanencia en la tabla de tiempos."""
+    with transaccion() as conexion:
+        conexion.execute("INSERT INTO tiempos (timestamp_salida, uid, matricula, nombre, horas, minutos, segundos) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (timestamp, datos_usuario.get('uid'), datos_usuario['matricula'],
+                          datos_usuario['nombre'], horas, minutos, segundos))
+
+def eventos_por_matricula(matricula, desde=None, hasta=None):
+    """
+    Eventos de una matrícula en [desde, hasta) usando el índice (matricula, timestamp).
+    'desde' y 'hasta' son epoch o texto local 'YYYY-MM-DD[ HH:MM:SS]'.
+    """
+    consulta = "SELECT timestamp, matricula, nombre, evento, puerta FROM accesos WHERE matricula = ?"
+    parametros = [matricula]
+    if desde:
+        consulta += " AND timestamp >= ?"
+        parametros.append(str(a_epoch(desde)))
+    if hasta:
+        consulta += " AND timestamp < ?"
+        parametros.append(str(a_epoch(hasta)))
+    conexion = conectar()
+    with _cerrojo:
+        return conexion.execute(consulta + " ORDER BY timestamp", parametros).fetchall()
+
+# ==============================================================================
+# 3. IMPORTACIÓN / EXPORTACIÓN CSV
+# ==============================================================================
+
+def _filas_csv(ruta):
+    """
+    Devuelve las filas de un CSV sin el encabezado (vacío si no existe). 'ruta'
+    puede ser también un directorio de particiones (ver particiones.py).
+    """
+    if os.path.isdir(ruta):
+        rutas = particiones.rutas_particiones(ruta)
+    elif os.path.exists(ruta):
+        rutas = [ruta]
+    else:
+        return
+    for ruta_archivo in rutas:
+        with particiones.abrir_particion(ruta_archivo) as f:
+            lector_csv = csv.reader(f)
+            next(lector_csv, None)
+            yield from lector_csv
+
+def origen_registro(ruta):
+    """'ruta' si existe; si no, su directorio de particiones (registros/<nombre>) si lo hay."""
+    directorio = os.path.join(DIRECTORIO_PARTICIONES, os.path.splitext(os.path.basename(ruta))[0])
+    if not os.path.exists(ruta) and os.path.isdir(directorio):
+        return directorio
+    return ruta
+
+def _filas_diario(ruta):
+    """Registros completos del diario de estados (sin encabezado; se ignora un final truncado)."""
+    if not os.path.exists(ruta):
+        return
+    with open(ruta, mode='r', newline='', encoding='utf-8') as f:
+        for linea in f:
+            if not linea.endswith('\n'):
+                break
+            yield next(csv.reader([linea]), [])
+
+def importar_csv(usuarios="usuarios.csv", estados="estados.csv",
+                 accesos="registro_accesos.csv", tiempos="registro_tiempos.csv",
+                 diario_estados="estados_diario.csv"):
+    """
+    Importa la estructura CSV actual a la base de datos. 'accesos' y 'tiempos'
+    pueden ser directorios de particiones. Devuelve filas importadas por tabla.
+    Lanza ErrorImportacion si las tablas de registros ya tienen filas.
+    """
+    totales = {'usuarios': 0, 'estados': 0, 'accesos': 0, 'tiempos': 0}
+    uid_por_matricula = {}
+
+    with transaccion() as conexion:
+        # Usuarios y estados se reemplazan, pero los registros sólo se añaden
+        ocupadas = [tabla for tabla in ('accesos', 'tiempos')
+                    if conexion.execute(f"SELECT 1 FROM {tabla} LIMIT 1").fetchone()]
+        if ocupadas:
+            raise ErrorImportacion(f"la base de datos ya tiene filas en {' y '.join(ocupadas)}; "
+                                   f"importar de nuevo las duplicaría")
+
+        for fila in _filas_csv(usuarios):
+            if len(fila) < 3:
+                continue
+            try:
+                uid = int(fila[0])
+            except ValueError:
+                continue
+            nombre, matricula = fila[1].strip(), fila[2].strip()
+            conexion.execute("INSERT OR REPLACE INTO usuarios VALUES (?, ?, ?)", (uid, nombre, matricula))
+            uid_por_matricula[matricula] = uid
+            totales['usuarios'] += 1
+
+        # Snapshot de estados y, encima, los cambios pendientes del diario
+        for fila in itertools.chain(_filas_csv(estados), _filas_diario(diario_estados)):
+            if len(fila) < 3:
+                continue
+            try:
+                entrada = a_epoch(fila[2])
+                conexion.execute("INSERT OR REPLACE INTO estados VALUES (?, ?, ?)",
+                                 (int(fila[0]), fila[1].strip(), '' if entrada is None else entrada))
+                totales['estados'] += 1
+            except ValueError:
+                continue
+
+        for fila in _filas_csv(accesos):
+            instante = a_epoch(fila[0]) if len(fila) >= 4 else None
+            if instante is None:
+                continue
+            # Los registros anteriores a las puertas múltiples no tienen la 5ª columna
+            conexion.execute("INSERT INTO accesos (timestamp, uid, matricula, nombre, evento, puerta) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             (instante, uid_por_matricula.get(fila[1]), fila[1], fila[2], fila[3],
+                              fila[4] if len(fila) > 4 else ''))
+            totales['accesos'] += 1
+
+        for fila in _filas_csv(tiempos):
+            instante = a_epoch(fila[0]) if len(fila) >= 6 else None
+            if instante is None:
+                continue
+            try:
+                conexion.execute("INSERT INTO tiempos (timestamp_salida, uid, matricula, nombre, horas, minutos, segundos) "
+                                 "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 (instante, uid_por_matricula.get(fila[1]), fila[1], fila[2],
+                                  int(fila[3]), int(fila[4]), int(fila[5])))
+                totales['tiempos'] += 1
+            except ValueError:
+                continue
+
+    return totales
+
+def exportar_csv(directorio="."):
+    """Exporta la base de datos a los cuatro CSV con los encabezados de NFC.py."""
+    exportaciones = [
+        ("usuarios.csv", ['UID', 'Nombre', 'Matricula'],
+         "SELECT uid, nombre, matricula FROM usuarios"),
+        ("estados.csv", ['UID', 'Estado', 'Ultima_Entrada_Timestamp'],
+         "SELECT uid, estado, ultima_entrada FROM estados"),
+        ("registro_accesos.csv", ['Timestamp', 'Matricula', 'Nombre', 'Evento', 'Puerta'],
+         "SELECT timestamp, matricula, nombre, evento, puerta FROM accesos ORDER BY id"),
+        ("registro_tiempos.csv", ['Timestamp_Salida', 'Matricula', 'Nombre', 'Horas', 'Minutos', 'Segundos'],
+         "SELECT timestamp_salida, matricula, nombre, horas, minutos, segundos FROM tiempos ORDER BY id"),
+    ]
+    os.makedirs(directorio, exist_ok=True)
+    conexion = conectar()
+    with _cerrojo:
+        for nombre_archivo, encabezados, consulta in exportaciones:
+            with open(os.path.join(directorio, nombre_archivo), mode='w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(encabezados)
+                writer.writerows(conexion.execute(consulta))
+
+# ==============================================================================
+# INICIO DEL PROGRAMA
+# ==============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa/exporta el almacenamiento SQLite del sistema NFC")
+    parser.add_argument('--bd', default=ARCHIVO_BD, help="Ruta de la base de datos")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    importar = subcomandos.add_parser('importar', help="CSV actuales -> SQLite (base de datos sin registros)")
+    importar.add_argument('--accesos', default=None,
+                          help="Registro de accesos o su directorio de particiones (por defecto, el que exista)")
+    importar.add_argument('--tiempos', default=None,
+                          help="Registro de tiempos o su directorio de particiones (por defecto, el que exista)")
+    exportar = subcomandos.add_parser('exportar', help="SQLite -> CSV")
+    exportar.add_argument('--directorio', default='exportado')
+    consultar = subcomandos.add_parser('consultar', help="Eventos de una matrícula")
+    consultar.add_argument('matricula')
+    consultar.add_argument('--desde', help="YYYY-MM-DD[ HH:MM:SS] inclusive")
+    consultar.add_argument('--hasta', help="YYYY-MM-DD[ HH:MM:SS] exclusivo")
+    args = parser.parse_args(argv)
+
+    conectar(args.bd)
+    try:
+        if args.comando == 'importar':
+            try:
+                totales = importar_csv(accesos=args.accesos or origen_registro("registro_accesos.csv"),
+                                       tiempos=args.tiempos or origen_registro("registro_tiempos.csv"))
+            except ErrorImportacion as e:
+                print(f"*** ERROR: {e}")
+                return 1
+            print("Importación completa: " + ", ".join(f"{n} {t}" for t, n in totales.items()))
+        elif args.comando == 'exportar':
+            exportar_csv(args.directorio)
+            print(f"Exportación completa en '{args.directorio}'")
+        else:
+            for fila in eventos_por_matricula(args.matricula, args.desde, args.hasta):
+                print(",".join([formatear(fila[0])] + [str(c) for c in fila[1:]]))
+    finally:
+        cerrar()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Altas masivas de usuarios: importación de listas y asignación de tarjetas en serie.
+
+1. IMPORTAR: una lista CSV con Nombre y Matricula (y, opcionalmente, UID) se
+   lee de una sola pasada. Se detectan UIDs y matrículas repetidas dentro de la
+   lista y frente al roster actual.
+2. ESCANEAR Y ASIGNAR: las filas sin UID quedan pendientes y cada tarjeta que
+   se acerca al lector se asigna a la siguiente fila pendiente, sin teclear nada.
+
+Nada se escribe durante la sesión: al final todas las altas se guardan en un
+único lote (ver NFC.registrar_usuarios_en_lote). Las filas que quedan sin
+tarjeta se guardan en '<lista>.pendientes.csv' para continuar otro día.
+
+Uso:
+    python alta_masiva.py comprobar alumnos_nuevos.csv
+    python alta_masiva.py importar alumnos_nuevos.csv     # sólo filas con UID
+"""
+import argparse
+import csv
+import itertools
+import sys
+import time
+
+from roster_usuarios import normalizar_matricula
+
+# Nombres de columna aceptados en el encabezado de la lista (en minúsculas)
+COLUMNAS_UID = ('uid',)
+COLUMNAS_NOMBRE = ('nombre', 'nombre completo', 'name')
+COLUMNAS_MATRICULA = ('matricula', 'matrícula')
+VENTANA_REPETICION = 2.0  # Segundos en los que se ignora la misma tarjeta aún sobre el lector
+
+# ==============================================================================
+# 1. LECTURA Y VALIDACIÓN DE LA LISTA
+# ==============================================================================
+
+def _posicion_columna(encabezados, nombres):
+    for posicion, encabezado in enumerate(encabezados):
+        if encabezado.strip().lower() in nombres:
+            return posicion
+    return None
+
+def leer_lista(ruta):
+    """
+    Lee la lista de una pasada. Devuelve (filas, errores): cada fila es
+    {'linea', 'uid' (int o None), 'nombre', 'matricula'} y cada error (linea, motivo).
+    Sin encabezado reconocible: 2 columnas = Nombre, Matricula; 3 = UID, Nombre, Matricula.
+    """
+    filas, errores = [], []
+    with open(ruta, mode='r', newline='', encoding='utf-8-sig') as f:
+        lector_csv = csv.reader(f)
+        primera = next(lector_csv, None)
+        if primera is None:
+            return filas, errores
+
+        col_nombre = _posicion_columna(primera, COLUMNAS_NOMBRE)
+        col_matricula = _posicion_columna(primera, COLUMNAS_MATRICULA)
+        if col_nombre is not None and col_matricula is not None:
+            col_uid = _posicion_columna(primera, COLUMNAS_UID)
+            lineas = enumerate(lector_csv, start=2)
+        else:
+            # Sin encabezado: la primera fila ya es un dato
+            col_uid, col_nombre, col_matricula = (0, 1, 2) if len(primera) >= 3 else (None, 0, 1)
+            lineas = itertools.chain([(1, primera)], enumerate(lector_csv, start=2))
+
+        for linea, fila in lineas:
+            if not any(campo.strip() for campo in fila):
+                continue
+            try:
+                nombre, matricula = fila[col_nombre].strip(), fila[col_matricula].strip()
+                texto_uid = fila[col_uid].strip() if col_uid is not None and col_uid < len(fila) else ""
+            except IndexError:
+                errores.append((linea, "faltan columnas"))
+                continue
+            if not nombre or not matricula:
+                errores.append((linea, "nombre o matrícula vacíos"))
+                continue
+            try:
+                uid = int(texto_uid) if texto_uid else None
+            except ValueError:
+                errores.append((linea, f"UID no numérico '{texto_uid}'"))
+                continue
+            filas.append({'linea': linea, 'uid': uid, 'nombre': nombre, 'matricula': matricula})
+    return filas, errores
+
+def validar_lista(filas, usuarios):
+    """
+    Separa las filas válidas de las repetidas. Una fila se rechaza si su UID o
+    su matrícula ya están en el roster o aparecieron en una fila anterior.
+    Devuelve (validas, errores).
+    """
+    vistas_uid, vistas_matricula = {}, {}
+    validas, errores = [], []
+
+    for fila in filas:
+        uid, matricula = fila['uid'], fila['matricula']
+        clave_matricula = normalizar_matricula(matricula)
+        if uid is not None and uid in usuarios:
+            errores.append((fila['linea'], f"la tarjeta {uid} ya está registrada ({usuarios[uid]['nombre']})"))
+        elif uid is not None and uid in vistas_uid:
+            errores.append((fila['linea'], f"UID {uid} repetido (línea {vistas_uid[uid]})"))
+        elif usuarios.uid_por_matricula(matricula) is not None:
+            errores.append((fila['linea'], f"la matrícula {matricula} ya está registrada"))
+        elif clave_matricula in vistas_matricula:
+            errores.append((fila['linea'], f"matrícula {matricula} repetida (línea {vistas_matricula[clave_matricula]})"))
+        else:
+            validas.append(fila)
+            if uid is not None:
+                vistas_uid[uid] = fila['linea']
+            vistas_matricula[clave_matricula] = fila['linea']
+    return validas, errores
+
+def guardar_pendientes(ruta, filas):
+    """Escribe las filas aún sin tarjeta en una lista que se puede volver a importar."""
+    with open(ruta, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Nombre', 'Matricula'])
+        writer.writerows([fila['nombre'], fila['matricula']] for fila in filas)
+
+# ==============================================================================
+# 2. ESCANEAR Y ASIGNAR
+# ==============================================================================
+
+class SesionAsignacion:
+    """Empareja cada tarjeta leída con la siguiente fila pendiente (sin escribir nada)."""
+
+    def __init__(self, pendientes, usuarios, lector, ventana_repeticion=VENTANA_REPETICION):
+        self.pendientes = list(pendientes)
+        self.usuarios = usuarios
+        self.lector = lector
+        self.ventana_repeticion = ventana_repeticion
+        self.asignadas = []         # Filas pendientes con su 'uid' ya asignado
+        self._uids_asignados = set()
+        self._ultima_lectura = (None, 0.0)
+
+    @property
+    def restantes(self):
+        return self.pendientes[len(self.asignadas):]
+
+    def asignar(self, uid):
+        """Asigna 'uid' a la siguiente fila. Devuelve (fila, None) o (None, motivo del rechazo)."""
+        if len(self.asignadas) >= len(self.pendientes):
+            return None, "no quedan filas pendientes"
+        if uid in self.usuarios:
+            return None, f"la tarjeta ya está registrada ({self.usuarios[uid]['nombre']})"
+        if uid in self._uids_asignados:
+            return None, "la tarjeta ya se asignó en esta sesión"
+        fila = dict(self.pendientes[len(self.asignadas)], uid=uid)
+        self.asignadas.append(fila)
+        self._uids_asignados.add(uid)
+        return fila, None
+
+    def ejecutar(self):
+        """Lee tarjetas hasta agotar las filas pendientes o hasta Ctrl+C."""
+        total = len(self.pendientes)
+        try:
+            while len(self.asignadas) < total:
+                siguiente = self.pendientes[len(self.asignadas)]
+                print(f"\n[{len(self.asignadas) + 1}/{total}] Acerque la tarjeta de: "
+                      f"{siguiente['nombre']} ({siguiente['matricula']})")
+                uid = self._leer_tarjeta()
+                if uid is None:
+                    break  # El lector se cerró
+                fila, motivo = self.asignar(uid)
+                if fila is None:
+                    print(f"   *** Tarjeta {uid} rechazada: {motivo}")
+                else:
+                    print(f"   -> {uid} asignada a {fila['nombre']}")
+        except KeyboardInterrupt:
+            print("\nSesión de asignación detenida.")
+        return self.asignadas
+
+    def _leer_tarjeta(self):
+        """Siguiente UID leído, ignorando la misma tarjeta mientras sigue sobre el lector."""
+        while True:
+            uid = self.lector.read_id()
+            if uid is None:
+                return None
+            ahora = time.monotonic()
+            ultima_uid, instante = self._ultima_lectura
+            self._ultima_lectura = (uid, ahora)
+            if uid != ultima_uid or ahora - instante >= self.ventana_repeticion:
+                return uid
+
+# ==============================================================================
+# INICIO DEL PROGRAMA
+# ==============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Altas masivas de usuarios del sistema NFC")
+    parser.add_argument('comando', choices=['comprobar', 'importar'])
+    parser.add_argument('lista', help="CSV con Nombre, Matricula y opcionalmente UID")
+    args = parser.parse_args(argv)
+
+    import NFC
+    NFC.inicializar_archivos()
+    NFC.cargar_roster()  # Sin cargar_datos(): compactaría los estados de un proceso de la puerta en marcha
+
+    filas, errores = leer_lista(args.lista)
+    validas, repetidas = validar_lista(filas, NFC.USUARIOS)
+    for linea, motivo in sorted(errores + repetidas):
+        print(f"   línea {linea}: {motivo}")
+    con_uid = [fila for fila in validas if fila['uid'] is not None]
+    print(f"-> {len(validas)} filas válidas ({len(con_uid)} con UID, {len(validas) - len(con_uid)} sin tarjeta), "
+          f"{len(errores) + len(repetidas)} rechazadas")
+
+    if args.comando == 'importar' and con_uid:
+        NFC.registrar_usuarios_en_lote(con_uid)
+        print(f"-> {len(con_uid)} usuarios dados de alta en un lote")
+    NFC.cerrar_escritores()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
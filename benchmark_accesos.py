@@ -0,0 +1,345 @@
+"""
+Benchmark de ráfagas de taps (tap-storm) sobre la lógica de control de NFC.py.
+
+Genera N usuarios en un directorio temporal, conecta un LectorSimulado que
+entrega M taps/segundo y ejecuta el mismo pipeline que iniciar_lector_control().
+Informa throughput, latencia p50/p99 (lectura -> registrado), bytes escritos
+y llamadas write() por tap; con --aperturas también las aperturas de archivo
+(contadas con un audit hook, que sólo se instala entonces).
+
+Con --puertas K se abren K lectores simulados (uno por puerta, cada uno a
+M taps/segundo) que alimentan la misma cola y el mismo hilo procesador.
+
+Con --irq cada lector simulado se envuelve en un LectorIRQ con una fuente
+de IRQ falsa (ver lectores.py): el hilo lector duerme hasta cada tap en vez
+de sondear. La CPU usada por el proceso se informa en ambos casos.
+
+Con --metricas activa la instrumentación de NFC.py (ver metricas.py) y añade
+el reparto del tiempo por etapa; sin ella mide el coste con las métricas
+desactivadas, que es el caso normal.
+
+Con --arranque mide en su lugar la carga del roster (tiempo y memoria
+retenida): parseo CSV a un dict por usuario (método anterior) frente a
+roster_usuarios.cargar_usuarios() sin caché y con caché binaria válida.
+
+Uso:
+    python benchmark_accesos.py --usuarios 10000 --taps-por-segundo 200 --taps 5000
+    python benchmark_accesos.py --modo pipeline --puertas 4 --taps-por-segundo 2000 --taps 20000
+    python benchmark_accesos.py --modo pipeline --metricas
+    python benchmark_accesos.py --modo serie --aperturas
+    python benchmark_accesos.py --modo pipeline --taps-por-segundo 5 --taps 50 --irq
+    python benchmark_accesos.py --arranque --usuarios 100000
+"""
+import argparse
+import contextlib
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import NFC
+import almacen_sqlite
+import metricas
+from lectores import FuenteIRQSimulada, LectorIRQ, LectorSimulado
+from roster_usuarios import EXTENSION_CACHE, cargar_usuarios
+
+UID_BASE = 100000000000
+
+# ==============================================================================
+# 1. PREPARACIÓN
+# ==============================================================================
+
+def crear_roster(num_usuarios):
+    """Escribe usuarios.csv con 'num_usuarios' usuarios sintéticos y devuelve sus UIDs."""
+    uids = [UID_BASE + i for i in range(num_usuarios)]
+    with open(NFC.ARCHIVO_USUARIOS, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['UID', 'Nombre', 'Matricula'])
+        for i, uid in enumerate(uids):
+            writer.writerow([uid, f"Usuario Prueba {i}", f"S{i:08d}"])
+
+    if NFC.MOTOR_ALMACENAMIENTO == 'sqlite':
+        almacen_sqlite.importar_csv(usuarios=NFC.ARCHIVO_USUARIOS)
+    return uids
+
+def contador_io(campo):
+    """
+    Lee un contador de /proc/self/io (Linux): 'wchar' son los bytes pasados a
+    write() (incluye reescrituras completas, no sólo el crecimiento de los
+    archivos) y 'syscw' el número de llamadas write(). None si no existe.
+    """
+    try:
+        with open('/proc/self/io', encoding='utf-8') as f:
+            for linea in f:
+                if linea.startswith(campo + ':'):
+                    return int(linea.split()[1])
+    except OSError:
+        pass
+    return None
+
+# Aperturas de archivo (open()/os.open()) contadas con un audit hook (sólo con --aperturas)
+APERTURAS = [0]
+_CONTADOR_INSTALADO = [False]
+
+def _contar_aperturas(evento, argumentos):
+    if evento == 'open':
+        APERTURAS[0] += 1
+
+def instalar_contador_aperturas():
+    """
+    Instala el audit hook que cuenta aperturas. Un audit hook no se puede
+    quitar y se ejecuta en cada evento del proceso, así que se instala sólo
+    cuando se pide la cuenta, y una sola vez.
+    """
+    if not _CONTADOR_INSTALADO[0]:
+        sys.addaudithook(_contar_aperturas)
+        _CONTADOR_INSTALADO[0] = True
+
+def bytes_en_directorio(ruta):
+    """Suma el tamaño de todos los archivos de un directorio."""
+    return sum(os.path.getsize(os.path.join(ruta, n)) for n in os.listdir(ruta)
+               if os.path.isfile(os.path.join(ruta, n)))
+
+def medir_bytes(ruta):
+    """Contador de bytes escritos: /proc/self/io o, si no existe, tamaño del directorio."""
+    escritos = contador_io('wchar')
+    return escritos if escritos is not None else bytes_en_directorio(ruta)
+
+def percentil(valores_ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1, int(round(p / 100 * len(valores_ordenados))) - 1))
+    return valores_ordenados[indice]
+
+# ==============================================================================
+# 2. EJECUCIÓN
+# ==============================================================================
+
+def ejecutar_pipeline(lectores, latencias):
+    """Corre el pipeline de NFC.py (un hilo lector por puerta) hasta agotar los lectores simulados."""
+    detener_pipeline = NFC.iniciar_pipeline(
+        al_procesar=lambda uid, instante: latencias.append(time.monotonic() - instante), lectores=lectores)
+    while not all(lector.agotado for lector in lectores.values()):
+        time.sleep(0.01)
+    detener_pipeline()
+
+def ejecutar_serie(lector, latencias):
+    """Corre el bucle en serie (lectura y registro en el mismo hilo)."""
+    while not lector.agotado:
+        if not lector.esperar_tarjeta(NFC.ESPERA_LECTOR):
+            continue
+        id_unico = lector.read_id_no_block()
+        if not id_unico or NFC.es_rebote(id_unico):
+            continue
+        instante = time.monotonic()
+        with NFC.transaccion():  # Como iniciar_lector_control(): una transacción por tap con SQLite
+            NFC.procesar_tarjeta(id_unico)
+        latencias.append(time.monotonic() - instante)
+
+def ejecutar_benchmark(num_usuarios, taps_por_segundo, num_taps, modo='pipeline',
+                       ventana_rebote=0.0, tiempo_lectura=0.0, semilla=1, almacen='csv',
+                       politica_fsync='lote', puertas=1, con_metricas=False, con_irq=False,
+                       contar_aperturas=False):
+    """
+    Ejecuta un benchmark en un directorio temporal y devuelve sus resultados
+    ('aperturas' es None salvo con 'contar_aperturas').
+    """
+    if contar_aperturas:
+        instalar_contador_aperturas()
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="nfc_bench_") as directorio:
+        os.chdir(directorio)
+        NFC.MOTOR_ALMACENAMIENTO = almacen
+        NFC.POLITICA_FSYNC = politica_fsync
+        try:
+            uids = crear_roster(num_usuarios)
+            with contextlib.redirect_stdout(io.StringIO()):
+                NFC.inicializar_archivos()
+                NFC.cargar_datos()
+            NFC.VENTANA_REBOTE = ventana_rebote
+            NFC.ULTIMAS_LECTURAS.clear()
+            metricas.reiniciar()
+            metricas.activar(con_metricas)
+
+            # Los taps se reparten entre las puertas; cada una lee a 'taps_por_segundo'
+            lectores = {
+                f"puerta{i + 1}": LectorSimulado(poblacion=uids, taps_por_segundo=taps_por_segundo,
+                                                 total=num_taps // puertas + (i < num_taps % puertas),
+                                                 tiempo_lectura=tiempo_lectura, semilla=semilla + i)
+                for i in range(puertas)
+            }
+            if con_irq:
+                lectores = {puerta: LectorIRQ(lector, FuenteIRQSimulada(lector)) for puerta, lector in lectores.items()}
+            NFC.reader = lector = lectores["puerta1"]
+
+            bytes_iniciales = medir_bytes(directorio)
+            writes_iniciales = contador_io('syscw') or 0
+            aperturas_iniciales = APERTURAS[0]
+            latencias = []
+            cpu_inicial = time.process_time()
+            inicio = time.monotonic()
+            with contextlib.redirect_stdout(io.StringIO()):
+                if modo == 'pipeline':
+                    ejecutar_pipeline(lectores, latencias)
+                else:
+                    ejecutar_serie(lector, latencias)
+                # Los lotes pendientes también cuentan como escritura del benchmark
+                NFC.cerrar_escritores()
+            duracion = time.monotonic() - inicio
+            cpu = time.process_time() - cpu_inicial
+            bytes_escritos = medir_bytes(directorio) - bytes_iniciales
+            llamadas_write = (contador_io('syscw') or 0) - writes_iniciales
+            aperturas = APERTURAS[0] - aperturas_iniciales if contar_aperturas else None
+        finally:
+            metricas.activar(False)
+            NFC.cerrar_escritores()
+            almacen_sqlite.cerrar()
+            os.chdir(directorio_original)
+
+    latencias.sort()
+    return {
+        'modo': f"{modo}/{almacen}/fsync={politica_fsync}" + (f"/{puertas} puertas" if puertas > 1 else "")
+                + ("/irq" if con_irq else ""),
+        'usuarios': num_usuarios,
+        'taps': num_taps,
+        'procesados': len(latencias),
+        'duracion': duracion,
+        'cpu': cpu,
+        'throughput': len(latencias) / duracion if duracion > 0 else 0.0,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+        'bytes_escritos': bytes_escritos,
+        'llamadas_write': llamadas_write,
+        'aperturas': aperturas,
+        'metricas': metricas.REGISTRO.resumen() if con_metricas else None,
+    }
+
+def imprimir_resultados(r):
+    """Muestra los resultados de un benchmark en una línea legible."""
+    por_tap = r['bytes_escritos'] / r['procesados'] if r['procesados'] else 0
+    print(f"[{r['modo']}] {r['usuarios']} usuarios, {r['procesados']}/{r['taps']} taps procesados "
+          f"en {r['duracion']:.2f} s")
+    print(f"   -> Throughput: {r['throughput']:.1f} taps/s")
+    print(f"   -> CPU: {r['cpu']:.2f} s ({r['cpu'] / r['duracion'] * 100 if r['duracion'] else 0:.0f} % de un núcleo)")
+    print(f"   -> Latencia lectura->registro: p50 {r['p50_ms']:.2f} ms | p99 {r['p99_ms']:.2f} ms")
+    print(f"   -> Bytes escritos: {r['bytes_escritos']} ({por_tap:.0f} B/tap)")
+    if r['procesados']:
+        aperturas = "" if r['aperturas'] is None else f", {r['aperturas'] / r['procesados']:.2f} aperturas"
+        print(f"   -> Syscalls de E/S por tap: {r['llamadas_write'] / r['procesados']:.2f} write(){aperturas}")
+    if r['metricas']:
+        print(f"   -> {r['metricas']}")
+
+# ==============================================================================
+# 3. ARRANQUE (CARGA DEL ROSTER)
+# ==============================================================================
+
+def cargar_usuarios_dicts(ruta):
+    """Carga de referencia: csv.reader + int() + strip() y un dict por usuario."""
+    usuarios = {}
+    with open(ruta, mode='r', newline='', encoding='utf-8') as f:
+        lector_csv = csv.reader(f)
+        next(lector_csv)
+        for uid, nombre, matricula in lector_csv:
+            try:
+                usuarios[int(uid)] = {'nombre': nombre.strip(), 'matricula': matricula.strip()}
+            except ValueError:
+                continue
+    return usuarios
+
+def medir_carga(funcion, preparar=None, repeticiones=3):
+    """Devuelve (mejor tiempo en s, memoria retenida en bytes) de cargar el roster."""
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+        del resultado
+
+    if preparar:
+        preparar()
+    tracemalloc.start()
+    resultado = funcion()
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del resultado
+    return mejor, memoria
+
+def ejecutar_benchmark_arranque(num_usuarios):
+    """Compara la carga de 'num_usuarios' usuarios con y sin caché binaria."""
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="nfc_bench_") as directorio:
+        os.chdir(directorio)
+        try:
+            crear_roster(num_usuarios)
+            ruta = NFC.ARCHIVO_USUARIOS
+
+            def borrar_cache():
+                if os.path.exists(ruta + EXTENSION_CACHE):
+                    os.remove(ruta + EXTENSION_CACHE)
+
+            resultados = [
+                ("CSV -> dict por usuario (antes)", medir_carga(lambda: cargar_usuarios_dicts(ruta))),
+                ("Sin caché (parseo + escritura de caché)", medir_carga(lambda: cargar_usuarios(ruta), borrar_cache)),
+                ("Caché binaria válida", medir_carga(lambda: cargar_usuarios(ruta))),
+            ]
+        finally:
+            os.chdir(directorio_original)
+
+    print(f"[arranque] {num_usuarios} usuarios")
+    for descripcion, (segundos, memoria) in resultados:
+        print(f"   -> {descripcion:<42} {segundos * 1000:8.1f} ms | {memoria / 2**20:6.1f} MiB")
+
+# ==============================================================================
+# INICIO DEL PROGRAMA
+# ==============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de ráfagas de taps para NFC.py")
+    parser.add_argument('--usuarios', type=int, default=1000, help="Usuarios en el roster (N)")
+    parser.add_argument('--taps-por-segundo', type=float, default=100.0, help="Ritmo de taps (M)")
+    parser.add_argument('--taps', type=int, default=1000, help="Número total de taps")
+    parser.add_argument('--modo', choices=['pipeline', 'serie', 'ambos'], default='ambos')
+    parser.add_argument('--ventana-rebote', type=float, default=0.0,
+                        help="VENTANA_REBOTE en segundos (0 = procesar todos los taps)")
+    parser.add_argument('--tiempo-lectura', type=float, default=0.001,
+                        help="Segundos por intento de lectura RF simulado")
+    parser.add_argument('--almacen', choices=['csv', 'sqlite'], default='csv',
+                        help="Motor de almacenamiento (MOTOR_ALMACENAMIENTO)")
+    parser.add_argument('--fsync', choices=['ninguno', 'lote', 'evento'], default='lote',
+                        help="POLITICA_FSYNC de los registros")
+    parser.add_argument('--puertas', type=int, default=1,
+                        help="Lectores simulados en paralelo (sólo en modo pipeline)")
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--metricas', action='store_true',
+                        help="Activar la instrumentación por etapa y mostrar su resumen")
+    parser.add_argument('--irq', action='store_true',
+                        help="Lectores por IRQ (fuente simulada) en lugar de sondeo")
+    parser.add_argument('--aperturas', action='store_true',
+                        help="Contar también las aperturas de archivo por tap (audit hook)")
+    parser.add_argument('--arranque', action='store_true',
+                        help="Medir la carga del roster en lugar de los taps")
+    args = parser.parse_args(argv)
+
+    if args.arranque:
+        ejecutar_benchmark_arranque(args.usuarios)
+        return 0
+
+    modos = ['pipeline', 'serie'] if args.modo == 'ambos' else [args.modo]
+    if args.puertas > 1 and 'serie' in modos:
+        parser.error("--puertas > 1 requiere --modo pipeline (el bucle en serie lee una sola puerta)")
+    for modo in modos:
+        resultados = ejecutar_benchmark(args.usuarios, args.taps_por_segundo, args.taps, modo,
+                                        args.ventana_rebote, args.tiempo_lectura, args.semilla,
+                                        args.almacen, args.fsync, args.puertas, args.metricas, args.irq,
+                                        args.aperturas)
+        imprimir_resultados(resultados)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
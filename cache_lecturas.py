@@ -0,0 +1,76 @@
+"""
+Cachés acotadas para lectores que funcionan durante toda la jornada.
+
+VentanaVistos: "¿ya registré esta clave hace poco?" con caducidad (TTL) y un
+máximo de entradas (LRU). La memoria es constante y quien vuelve pasada la
+ventana se registra de nuevo.
+
+CacheTextos: UID -> texto guardado en la tarjeta, para no releer los bloques
+de datos (autenticación + lectura de sectores) de una tarjeta ya conocida.
+"""
+import time
+from collections import OrderedDict
+
+class VentanaVistos:
+    """Conjunto de claves vistas en los últimos 'ttl' segundos, con 'max_entradas' como tope."""
+
+    def __init__(self, ttl=300.0, max_entradas=1024):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._vistas = OrderedDict()  # Clave: instante del registro (de la más antigua a la más reciente)
+
+    def __len__(self):
+        return len(self._vistas)
+
+    def visto(self, clave, ahora=None):
+        """
+        True si 'clave' se registró hace menos de 'ttl' segundos. Si no, la
+        registra ahora y devuelve False. Las repeticiones dentro de la ventana
+        no la alargan: cuenta desde el último registro.
+        """
+        if ahora is None:
+            ahora = time.monotonic()
+        vistas = self._vistas
+
+        # Las entradas caducadas siempre están al principio
+        while vistas:
+            primera, instante = next(iter(vistas.items()))
+            if ahora - instante < self.ttl:
+                break
+            del vistas[primera]
+
+        if clave in vistas:
+            return True
+        vistas[clave] = ahora
+        while len(vistas) > self.max_entradas:
+            vistas.popitem(last=False)  # Menos reciente
+        return False
+
+class CacheTextos:
+    """UID -> texto de la tarjeta, con 'max_entradas' como tope (LRU) y caducidad opcional."""
+
+    def __init__(self, max_entradas=4096, ttl=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._textos = OrderedDict()  # UID: (texto, instante de lectura)
+
+    def __len__(self):
+        return len(self._textos)
+
+    def get(self, uid, ahora=None):
+        """Texto en caché de 'uid', o None si no se conoce (o caducó)."""
+        entrada = self._textos.get(uid)
+        if entrada is None:
+            return None
+        texto, instante = entrada
+        if self.ttl is not None and (ahora if ahora is not None else time.monotonic()) - instante >= self.ttl:
+            del self._textos[uid]
+            return None
+        self._textos.move_to_end(uid)
+        return texto
+
+    def guardar(self, uid, texto, ahora=None):
+        self._textos[uid] = (texto, ahora if ahora is not None else time.monotonic())
+        self._textos.move_to_end(uid)
+        while len(self._textos) > self.max_entradas:
+            self._textos.popitem(last=False)
@@ -0,0 +1,157 @@
+"""
+Colector central de eventos para pruebas (sustituto local del servidor real).
+
+Recibe los lotes de sincronizacion.py y los guarda en SQLite con el ID de
+evento como clave primaria: un lote reenviado tras un fallo no duplica nada.
+
+    POST /eventos   cuerpo JSON (gzip opcional) -> {"aceptados": n, "duplicados": m}
+    GET  /resumen   -> eventos guardados por dispositivo y tipo
+
+Con --fallos P responde 503 a una fracción P de los envíos y con --latencia S
+tarda S segundos en responder, para probar los reintentos y la contrapresión.
+
+Uso:
+    python colector_local.py --direccion 127.0.0.1:8780
+    python colector_local.py --fallos 0.3 --latencia 0.5 --bd colector_pruebas.db
+"""
+import argparse
+import gzip
+import json
+import random
+import sqlite3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from servicio_ocupacion import parsear_direccion, serializar
+
+ARCHIVO_BD = "colector.db"
+DIRECCION = "127.0.0.1:8780"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS eventos (
+    id          TEXT PRIMARY KEY,
+    dispositivo TEXT NOT NULL,
+    tipo        TEXT NOT NULL,
+    timestamp   TEXT,
+    evento      TEXT NOT NULL,
+    recibido    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_eventos_dispositivo ON eventos(dispositivo, timestamp);
+"""
+
+# ==============================================================================
+# 1. ALMACÉN DEL COLECTOR
+# ==============================================================================
+
+class AlmacenColector:
+    """Eventos recibidos, sin duplicados por ID."""
+
+    def __init__(self, ruta=ARCHIVO_BD):
+        self._conexion = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.executescript(ESQUEMA)
+        self._cerrojo = threading.Lock()
+
+    def guardar(self, dispositivo, eventos):
+        """Guarda un lote en una transacción. Devuelve (aceptados, duplicados)."""
+        ahora = time.time()
+        with self._cerrojo, self._conexion:
+            self._conexion.execute("BEGIN")
+            antes = self._conexion.total_changes
+            self._conexion.executemany(
+                "INSERT OR IGNORE INTO eventos (id, dispositivo, tipo, timestamp, evento, recibido) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((evento['id'], dispositivo, evento.get('tipo', ''), evento.get('timestamp'),
+                  json.dumps(evento, ensure_ascii=False), ahora) for evento in eventos))
+            aceptados = self._conexion.total_changes - antes
+        return aceptados, len(eventos) - aceptados
+
+    def resumen(self):
+        with self._cerrojo:
+            filas = self._conexion.execute(
+                "SELECT dispositivo, tipo, COUNT(*) FROM eventos GROUP BY dispositivo, tipo").fetchall()
+        return [{'dispositivo': d, 'tipo': t, 'eventos': n} for d, t, n in filas]
+
+    def cerrar(self):
+        self._conexion.close()
+
+# ==============================================================================
+# 2. SERVIDOR HTTP
+# ==============================================================================
+
+class ManejadorColector(BaseHTTPRequestHandler):
+    almacen = None
+    fallos = 0.0
+    latencia = 0.0
+
+    def do_POST(self):
+        if self.path != '/eventos':
+            return self._responder(404, {'error': f"Ruta desconocida: '{self.path}'"})
+        cuerpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.latencia:
+            time.sleep(self.latencia)
+        if self.fallos and random.random() < self.fallos:
+            return self._responder(503, {'error': "fallo simulado"})
+        try:
+            if self.headers.get('Content-Encoding') == 'gzip':
+                cuerpo = gzip.decompress(cuerpo)
+            lote = json.loads(cuerpo)
+            dispositivo, eventos = lote['dispositivo'], lote['eventos']
+            if not all('id' in evento for evento in eventos):
+                raise ValueError("evento sin 'id'")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            return self._responder(400, {'error': f"lote no válido: {e}"})
+        aceptados, duplicados = self.almacen.guardar(dispositivo, eventos)
+        self._responder(200, {'aceptados': aceptados, 'duplicados': duplicados})
+
+    def do_GET(self):
+        if self.path == '/resumen':
+            self._responder(200, {'resumen': self.almacen.resumen()})
+        else:
+            self._responder(404, {'error': f"Ruta desconocida: '{self.path}'"})
+
+    def _responder(self, codigo, datos):
+        cuerpo = serializar(datos)
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *argumentos):
+        pass
+
+def crear_servidor(almacen, direccion, fallos=0.0, latencia=0.0):
+    manejador = type('Manejador', (ManejadorColector,),
+                     {'almacen': almacen, 'fallos': fallos, 'latencia': latencia})
+    return ThreadingHTTPServer(direccion, manejador)
+
+# ==============================================================================
+# INICIO DEL PROGRAMA
+# ==============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Colector local de eventos del sistema NFC (pruebas)")
+    parser.add_argument('--direccion', default=DIRECCION, help="host:puerto donde escuchar")
+    parser.add_argument('--bd', default=ARCHIVO_BD, help="Base de datos de eventos recibidos")
+    parser.add_argument('--fallos', type=float, default=0.0, help="Fracción de envíos que responden 503")
+    parser.add_argument('--latencia', type=float, default=0.0, help="Segundos de espera antes de responder")
+    args = parser.parse_args(argv)
+
+    almacen = AlmacenColector(args.bd)
+    servidor = crear_servidor(almacen, parsear_direccion(args.direccion), args.fallos, args.latencia)
+    host, puerto = servidor.server_address[:2]
+    print(f"Colector escuchando en http://{host}:{puerto}/eventos (Ctrl+C para salir)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\nColector detenido.")
+    finally:
+        servidor.server_close()
+        almacen.cerrar()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
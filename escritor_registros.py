@@ -0,0 +1,145 @@
+"""
+Escritores de registro persistentes con escritura agrupada (group commit).
+
+Cada EscritorRegistro mantiene su archivo abierto en modo O_APPEND y acumula
+las filas CSV en memoria. El lote se vuelca con UNA llamada a write() cuando
+llega a 'max_filas', cuando pasan 'max_espera' segundos o al cerrar.
+
+Política de fsync:
+    "ninguno" -> sólo write(); el sistema operativo decide cuándo llega al disco
+    "lote"    -> fsync() tras cada lote volcado
+    "evento"  -> cada fila se vuelca y se sincroniza al momento (sin agrupar)
+
+Al abrir un registro se recorta una posible fila a medio escribir al final
+(p. ej. tras un corte de luz), de modo que nunca quedan filas partidas.
+"""
+import csv
+import io
+import os
+import threading
+
+POLITICAS_FSYNC = ("ninguno", "lote", "evento")
+
+# ==============================================================================
+# 1. REPARACIÓN DEL FINAL DEL ARCHIVO
+# ==============================================================================
+
+def recortar_fila_incompleta(ruta):
+    """Elimina los bytes posteriores al último salto de línea. Devuelve los bytes eliminados."""
+    if not os.path.exists(ruta):
+        return 0
+    with open(ruta, 'r+b') as f:
+        tamano = f.seek(0, os.SEEK_END)
+        if tamano == 0:
+            return 0
+        # Buscar el último '\n' leyendo hacia atrás en bloques
+        posicion = tamano
+        while posicion > 0:
+            inicio = max(0, posicion - 4096)
+            f.seek(inicio)
+            bloque = f.read(posicion - inicio)
+            indice = bloque.rfind(b"\n")
+            if indice >= 0:
+                fin_valido = inicio + indice + 1
+                break
+            posicion = inicio
+        else:
+            fin_valido = 0
+
+        if fin_valido < tamano:
+            f.truncate(fin_valido)
+            return tamano - fin_valido
+    return 0
+
+# ==============================================================================
+# 2. ESCRITOR
+# ==============================================================================
+
+class EscritorRegistro:
+    """Registro CSV de sólo-añadir con el archivo abierto y escritura por lotes."""
+
+    def __init__(self, ruta, encabezados=None, max_filas=32, max_espera=1.0, politica_fsync="lote"):
+        if politica_fsync not in POLITICAS_FSYNC:
+            raise ValueError(f"Política de fsync desconocida: '{politica_fsync}'")
+
+        self.ruta = ruta
+        self.max_filas = max_filas
+        self.max_espera = max_espera
+        self.politica_fsync = politica_fsync
+
+        recortados = recortar_fila_incompleta(ruta)
+        if recortados:
+            print(f"*** ADVERTENCIA: se descartó una fila incompleta ({recortados} bytes) al final de '{ruta}'")
+
+        self._fd = os.open(ruta, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._pendientes = []
+        self._cerrojo = threading.Lock()
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer)
+
+        if encabezados and os.fstat(self._fd).st_size == 0:
+            self.escribir(encabezados)
+            self.vaciar()
+
+        self._detener = threading.Event()
+        self._hilo = None
+        if max_espera and politica_fsync != "evento":
+            self._hilo = threading.Thread(target=self._vaciar_periodicamente, daemon=True)
+            self._hilo.start()
+
+    def _vaciar_periodicamente(self):
+        while not self._detener.wait(self.max_espera):
+            try:
+                self.vaciar()
+            except OSError as e:
+                print(f"*** ERROR al volcar el registro '{self.ruta}': {e}")
+
+    def escribir(self, fila):
+        """
+        Encola una fila; se vuelca al completar el lote (o al momento con 'evento').
+        Devuelve el tamaño en bytes de la fila codificada.
+        """
+        with self._cerrojo:
+            self._csv.writerow(fila)
+            codificada = self._buffer.getvalue().encode('utf-8')
+            self._pendientes.append(codificada)
+            self._buffer.seek(0)
+            self._buffer.truncate()
+            lleno = self.politica_fsync == "evento" or len(self._pendientes) >= self.max_filas
+        if lleno:
+            self.vaciar()
+        return len(codificada)
+
+    def vaciar(self):
+        """Escribe el lote pendiente con una sola llamada a write() (y fsync según la política)."""
+        with self._cerrojo:
+            if not self._pendientes or self._fd is None:
+                return
+            datos = b"".join(self._pendientes)
+            self._pendientes.clear()
+            # write() puede escribir menos bytes de los pedidos: completar el lote
+            vista = memoryview(datos)
+            while vista:
+                escritos = os.write(self._fd, vista)
+                vista = vista[escritos:]
+            if self.politica_fsync != "ninguno":
+                os.fsync(self._fd)
+
+    def truncar(self):
+        """Descarta lo pendiente y deja el archivo vacío (compactación del diario)."""
+        with self._cerrojo:
+            self._pendientes.clear()
+            os.ftruncate(self._fd, 0)
+            if self.politica_fsync != "ninguno":
+                os.fsync(self._fd)
+
+    def cerrar(self):
+        """Vuelca lo pendiente y cierra el archivo."""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+        self.vaciar()
+        with self._cerrojo:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
@@ -0,0 +1,346 @@
+"""
+Exportación columnar incremental de registro_accesos.csv y registro_tiempos.csv.
+
+Cada 'exportar' lee sólo lo escrito desde la exportación anterior (marca de
+agua por archivo: byte alcanzado, huella de los bytes previos y última marca
+de tiempo) y lo añade como un TROZO nuevo: un archivo binario por columna,
+little-endian y sin cabecera. El coste de cada noche depende del tráfico del
+día, no del tamaño acumulado de los registros.
+
+Estructura en disco:
+    exportacion/manifiesto.json                <- columnas, trozos, categorías y marcas de agua
+    exportacion/accesos/000001.timestamp.i8    <- segundos epoch (int64)
+    exportacion/accesos/000001.matricula.u4    <- código en categorias['matricula'] (uint32)
+    exportacion/accesos/000001.evento.u1       <- código en categorias['evento'] (ENTRADA, SALIDA)
+    exportacion/accesos/000001.puerta.u2       <- código en categorias['puerta']
+    exportacion/tiempos/000001.timestamp.i8    <- instante de la salida
+    exportacion/tiempos/000001.matricula.u4
+    exportacion/tiempos/000001.duracion.u4     <- segundos de permanencia
+
+'nombres' del manifiesto va alineado con categorias['matricula'] (último
+nombre visto de cada matrícula). El manifiesto se escribe al final, de forma
+atómica: una exportación interrumpida no deja trozos a medias a la vista.
+
+Lectura sin parseo: cargar_tabla() (array.fromfile) o, con NumPy,
+    numpy.fromfile('exportacion/accesos/000001.timestamp.i8', dtype='<i8')
+
+Los registros particionados (ver particiones.py) se exportan pasando su
+directorio; cada partición lleva su propia marca de agua. Si un archivo se
+reescribió (p. ej. con 'marcas_tiempo.py migrar') su huella deja de coincidir:
+se relee entero y sólo se exportan las filas posteriores a su última marca.
+
+Uso:
+    python exportacion.py exportar
+    python exportacion.py exportar --accesos registros/registro_accesos --tiempos registros/registro_tiempos
+    python exportacion.py estado
+    python exportacion.py leer accesos
+"""
+import argparse
+import array
+import collections
+import csv
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+
+import particiones
+from marcas_tiempo import a_epoch, ahora, formatear
+
+ARCHIVO_ACCESOS = "registro_accesos.csv"
+ARCHIVO_TIEMPOS = "registro_tiempos.csv"
+DESTINO = "exportacion"
+ARCHIVO_MANIFIESTO = "manifiesto.json"
+VERSION_MANIFIESTO = 1
+TAMANO_HUELLA = 4096  # Bytes previos a la marca de agua que se comparan para detectar reescrituras
+
+# Columnas de cada tabla y su tipo (sufijo del archivo, al estilo de NumPy)
+TABLAS = {
+    'accesos': (('timestamp', 'i8'), ('matricula', 'u4'), ('evento', 'u1'), ('puerta', 'u2')),
+    'tiempos': (('timestamp', 'i8'), ('matricula', 'u4'), ('duracion', 'u4')),
+}
+TIPOS_ARRAY = {'i8': 'q', 'u4': 'I', 'u2': 'H', 'u1': 'B'}
+CATEGORIAS_INICIALES = {'matricula': [], 'evento': ['ENTRADA', 'SALIDA'], 'puerta': []}
+
+# ==============================================================================
+# 1. MANIFIESTO
+# ==============================================================================
+
+def manifiesto_vacio():
+    return {
+        'version': VERSION_MANIFIESTO,
+        'orden_bytes': 'little',
+        'tablas': {tabla: {'columnas': dict(columnas), 'trozos': [], 'marcas': {}}
+                   for tabla, columnas in TABLAS.items()},
+        'categorias': {nombre: list(valores) for nombre, valores in CATEGORIAS_INICIALES.items()},
+        'nombres': [],
+        'exportado': None,
+    }
+
+def cargar_manifiesto(destino=DESTINO):
+    try:
+        with open(os.path.join(destino, ARCHIVO_MANIFIESTO), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return manifiesto_vacio()
+
+def guardar_manifiesto(destino, manifiesto):
+    """Escritura atómica: es el punto en que la exportación queda confirmada."""
+    ruta = os.path.join(destino, ARCHIVO_MANIFIESTO)
+    temporal = ruta + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+def ruta_columna(destino, tabla, numero, columna, tipo):
+    return os.path.join(destino, tabla, f"{numero:06d}.{columna}.{tipo}")
+
+# ==============================================================================
+# 2. LECTURA INCREMENTAL DE LOS REGISTROS
+# ==============================================================================
+
+def _abrir_binario(ruta):
+    return gzip.open(ruta, 'rb') if ruta.endswith('.gz') else open(ruta, 'rb')
+
+def _resumen(datos):
+    return hashlib.blake2b(datos, digest_size=16).hexdigest()
+
+def fuentes(origen):
+    """[(clave, ruta, filas según el índice o None)] de un registro o de un directorio de particiones."""
+    if os.path.isdir(origen):
+        indice = particiones.cargar_indice(origen)
+        claves = sorted(indice['particiones'])
+        # La partición activa se abre siempre: su número de filas en el índice puede ir retrasado
+        return [(clave, os.path.join(origen, indice['particiones'][clave]['archivo']),
+                 indice['particiones'][clave]['filas'] if clave != claves[-1] else None)
+                for clave in claves]
+    if os.path.exists(origen):
+        return [(os.path.basename(origen), origen, None)]
+    return []
+
+def filas_nuevas(ruta, marca, filas_indice=None):
+    """
+    Genera (instante, fila) de las filas completas escritas desde 'marca'
+    ({'desplazamiento', 'huella', 'ultimo', 'filas'}) y la deja actualizada al
+    terminar. Una partición cuyo número de filas en el índice no cambió no se abre.
+    """
+    if filas_indice is not None and marca.get('filas') == filas_indice:
+        return
+
+    desde, ultimo = marca.get('desplazamiento', 0), marca.get('ultimo', 0)
+    with _abrir_binario(ruta) as f:
+        releer = False
+        if desde:
+            inicio_huella = max(0, desde - TAMANO_HUELLA)
+            f.seek(inicio_huella)
+            if _resumen(f.read(desde - inicio_huella)) != marca.get('huella'):
+                # Archivo reescrito o sustituido: la posición ya no vale, sí la última marca
+                releer, desde = True, 0
+                f.seek(0)
+
+        posicion = desde
+        recientes = collections.deque()  # Últimas líneas leídas (para la huella)
+        longitud_recientes = 0
+
+        def lineas():
+            nonlocal posicion, longitud_recientes
+            for linea in f:
+                if not linea.endswith(b"\n"):
+                    break  # Fila a medio escribir: se exportará la próxima vez
+                posicion += len(linea)
+                recientes.append(linea)
+                longitud_recientes += len(linea)
+                while longitud_recientes - len(recientes[0]) >= TAMANO_HUELLA:
+                    longitud_recientes -= len(recientes.popleft())
+                yield linea.decode('utf-8')
+
+        lector_csv = csv.reader(lineas())
+        if desde == 0:
+            next(lector_csv, None)  # Encabezados
+        maximo = ultimo
+        for fila in lector_csv:
+            instante = a_epoch(fila[0]) if len(fila) >= 2 else None
+            if instante is None or (releer and instante <= ultimo):
+                continue
+            maximo = max(maximo, instante)
+            yield instante, fila
+
+        if recientes or releer:
+            cola = b"".join(recientes)[-TAMANO_HUELLA:]
+            if len(cola) < TAMANO_HUELLA and posicion > len(cola):
+                # Pocas líneas nuevas: completar la huella con los bytes anteriores
+                f.seek(posicion - min(posicion, TAMANO_HUELLA))
+                cola = f.read(min(posicion, TAMANO_HUELLA))
+            marca['huella'] = _resumen(cola)
+    marca['desplazamiento'] = posicion
+    marca['ultimo'] = maximo
+    if filas_indice is not None:
+        marca['filas'] = filas_indice
+
+# ==============================================================================
+# 3. EXPORTACIÓN
+# ==============================================================================
+
+class Categorias:
+    """Diccionarios valor -> código de las columnas categóricas (sólo crecen)."""
+
+    def __init__(self, manifiesto):
+        self.valores = manifiesto['categorias']
+        self.nombres = manifiesto['nombres']
+        self._codigos = {columna: {valor: i for i, valor in enumerate(valores)}
+                         for columna, valores in self.valores.items()}
+
+    def codigo(self, columna, valor):
+        codigos = self._codigos[columna]
+        codigo = codigos.get(valor)
+        if codigo is None:
+            codigo = codigos[valor] = len(self.valores[columna])
+            self.valores[columna].append(valor)
+        return codigo
+
+    def matricula(self, matricula, nombre):
+        codigo = self.codigo('matricula', matricula)
+        if codigo == len(self.nombres):
+            self.nombres.append(nombre)
+        elif nombre and self.nombres[codigo] != nombre:
+            self.nombres[codigo] = nombre
+        return codigo
+
+def _anadir_acceso(columnas, categorias, instante, fila):
+    if len(fila) < 4:
+        return False
+    columnas['timestamp'].append(instante)
+    columnas['matricula'].append(categorias.matricula(fila[1], fila[2]))
+    columnas['evento'].append(categorias.codigo('evento', fila[3]))
+    columnas['puerta'].append(categorias.codigo('puerta', fila[4] if len(fila) > 4 else ""))
+    return True
+
+def _anadir_tiempo(columnas, categorias, instante, fila):
+    try:
+        duracion = int(fila[3]) * 3600 + int(fila[4]) * 60 + int(fila[5])
+    except (IndexError, ValueError):
+        return False
+    columnas['timestamp'].append(instante)
+    columnas['matricula'].append(categorias.matricula(fila[1], fila[2]))
+    columnas['duracion'].append(duracion)
+    return True
+
+ANADIR_FILA = {'accesos': _anadir_acceso, 'tiempos': _anadir_tiempo}
+
+def escribir_trozo(destino, tabla, columnas, manifiesto):
+    """Escribe un trozo (un archivo por columna, sincronizado) y lo anota en el manifiesto."""
+    trozos = manifiesto['tablas'][tabla]['trozos']
+    numero = trozos[-1]['numero'] + 1 if trozos else 1
+    os.makedirs(os.path.join(destino, tabla), exist_ok=True)
+    for columna, tipo in TABLAS[tabla]:
+        datos = columnas[columna]
+        if sys.byteorder != 'little':
+            datos = array.array(datos.typecode, datos)
+            datos.byteswap()
+        with open(ruta_columna(destino, tabla, numero, columna, tipo), 'wb') as f:
+            datos.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+    instantes = columnas['timestamp']
+    trozos.append({'numero': numero, 'filas': len(instantes), 'desde': min(instantes), 'hasta': max(instantes)})
+
+def exportar(destino=DESTINO, accesos=ARCHIVO_ACCESOS, tiempos=ARCHIVO_TIEMPOS):
+    """
+    Añade a 'destino' las filas nuevas de cada registro (archivo o directorio
+    de particiones; None para omitirlo). Devuelve {tabla: filas exportadas}.
+    """
+    manifiesto = cargar_manifiesto(destino)
+    categorias = Categorias(manifiesto)
+    exportadas = {}
+
+    for tabla, origen in (('accesos', accesos), ('tiempos', tiempos)):
+        if origen is None:
+            continue
+        columnas = {columna: array.array(TIPOS_ARRAY[tipo]) for columna, tipo in TABLAS[tabla]}
+        marcas = manifiesto['tablas'][tabla]['marcas']
+        anadir = ANADIR_FILA[tabla]
+        for clave, ruta, filas_indice in fuentes(origen):
+            marca = marcas.setdefault(clave, {})
+            for instante, fila in filas_nuevas(ruta, marca, filas_indice):
+                anadir(columnas, categorias, instante, fila)
+        if columnas['timestamp']:
+            escribir_trozo(destino, tabla, columnas, manifiesto)
+        exportadas[tabla] = len(columnas['timestamp'])
+
+    os.makedirs(destino, exist_ok=True)
+    manifiesto['exportado'] = ahora()
+    guardar_manifiesto(destino, manifiesto)
+    return exportadas
+
+# ==============================================================================
+# 4. LECTURA DE LA EXPORTACIÓN
+# ==============================================================================
+
+def cargar_tabla(destino, tabla, manifiesto=None):
+    """{columna: array} con todos los trozos de 'tabla', leídos sin parsear (array.fromfile)."""
+    manifiesto = manifiesto or cargar_manifiesto(destino)
+    columnas = {columna: array.array(TIPOS_ARRAY[tipo]) for columna, tipo in TABLAS[tabla]}
+    for trozo in manifiesto['tablas'][tabla]['trozos']:
+        for columna, tipo in TABLAS[tabla]:
+            with open(ruta_columna(destino, tabla, trozo['numero'], columna, tipo), 'rb') as f:
+                columnas[columna].fromfile(f, trozo['filas'])
+    if sys.byteorder != 'little':
+        for datos in columnas.values():
+            datos.byteswap()
+    return columnas
+
+# ==============================================================================
+# INICIO DEL PROGRAMA
+# ==============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportación columnar incremental de los registros")
+    parser.add_argument('--destino', default=DESTINO, help="Directorio de la exportación")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    exportacion = subcomandos.add_parser('exportar', help="Añadir las filas nuevas desde la última exportación")
+    exportacion.add_argument('--accesos', default=ARCHIVO_ACCESOS, help="Registro o directorio de particiones")
+    exportacion.add_argument('--tiempos', default=ARCHIVO_TIEMPOS, help="Registro o directorio de particiones")
+    subcomandos.add_parser('estado', help="Trozos, filas y marcas de agua")
+    lectura = subcomandos.add_parser('leer', help="Cargar una tabla y medir la lectura")
+    lectura.add_argument('tabla', choices=sorted(TABLAS))
+    args = parser.parse_args(argv)
+
+    if args.comando == 'exportar':
+        inicio = time.perf_counter()
+        exportadas = exportar(args.destino, args.accesos, args.tiempos)
+        for tabla, filas in exportadas.items():
+            print(f"   {tabla}: {filas} filas nuevas")
+        print(f"-> Exportación en '{args.destino}' ({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+        return 0
+
+    manifiesto = cargar_manifiesto(args.destino)
+    if args.comando == 'estado':
+        print(f"Última exportación: {formatear(manifiesto['exportado']) or 'nunca'}")
+        for tabla, datos in manifiesto['tablas'].items():
+            trozos = datos['trozos']
+            filas = sum(trozo['filas'] for trozo in trozos)
+            rango = f"{formatear(trozos[0]['desde'])} .. {formatear(max(t['hasta'] for t in trozos))}" if trozos else "-"
+            print(f"   {tabla}: {filas} filas en {len(trozos)} trozos ({rango})")
+            for clave, marca in sorted(datos['marcas'].items()):
+                print(f"      {clave}: byte {marca.get('desplazamiento', 0)}, "
+                      f"última marca {formatear(marca.get('ultimo')) or '-'}")
+        print(f"   {len(manifiesto['categorias']['matricula'])} matrículas, "
+              f"{len(manifiesto['categorias']['puerta'])} puertas")
+        return 0
+
+    inicio = time.perf_counter()
+    columnas = cargar_tabla(args.destino, args.tabla, manifiesto)
+    duracion = time.perf_counter() - inicio
+    instantes = columnas['timestamp']
+    print(f"{args.tabla}: {len(instantes)} filas, columnas {', '.join(columnas)} "
+          f"({duracion * 1000:.1f} ms)")
+    if instantes:
+        print(f"   {formatear(min(instantes))} .. {formatear(max(instantes))}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,96 +1,98 @@
-import RPi.GPIO as GPIO
-from mfrc522 import SimpleMFRC522
-import time
-import csv
+"""
+Lector de identificación: muestra el nombre y la matrícula de cada tarjeta
+registrada en usuarios.csv (sin registrar accesos).
+
+Uso:
+    python lector_hardware.py
+    python nfc_acceso.py identificar
+"""
 import os
+import sys
+import time
+
+from lectores import crear_lector, liberar_gpio
+from roster_usuarios import cargar_usuarios
 
 # --- Configuración ---
 ARCHIVO_USUARIOS = "usuarios.csv"
-USUARIOS = {} # Diccionario para almacenar los usuarios (UID será la clave)
-
-# Crea una instancia de la clase SimpleMFRC522
-reader = SimpleMFRC522()
 
 # --- Funciones ---
 
-def cargar_usuarios():
-    """Carga los datos del CSV en el diccionario USUARIOS."""
-    print(f"Cargando usuarios desde: {ARCHIVO_USUARIOS}...")
-    
-    if not os.path.exists(ARCHIVO_USUARIOS):
-        print(f"*** ERROR: El archivo '{ARCHIVO_USUARIOS}' no existe.")
+def cargar_roster(ruta=ARCHIVO_USUARIOS):
+    """Roster (UID -> Usuario) de 'ruta' a través de su caché binaria, o None si no se puede leer."""
+    print(f"Cargando usuarios desde: {ruta}...")
+
+    if not os.path.exists(ruta):
+        print(f"*** ERROR: El archivo '{ruta}' no existe.")
         print("Asegúrate de crearlo con los datos de UID y Nombre.")
-        return False
-        
+        return None
+
     try:
-        with open(ARCHIVO_USUARIOS, mode='r', newline='', encoding='utf-8') as archivo:
-            lector_csv = csv.reader(archivo)
-            next(lector_csv) # Saltar la fila de encabezados (UID,Nombre,Matricula)
-            
-            for fila in lector_csv:
-                # La fila es: [UID, Nombre, Matricula]
-                if len(fila) >= 2:
-                    # El UID debe ser la clave y lo convertimos a INT para la comparación
-                    try:
-                        uid_key = int(fila[0].strip())
-                        USUARIOS[uid_key] = {
-                            "nombre": fila[1].strip(),
-                            "matricula": fila[2].strip() if len(fila) > 2 else "N/A"
-                        }
-                    except ValueError:
-                        print(f"*** ADVERTENCIA: UID no válido en la fila: {fila[0]}. Ignorando.")
-                        
-        print(f"Carga completa. {len(USUARIOS)} usuarios registrados.")
-        return True
-        
-    except Exception as e:
+        usuarios = cargar_usuarios(ruta)
+    except (OSError, ValueError) as e:
         print(f"*** ERROR al leer el CSV: {e}")
-        return False
+        return None
+
+    print(f"Carga completa. {len(usuarios)} usuarios registrados.")
+    return usuarios
+
+def main(al_arrancar=None):
+    """Bucle de identificación. Con 'al_arrancar' lo llama tras cargar usuarios y lector, y sale sin leer."""
+    # Los usuarios se cargan antes de abrir el lector: si falla, no se toca el GPIO
+    usuarios = cargar_roster()
+    if usuarios is None:
+        print("El programa se cerrará. Resuelve el error de archivo CSV.")
+        return 1
+
+    # Crea el lector (MFRC522 o simulado según NFC_LECTOR; ver lectores.py)
+    reader = crear_lector()
+
+    print("\n--- Lector de Identificación NFC/RFID ---")
+    print("Coloca tu tarjeta cerca del lector...")
+    print("Presiona Ctrl+C para salir.")
+
+    try:
+        if al_arrancar is not None:
+            al_arrancar()
+            return 0
+
+        while True:
+            # read_id() lee SOLO el ID Único (UID) en formato de número entero.
+            id_unico = reader.read_id()
+
+            if id_unico:
+                print("-" * 50)
+                print(f"Tarjeta detectada. UID: {id_unico}")
+
+                # 1. Buscar el UID en el roster de usuarios
+                datos_usuario = usuarios.get(id_unico)
+                if datos_usuario is not None:
+                    # 2. Si se encuentra, imprimir los datos del usuario
+                    print("ACCESO CONCEDIDO")
+                    print(f"-> Nombre: {datos_usuario['nombre']}")
+                    print(f"-> Matrícula: {datos_usuario['matricula'] or 'N/A'}")
+
+                else:
+                    # 3. Si no se encuentra, denegar el acceso
+                    print("ACCESO DENEGADO")
+                    print(f"-> Tarjeta NO registrada en el sistema.")
+
+                print("-" * 50)
+
+                # Esperar 3 segundos para evitar la re-lectura instantánea
+                time.sleep(3)
+
+    except KeyboardInterrupt:
+        print("\nPrograma detenido por el usuario.")
+        return 0
+
+    finally:
+        # Limpia los pines GPIO al finalizar
+        reader.cerrar()
+        liberar_gpio()
+        print("Limpieza de GPIO completada.")
 
 # --- Programa Principal ---
 
-# Intentar cargar los usuarios al inicio del programa
-if not cargar_usuarios():
-    print("El programa se cerrará. Resuelve el error de archivo CSV.")
-    GPIO.cleanup()
-    exit()
-
-print("\n--- Lector de Identificación NFC/RFID ---")
-print("Coloca tu tarjeta cerca del lector...")
-print("Presiona Ctrl+C para salir.")
-
-try:
-    while True:
-        # read_id() lee SOLO el ID Único (UID) en formato de número entero.
-        id_unico = reader.read_id()
-        
-        if id_unico:
-            print("-" * 50)
-            print(f"Tarjeta detectada. UID: {id_unico}")
-            
-            # 1. Buscar el UID en el diccionario de usuarios
-            if id_unico in USUARIOS:
-                # 2. Si se encuentra, imprimir los datos del usuario
-                datos_usuario = USUARIOS[id_unico]
-                
-                print("ACCESO CONCEDIDO")
-                print(f"-> Nombre: {datos_usuario['nombre']}")
-                print(f"-> Matrícula: {datos_usuario['matricula']}")
-                
-            else:
-                # 3. Si no se encuentra, denegar el acceso
-                print("ACCESO DENEGADO")
-                print(f"-> Tarjeta NO registrada en el sistema.")
-            
-            print("-" * 50)
-            
-            # Esperar 3 segundos para evitar la re-lectura instantánea
-            time.sleep(3) 
-
-except KeyboardInterrupt:
-    print("\nPrograma detenido por el usuario.")
-
-finally:
-    # Limpia los pines GPIO al finalizar
-    GPIO.cleanup()
-    print("Limpieza de GPIO completada.")
+if __name__ == '__main__':
+    sys.exit(main())
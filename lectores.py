@@ -0,0 +1,431 @@
+"""
+Backends de lector NFC/RFID intercambiables.
+
+Todos exponen la misma interfaz que SimpleMFRC522, más cerrar():
+    read_id()           -> bloquea hasta leer un UID (int)
+    read_id_no_block()  -> UID (int) o None si no hay tarjeta
+    read()              -> (UID, texto), bloqueante
+    esperar_tarjeta(t)  -> True si puede haber una tarjeta (con IRQ duerme hasta
+                           el flanco o 't' segundos; con sondeo vuelve enseguida)
+    cerrar()            -> libera el SPI de ese lector / detiene la simulación
+
+Los pines GPIO se liberan una sola vez al salir, con liberar_gpio(), después
+de cerrar todos los lectores (GPIO.cleanup() afecta a todas las puertas).
+
+El backend se elige con crear_lector() o la variable de entorno NFC_LECTOR:
+    "mfrc522"       sondeo por SPI (por defecto): read_id() repite peticiones
+                    al chip sin pausa y ocupa un núcleo mientras nadie pasa.
+    "irq"           el chip avisa por su pin IRQ (flanco de bajada) cuando una
+                    tarjeta responde; el hilo duerme entre avisos. Si el pin no
+                    admite detección de flancos se vuelve al sondeo.
+    "simulado"      sin hardware (sondeo), para trabajar fuera de la Raspberry Pi.
+    "simulado_irq"  simulado con una fuente de IRQ falsa.
+
+Varias puertas se describen en NFC_PUERTAS y se abren con crear_lectores():
+    NFC_PUERTAS="norte:0.0,sur:0.1:25:16"   # puerta:bus.device[:pin_rst[:pin_irq]] (SPI)
+Sin pin_irq en la puerta se usa NFC_PIN_IRQ (18 por defecto, numeración BOARD
+como mfrc522 y pirc522).
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+LECTOR_POR_DEFECTO = "mfrc522"
+PUERTA_POR_DEFECTO = "principal"
+PIN_IRQ_POR_DEFECTO = 18  # Numeración BOARD (el mismo pin que usa pirc522)
+INTERVALO_REARME = 0.1    # Segundos entre peticiones REQA mientras se espera la IRQ
+
+# ==============================================================================
+# 1. LECTOR REAL (MFRC522 por SPI)
+# ==============================================================================
+
+class LectorMFRC522:
+    """
+    Envoltorio de SimpleMFRC522. Importa el hardware sólo al abrir el lector.
+    Varios lectores comparten el bus SPI con distinto chip-select ('device') y pin RST.
+    """
+
+    def __init__(self, bus=0, device=0, pin_rst=None):
+        from mfrc522 import MFRC522, SimpleMFRC522
+        opciones = {'bus': bus, 'device': device}
+        if pin_rst is not None:
+            opciones['pin_rst'] = pin_rst
+        # SimpleMFRC522() abre y reinicia siempre el chip 0.0: se envuelve sólo el chip de esta puerta
+        self._lector = SimpleMFRC522.__new__(SimpleMFRC522)
+        self._lector.READER = MFRC522(**opciones)
+
+    def read_id(self):
+        return self._lector.read_id()
+
+    def read_id_no_block(self):
+        return self._lector.read_id_no_block()
+
+    def read(self):
+        return self._lector.read()
+
+    def esperar_tarjeta(self, tiempo_limite=None):
+        return True  # Sondeo: cada read_id_no_block() consulta el chip
+
+    def armar_irq(self):
+        """
+        Envía una petición REQA con la IRQ de recepción habilitada (como
+        wait_for_tag() de pirc522): si hay una tarjeta en el campo, su respuesta
+        baja el pin IRQ. Son seis escrituras SPI, frente a las cientos de
+        lecturas de registro de un intento de read_id_no_block() sin tarjeta.
+        """
+        chip = self._lector.READER
+        chip.Write_MFRC522(chip.CommIrqReg, 0x7F)     # Borrar avisos pendientes
+        chip.Write_MFRC522(chip.FIFOLevelReg, 0x80)   # Vaciar la FIFO
+        chip.Write_MFRC522(chip.CommIEnReg, 0xA0)     # IRQ invertida (activa a nivel bajo), sólo RxIRq
+        chip.Write_MFRC522(chip.FIFODataReg, chip.PICC_REQIDL)
+        chip.Write_MFRC522(chip.CommandReg, chip.PCD_TRANSCEIVE)
+        chip.Write_MFRC522(chip.BitFramingReg, 0x87)  # StartSend, trama corta de 7 bits
+
+    def cerrar(self):
+        self._lector.READER.spi.close()  # Los pines son compartidos: se liberan con liberar_gpio()
+
+def liberar_gpio():
+    """GPIO.cleanup() de todos los pines, al salir. Sin RPi.GPIO cargado (simulado) no hace nada."""
+    gpio = sys.modules.get('RPi.GPIO')
+    if gpio is not None:
+        gpio.cleanup()
+
+# ==============================================================================
+# 2. LECTOR SIMULADO (sin hardware)
+# ==============================================================================
+
+class LectorSimulado:
+    """
+    Reproduce un flujo de UIDs a un ritmo fijo de taps por segundo.
+
+    - guion: lista de UIDs que se entregan en orden.
+    - poblacion: si no hay guion, UIDs elegidos al azar de esta lista.
+    - total: número de taps a entregar (None = infinito con 'poblacion').
+    - tiempo_lectura: segundos que tarda cada intento de lectura RF simulado.
+    - textos: UID -> texto guardado en la tarjeta (para read()).
+    - tiempo_lectura_texto: segundos extra que read() tarda en leer los bloques de datos.
+
+    Como en el hardware, read() justo después de read_id()/read_id_no_block()
+    relee la tarjeta que sigue sobre el lector en vez de esperar a otra.
+    """
+
+    def __init__(self, guion=None, poblacion=None, taps_por_segundo=1.0, total=None,
+                 tiempo_lectura=0.0, textos=None, semilla=None, tiempo_lectura_texto=0.0):
+        if guion is None and not poblacion:
+            raise ValueError("Se necesita un 'guion' o una 'poblacion' de UIDs.")
+
+        self.guion = list(guion) if guion is not None else None
+        self.poblacion = list(poblacion) if poblacion else []
+        self.intervalo = 1.0 / taps_por_segundo if taps_por_segundo > 0 else 0.0
+        self.total = len(self.guion) if self.guion is not None else total
+        self.tiempo_lectura = tiempo_lectura
+        self.textos = textos or {}
+        self.tiempo_lectura_texto = tiempo_lectura_texto
+        self.entregados = 0
+        self._en_lector = None  # Última tarjeta entregada y aún no leída con read()
+
+        self._azar = random.Random(semilla)
+        self._inicio = None
+        self._cerrado = threading.Event()
+        self._cerrojo = threading.Lock()
+
+    @property
+    def agotado(self):
+        """True cuando ya se entregaron todos los taps programados."""
+        return self.total is not None and self.entregados >= self.total
+
+    def _siguiente_uid(self):
+        if self.guion is not None:
+            return self.guion[self.entregados]
+        return self._azar.choice(self.poblacion)
+
+    def _instante_siguiente(self):
+        if self._inicio is None:
+            self._inicio = time.monotonic()
+        return self._inicio + self.entregados * self.intervalo
+
+    def segundos_hasta_tarjeta(self):
+        """Segundos hasta el próximo tap programado (0 si ya toca); None si no habrá más."""
+        with self._cerrojo:
+            if self.agotado or self._cerrado.is_set():
+                return None
+            return max(0.0, self._instante_siguiente() - time.monotonic())
+
+    def esperar_tarjeta(self, tiempo_limite=None):
+        return True  # Sondeo, como el MFRC522 sin IRQ
+
+    def read_id_no_block(self):
+        if self.tiempo_lectura:
+            time.sleep(self.tiempo_lectura)
+
+        with self._cerrojo:
+            if self.agotado or self._cerrado.is_set():
+                return None
+            siguiente = self._instante_siguiente()  # Antes de leer el reloj: el primer intento lo pone en marcha
+            if time.monotonic() < siguiente:
+                return None
+            uid = self._siguiente_uid()
+            self.entregados += 1
+            self._en_lector = uid
+            return uid
+
+    def read_id(self):
+        while not self._cerrado.is_set():
+            if self.agotado:
+                # No habrá más tarjetas: esperar hasta que se cierre el lector
+                self._cerrado.wait()
+                break
+
+            espera = self._instante_siguiente() - time.monotonic()
+            if espera > 0:
+                self._cerrado.wait(espera)
+
+            uid = self.read_id_no_block()
+            if uid is not None:
+                return uid
+        return None
+
+    def read(self):
+        uid = self._en_lector if self._en_lector is not None else self.read_id()
+        self._en_lector = None
+        if self.tiempo_lectura_texto:
+            time.sleep(self.tiempo_lectura_texto)
+        return uid, self.textos.get(uid, "")
+
+    def cerrar(self):
+        self._cerrado.set()
+
+# ==============================================================================
+# 3. LECTOR POR INTERRUPCIÓN (IRQ)
+# ==============================================================================
+
+class FuenteIRQ:
+    """Aviso de tarjeta: un Event que se activa con cada flanco del pin IRQ."""
+
+    def __init__(self):
+        self._flanco = threading.Event()
+        self.flancos = 0
+
+    def disparar(self, *_):
+        self._flanco.set()
+
+    def limpiar(self):
+        self._flanco.clear()
+
+    def esperar(self, tiempo_limite):
+        """True si llegó un flanco en 'tiempo_limite' segundos (y lo consume)."""
+        if not self._flanco.wait(tiempo_limite):
+            return False
+        self._flanco.clear()
+        self.flancos += 1
+        return True
+
+    def cerrar(self):
+        pass
+
+class FuenteIRQGPIO(FuenteIRQ):
+    """
+    Flanco de bajada en el pin IRQ del MFRC522, detectado por RPi.GPIO en su
+    propio hilo. 'gpio' permite pasar un sustituto (GPIOSimulado) en pruebas.
+    Lanza RuntimeError si el pin no admite detección de flancos.
+    """
+
+    def __init__(self, pin=PIN_IRQ_POR_DEFECTO, gpio=None):
+        super().__init__()
+        if gpio is None:
+            import RPi.GPIO as gpio
+        self.pin = pin
+        self._gpio = gpio
+        gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP)
+        gpio.add_event_detect(pin, gpio.FALLING, callback=self.disparar)
+
+    def cerrar(self):
+        self._gpio.remove_event_detect(self.pin)
+
+class FuenteIRQSimulada(FuenteIRQ):
+    """
+    IRQ falsa: se dispara con disparar() y, si se enlaza a un LectorSimulado,
+    en el instante de cada tap programado (como el chip cuando una tarjeta
+    responde a la petición REQA).
+    """
+
+    def __init__(self, lector=None):
+        super().__init__()
+        self.lector = lector
+
+    def esperar(self, tiempo_limite):
+        if self.lector is not None:
+            hasta = self.lector.segundos_hasta_tarjeta()
+            if hasta is not None and hasta <= tiempo_limite:
+                self._flanco.wait(hasta)
+                self._flanco.clear()
+                self.flancos += 1
+                return True
+        return super().esperar(tiempo_limite)
+
+class GPIOSimulado:
+    """Sustituto mínimo de RPi.GPIO para FuenteIRQGPIO: flanco(pin) llama al callback registrado."""
+    IN, PUD_UP, FALLING = 1, 22, 32
+
+    def __init__(self):
+        self.callbacks = {}
+
+    def setup(self, pin, modo, pull_up_down=None):
+        pass
+
+    def add_event_detect(self, pin, flanco, callback=None, bouncetime=None):
+        self.callbacks[pin] = callback
+
+    def remove_event_detect(self, pin):
+        self.callbacks.pop(pin, None)
+
+    def flanco(self, pin):
+        callback = self.callbacks.get(pin)
+        if callback is not None:
+            callback(pin)
+
+class LectorIRQ:
+    """
+    Envuelve un lector de sondeo ('lector') y sólo lo consulta cuando la
+    'fuente' de IRQ avisa de una tarjeta. Mientras espera, 'rearmar()' (si hay)
+    repite la petición al chip cada 'intervalo_rearme' segundos y el hilo duerme
+    en un Event: sin tarjetas apenas consume CPU ni compite por el GIL con el
+    hilo procesador.
+    """
+
+    def __init__(self, lector, fuente, rearmar=None, intervalo_rearme=INTERVALO_REARME):
+        self._lector = lector
+        self.fuente = fuente
+        self._rearmar = rearmar
+        self.intervalo_rearme = intervalo_rearme
+        self._cerrado = threading.Event()
+
+    def __getattr__(self, nombre):
+        # agotado, entregados... del lector envuelto (p. ej. un LectorSimulado)
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        return getattr(self._lector, nombre)
+
+    def esperar_tarjeta(self, tiempo_limite=None):
+        """True si la IRQ avisa de una tarjeta antes de 'tiempo_limite' segundos (None = sin límite)."""
+        limite = None if tiempo_limite is None else time.monotonic() + tiempo_limite
+        while not self._cerrado.is_set():
+            espera = self.intervalo_rearme
+            if limite is not None:
+                espera = min(espera, limite - time.monotonic())
+                if espera <= 0:
+                    return False
+            if self._rearmar is not None:
+                self.fuente.limpiar()  # Los flancos de lecturas anteriores no cuentan
+                self._rearmar()
+            if self.fuente.esperar(espera):
+                return not self._cerrado.is_set()
+        return False
+
+    def read_id_no_block(self):
+        return self._lector.read_id_no_block()
+
+    def read_id(self):
+        while self.esperar_tarjeta():
+            uid = self._lector.read_id_no_block()
+            if uid is not None:
+                return uid
+        return None
+
+    def read(self):
+        # Como se usa tras read_id(): la tarjeta sigue en el lector
+        return self._lector.read()
+
+    def cerrar(self):
+        self._cerrado.set()
+        self.fuente.disparar()
+        self.fuente.cerrar()
+        self._lector.cerrar()
+
+def abrir_lector_irq(bus=0, device=0, pin_rst=None, pin_irq=None):
+    """MFRC522 con aviso por IRQ; si el pin no admite flancos, el MFRC522 de sondeo."""
+    pin_irq = pin_irq if pin_irq is not None else int(os.environ.get("NFC_PIN_IRQ", PIN_IRQ_POR_DEFECTO))
+    lector = LectorMFRC522(bus, device, pin_rst)
+    try:
+        fuente = FuenteIRQGPIO(pin_irq)
+    except (RuntimeError, ValueError) as e:
+        print(f"*** ADVERTENCIA: sin IRQ en el pin {pin_irq} ({e}). Se usa el sondeo por SPI.")
+        return lector
+    return LectorIRQ(lector, fuente, rearmar=lector.armar_irq)
+
+# ==============================================================================
+# 4. FÁBRICA
+# ==============================================================================
+
+def crear_lector(tipo=None, **opciones):
+    """
+    Crea el lector indicado ("mfrc522", "irq", "simulado" o "simulado_irq").
+    Sin 'tipo' se usa NFC_LECTOR. El simulado toma sus UIDs de NFC_SIM_UIDS (separados por comas)
+    y su ritmo de NFC_SIM_TAPS_POR_SEGUNDO si no se pasan como opciones.
+    """
+    tipo = (tipo or os.environ.get("NFC_LECTOR", LECTOR_POR_DEFECTO)).lower()
+
+    if tipo == "mfrc522":
+        opciones.pop('pin_irq', None)
+        return LectorMFRC522(**opciones)
+
+    if tipo == "irq":
+        return abrir_lector_irq(**opciones)
+
+    if tipo in ("simulado", "simulado_irq"):
+        if "guion" not in opciones and "poblacion" not in opciones:
+            uids = os.environ.get("NFC_SIM_UIDS", "")
+            opciones["poblacion"] = [int(u) for u in uids.split(",") if u.strip()] \
+                or [random.randint(10**11, 10**12 - 1) for _ in range(5)]
+        opciones.setdefault("taps_por_segundo",
+                            float(os.environ.get("NFC_SIM_TAPS_POR_SEGUNDO", "0.2")))
+        lector = LectorSimulado(**opciones)
+        if tipo == "simulado_irq":
+            return LectorIRQ(lector, FuenteIRQSimulada(lector))
+        return lector
+
+    raise ValueError(f"Tipo de lector desconocido: '{tipo}'")
+
+def parsear_puertas(especificacion):
+    """
+    'norte:0.0,sur:0.1:25:16' -> {'norte': {'bus': 0, 'device': 0},
+                                  'sur': {'bus': 0, 'device': 1, 'pin_rst': 25, 'pin_irq': 16}}.
+    Una puerta sin bus.device ('norte,sur') no lleva opciones de hardware.
+    """
+    puertas = {}
+    for entrada in especificacion.split(","):
+        partes = [p.strip() for p in entrada.split(":")]
+        if not partes[0]:
+            continue
+        opciones = {}
+        if len(partes) > 1 and partes[1]:
+            bus, _, device = partes[1].partition(".")
+            opciones['bus'], opciones['device'] = int(bus), int(device or 0)
+        if len(partes) > 2 and partes[2]:
+            opciones['pin_rst'] = int(partes[2])
+        if len(partes) > 3 and partes[3]:
+            opciones['pin_irq'] = int(partes[3])
+        puertas[partes[0]] = opciones
+    return puertas
+
+def crear_lectores(tipo=None, especificacion=None):
+    """
+    Abre un lector por puerta según 'especificacion' (o NFC_PUERTAS).
+    Devuelve {puerta: lector}; sin puertas configuradas, un único lector PUERTA_POR_DEFECTO.
+    """
+    especificacion = especificacion if especificacion is not None else os.environ.get("NFC_PUERTAS", "")
+    puertas = parsear_puertas(especificacion) or {PUERTA_POR_DEFECTO: {}}
+    tipo = (tipo or os.environ.get("NFC_LECTOR", LECTOR_POR_DEFECTO)).lower()
+
+    lectores = {}
+    try:
+        for puerta, opciones in puertas.items():
+            # Las opciones de SPI sólo tienen sentido para el hardware real
+            lectores[puerta] = crear_lector(tipo, **(opciones if tipo in ("mfrc522", "irq") else {}))
+    except Exception:
+        for lector in lectores.values():
+            lector.cerrar()
+        raise
+    return lectores
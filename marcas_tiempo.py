@@ -0,0 +1,212 @@
+"""
+Marcas de tiempo del sistema: segundos epoch enteros, en memoria y en disco.
+
+Un tap guarda int(time.time()) (sin strftime) y la permanencia es una resta
+(sin strptime), así que los cambios de horario de verano ya no alteran las
+duraciones. El texto 'YYYY-MM-DD HH:MM:SS' en hora local sólo se genera al
+mostrar datos (formatear) y, para los reportes y las particiones, día y hora
+locales salen de una caché por cuarto de hora (dia_y_segundo).
+
+a_epoch() acepta también el formato de texto anterior, así que los archivos
+sin migrar se siguen leyendo; 'migrar' los convierte de una vez.
+
+Uso:
+    python marcas_tiempo.py migrar                       # CSV, diario, particiones y SQLite del directorio actual
+    python marcas_tiempo.py migrar --comprobar           # sólo cuenta las marcas en formato de texto
+    python marcas_tiempo.py migrar --particiones registros --bd nfc_acceso.db
+    python marcas_tiempo.py mostrar 1760700000
+"""
+import argparse
+import contextlib
+import csv
+import functools
+import gzip
+import io
+import os
+import sqlite3
+import sys
+import time
+
+FORMATO_TEXTO = "%Y-%m-%d %H:%M:%S"
+FORMATOS_ENTRADA = (FORMATO_TEXTO, "%Y-%m-%d %H:%M", "%Y-%m-%d")  # Texto aceptado por a_epoch()
+CUARTO = 900  # Segundos: todos los husos horarios actuales están alineados a 15 minutos
+
+# Archivos y columna que contiene la marca de tiempo (ver NFC.ENCABEZADOS)
+ARCHIVOS_MIGRACION = {
+    "registro_accesos.csv": 0,
+    "registro_tiempos.csv": 0,
+    "estados.csv": 2,
+    "estados_diario.csv": 2,
+}
+COLUMNAS_SQLITE = (("accesos", "timestamp"), ("tiempos", "timestamp_salida"), ("estados", "ultima_entrada"))
+
+# ==============================================================================
+# 1. CONVERSIONES
+# ==============================================================================
+
+def ahora():
+    """Instante actual en segundos epoch."""
+    return int(time.time())
+
+def a_epoch(valor):
+    """
+    int, '1760700000' o texto local 'YYYY-MM-DD[ HH:MM[:SS]]' (formato anterior)
+    -> segundos epoch. None si está vacío o no se puede interpretar.
+    """
+    if valor is None or isinstance(valor, int):
+        return valor
+    valor = valor.strip()
+    if valor.isdigit():
+        return int(valor)
+    if len(valor) == 19 and valor[4] == '-' and valor[10] == ' ':
+        # 'YYYY-MM-DD HH:MM:SS' sin strptime (la migración convierte millones de filas)
+        try:
+            return int(time.mktime((int(valor[0:4]), int(valor[5:7]), int(valor[8:10]),
+                                    int(valor[11:13]), int(valor[14:16]), int(valor[17:19]), 0, 0, -1)))
+        except (ValueError, OverflowError):
+            return None
+    for formato in FORMATOS_ENTRADA:
+        try:
+            return int(time.mktime(time.strptime(valor, formato)))
+        except ValueError:
+            continue
+    return None
+
+def formatear(epoch, formato=FORMATO_TEXTO):
+    """Segundos epoch -> texto en hora local ('' si no hay marca)."""
+    if epoch is None or epoch == '':
+        return ''
+    return time.strftime(formato, time.localtime(int(epoch)))
+
+@functools.lru_cache(maxsize=8192)
+def _cuarto_local(cuarto):
+    hora = time.localtime(cuarto * CUARTO)
+    return time.strftime("%Y-%m-%d", hora), hora.tm_hour * 3600 + hora.tm_min * 60
+
+def dia_y_segundo(epoch):
+    """Segundos epoch -> ('YYYY-MM-DD', segundo del día) en hora local, sin llamar a localtime() por fila."""
+    dia, inicio = _cuarto_local(epoch // CUARTO)
+    return dia, inicio + epoch % CUARTO
+
+def segundos_del_dia(hora):
+    """'H:MM' o 'HH:MM[:SS]' -> segundos desde medianoche."""
+    partes = [int(p) for p in hora.split(':')] + [0, 0]
+    return partes[0] * 3600 + partes[1] * 60 + partes[2]
+
+# ==============================================================================
+# 2. MIGRACIÓN DE ARCHIVOS EXISTENTES
+# ==============================================================================
+
+def _abrir(ruta, modo, comprimido):
+    if comprimido:
+        return gzip.open(ruta, modo + 't', encoding='utf-8', newline='')
+    return open(ruta, modo, encoding='utf-8', newline='')
+
+def _filas_completas(f):
+    """Filas de 'f' terminadas en salto de línea (una última fila a medio escribir se descarta)."""
+    for linea in f:
+        if not linea.endswith('\n'):
+            break
+        yield next(csv.reader([linea]), [])
+
+def migrar_csv(ruta, columna, comprobar=False):
+    """
+    Reescribe la columna 'columna' de un CSV (o .csv.gz) como epoch, de forma
+    atómica. Devuelve el número de marcas en formato de texto encontradas.
+    """
+    en_texto = 0
+    temporal = ruta + ".tmp"
+    comprimido = ruta.endswith('.gz')
+    with _abrir(ruta, 'r', comprimido) as origen, \
+            (contextlib.nullcontext(io.StringIO()) if comprobar else _abrir(temporal, 'w', comprimido)) as destino:
+        escritor = csv.writer(destino)
+        for fila in _filas_completas(origen):
+            if len(fila) > columna and not fila[columna].strip().isdigit():
+                instante = a_epoch(fila[columna])
+                if instante is not None:
+                    fila[columna] = instante
+                    en_texto += 1
+            if not comprobar:
+                escritor.writerow(fila)
+    if not comprobar:
+        if en_texto:
+            os.replace(temporal, ruta)
+        else:
+            os.remove(temporal)  # Ya estaba migrado: no se toca el original
+    return en_texto
+
+def migrar_particiones(directorio, comprobar=False):
+    """Migra cada partición de 'directorio' y rehace sus índices. Devuelve las marcas en texto."""
+    import particiones  # particiones.py también usa este módulo
+    en_texto = 0
+    for ruta in particiones.rutas_particiones(directorio):
+        en_texto += migrar_csv(ruta, 0, comprobar)
+    if en_texto and not comprobar:
+        particiones.reindexar(directorio)
+    return en_texto
+
+def migrar_sqlite(ruta, comprobar=False):
+    """Convierte las marcas de texto de la base de datos SQLite. Devuelve cuántas había."""
+    conexion = sqlite3.connect(ruta)
+    try:
+        conexion.create_function('a_epoch', 1, a_epoch, deterministic=True)
+        en_texto = 0
+        with conexion:
+            for tabla, columna in COLUMNAS_SQLITE:
+                condicion = f"{columna} LIKE '____-__-__%'"
+                en_texto += conexion.execute(f"SELECT COUNT(*) FROM {tabla} WHERE {condicion}").fetchone()[0]
+                if not comprobar:
+                    conexion.execute(f"UPDATE {tabla} SET {columna} = a_epoch({columna}) WHERE {condicion}")
+        return en_texto
+    finally:
+        conexion.close()
+
+def migrar(directorio=".", directorio_particiones="registros", ruta_bd="nfc_acceso.db", comprobar=False):
+    """Migra todo lo que exista. Devuelve {ruta: marcas en formato de texto}."""
+    resultados = {}
+    for nombre, columna in ARCHIVOS_MIGRACION.items():
+        ruta = os.path.join(directorio, nombre)
+        if os.path.exists(ruta):
+            resultados[ruta] = migrar_csv(ruta, columna, comprobar)
+    raiz = os.path.join(directorio, directorio_particiones)
+    if os.path.isdir(raiz):
+        for nombre in sorted(os.listdir(raiz)):
+            ruta = os.path.join(raiz, nombre)
+            if os.path.isdir(ruta):
+                resultados[ruta] = migrar_particiones(ruta, comprobar)
+    ruta = os.path.join(directorio, ruta_bd)
+    if os.path.exists(ruta):
+        resultados[ruta] = migrar_sqlite(ruta, comprobar)
+    return resultados
+
+# ==============================================================================
+# INICIO DEL PROGRAMA
+# ==============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Marcas de tiempo epoch del sistema NFC")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    migracion = subcomandos.add_parser('migrar', help="Convertir los archivos al formato epoch (con el lector detenido)")
+    migracion.add_argument('--directorio', default=".")
+    migracion.add_argument('--particiones', default="registros", help="Directorio raíz de las particiones")
+    migracion.add_argument('--bd', default="nfc_acceso.db")
+    migracion.add_argument('--comprobar', action='store_true', help="No escribir: sólo contar")
+    mostrar = subcomandos.add_parser('mostrar', help="Epoch -> fecha y hora local")
+    mostrar.add_argument('valores', nargs='+')
+    args = parser.parse_args(argv)
+
+    if args.comando == 'mostrar':
+        for valor in args.valores:
+            print(f"{valor} -> {formatear(a_epoch(valor))}")
+        return 0
+
+    inicio = time.perf_counter()
+    resultados = migrar(args.directorio, args.particiones, args.bd, args.comprobar)
+    for ruta, en_texto in resultados.items():
+        print(f"   {ruta}: {en_texto} marcas en formato de texto" + ("" if args.comprobar else " convertidas"))
+    print(f"-> {sum(resultados.values())} marcas en {len(resultados)} archivos "
+          f"({(time.perf_counter() - inicio) * 1000:.0f} ms)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
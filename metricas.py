@@ -0,0 +1,220 @@
+"""
+Instrumentación del lector de control: histogramas de tiempo por etapa y contadores.
+
+Etapas medidas (segundos):
+    lectura_rf        read_id_no_block() que devolvió una tarjeta
+    cola              espera en la cola entre el hilo lector y el procesador
+    estado            decisión ENTRADA/SALIDA y actualización en memoria
+    registro_accesos  escritura del evento en el registro de accesos
+    registro_tiempos  escritura de la permanencia
+    diario_estados    guardar_estado() (diario append-only)
+    compactacion      guardar_estados() (snapshot completo)
+    tap               procesar_tarjeta() completo
+    lectura_registro  desde la lectura RF hasta el tap registrado
+
+Contadores: concedidos, denegados, entradas, salidas, rebotes, errores_io.
+
+Con las métricas desactivadas (lo normal) cada punto de medida cuesta una
+llamada que comprueba ACTIVAS y vuelve; etapa() devuelve un gestor de
+contexto vacío compartido. Activadas, se exportan en formato de texto de
+Prometheus (archivo para el "textfile collector" de node_exporter y ruta
+/metrics del servicio de ocupación) y como una línea de resumen periódica.
+"""
+import bisect
+import os
+import threading
+import time
+
+ACTIVAS = False
+LIMITES = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+CONTADORES = ('concedidos', 'denegados', 'entradas', 'salidas', 'rebotes', 'errores_io')
+PREFIJO = "nfc"
+
+# ==============================================================================
+# 1. HISTOGRAMAS Y REGISTRO
+# ==============================================================================
+
+class Histograma:
+    """Histograma acumulativo con límites fijos (como los de Prometheus)."""
+
+    def __init__(self, limites=LIMITES):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)  # La última es +Inf
+        self.cuenta = 0
+        self.suma = 0.0
+
+    def observar(self, segundos):
+        self.cubetas[bisect.bisect_left(self.limites, segundos)] += 1
+        self.cuenta += 1
+        self.suma += segundos
+
+    def percentil(self, p):
+        """Límite superior de la cubeta que contiene el percentil 'p' (estimación)."""
+        if not self.cuenta:
+            return 0.0
+        objetivo = p / 100 * self.cuenta
+        acumulado = 0
+        for posicion, cantidad in enumerate(self.cubetas):
+            acumulado += cantidad
+            if acumulado >= objetivo:
+                return self.limites[posicion] if posicion < len(self.limites) else float('inf')
+        return float('inf')
+
+class RegistroMetricas:
+    """Histogramas por etapa y contadores, protegidos por un cerrojo (varios hilos lectores)."""
+
+    def __init__(self):
+        self.histogramas = {}
+        self.contadores = dict.fromkeys(CONTADORES, 0)
+        self.inicio = time.time()
+        self._cerrojo = threading.Lock()
+
+    def observar(self, etapa, segundos):
+        with self._cerrojo:
+            histograma = self.histogramas.get(etapa)
+            if histograma is None:
+                histograma = self.histogramas[etapa] = Histograma()
+            histograma.observar(segundos)
+
+    def contar(self, nombre, cantidad=1):
+        with self._cerrojo:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+
+    def texto_prometheus(self):
+        """Exposición en formato de texto de Prometheus (versión 0.0.4)."""
+        lineas = [f"# HELP {PREFIJO}_eventos_total Taps y eventos del lector de control por tipo.",
+                  f"# TYPE {PREFIJO}_eventos_total counter"]
+        with self._cerrojo:
+            for nombre, valor in sorted(self.contadores.items()):
+                lineas.append(f'{PREFIJO}_eventos_total{{tipo="{nombre}"}} {valor}')
+
+            lineas += [f"# HELP {PREFIJO}_etapa_segundos Duración de cada etapa de un tap.",
+                       f"# TYPE {PREFIJO}_etapa_segundos histogram"]
+            for etapa, histograma in sorted(self.histogramas.items()):
+                acumulado = 0
+                for limite, cantidad in zip(histograma.limites + ('+Inf',), histograma.cubetas):
+                    acumulado += cantidad
+                    lineas.append(f'{PREFIJO}_etapa_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+                lineas.append(f'{PREFIJO}_etapa_segundos_sum{{etapa="{etapa}"}} {histograma.suma:.6f}')
+                lineas.append(f'{PREFIJO}_etapa_segundos_count{{etapa="{etapa}"}} {histograma.cuenta}')
+        lineas.append(f"{PREFIJO}_inicio_segundos {self.inicio:.0f}")
+        return "\n".join(lineas) + "\n"
+
+    def resumen(self):
+        """Una línea: contadores y p50/p99 de las etapas principales."""
+        with self._cerrojo:
+            c = dict(self.contadores)
+            etapas = []
+            for etapa in ('lectura_rf', 'estado', 'registro_accesos', 'diario_estados', 'compactacion', 'tap'):
+                histograma = self.histogramas.get(etapa)
+                if histograma is not None and histograma.cuenta:
+                    etapas.append(f"{etapa} {histograma.percentil(50) * 1000:g}/{histograma.percentil(99) * 1000:g} ms")
+        return (f"[MÉTRICAS] {c['concedidos']} concedidos, {c['denegados']} denegados "
+                f"({c['entradas']} entradas, {c['salidas']} salidas), {c['rebotes']} rebotes, "
+                f"{c['errores_io']} errores E/S | p50/p99: " + (", ".join(etapas) or "sin datos"))
+
+REGISTRO = RegistroMetricas()
+
+# ==============================================================================
+# 2. PUNTOS DE MEDIDA (sin efecto si ACTIVAS es False)
+# ==============================================================================
+
+class _EtapaNula:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+class _Etapa:
+    __slots__ = ('nombre', 'inicio')
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        REGISTRO.observar(self.nombre, time.perf_counter() - self.inicio)
+        return False
+
+_ETAPA_NULA = _EtapaNula()
+
+def activar(activas=True):
+    global ACTIVAS
+    ACTIVAS = activas
+
+def reiniciar():
+    global REGISTRO
+    REGISTRO = RegistroMetricas()
+
+def etapa(nombre):
+    """with etapa('registro_accesos'): ...  -> mide el bloque si las métricas están activas."""
+    return _Etapa(nombre) if ACTIVAS else _ETAPA_NULA
+
+def reloj():
+    return time.perf_counter()
+
+def observar(nombre, inicio):
+    """Registra perf_counter() - 'inicio' (obtenido con reloj()) en la etapa 'nombre'."""
+    if ACTIVAS:
+        REGISTRO.observar(nombre, time.perf_counter() - inicio)
+
+def observar_duracion(nombre, segundos):
+    if ACTIVAS:
+        REGISTRO.observar(nombre, segundos)
+
+def contar(nombre, cantidad=1):
+    if ACTIVAS:
+        REGISTRO.contar(nombre, cantidad)
+
+def texto_prometheus():
+    return REGISTRO.texto_prometheus()
+
+# ==============================================================================
+# 3. EXPORTACIÓN PERIÓDICA
+# ==============================================================================
+
+def escribir_archivo(ruta):
+    """Escribe la exposición de forma atómica (el collector nunca lee un archivo a medias)."""
+    temporal = ruta + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(texto_prometheus())
+    os.replace(temporal, ruta)
+
+class ExportadorMetricas:
+    """Hilo que cada 'intervalo' segundos escribe 'ruta' (si hay) e imprime el resumen."""
+
+    def __init__(self, ruta=None, intervalo=60.0, imprimir=print):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self.imprimir = imprimir
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._ejecutar, daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+        self.exportar()
+
+    def _ejecutar(self):
+        while not self._detener.wait(self.intervalo):
+            self.exportar()
+
+    def exportar(self):
+        if self.ruta:
+            try:
+                escribir_archivo(self.ruta)
+            except OSError as e:
+                self.imprimir(f"*** ERROR al escribir las métricas en '{self.ruta}': {e}")
+        if self.imprimir is not None:
+            self.imprimir(REGISTRO.resumen())
@@ -0,0 +1,225 @@
+"""
+Punto de entrada único del sistema NFC: un subcomando por modo o herramienta.
+
+Cada subcomando importa sólo lo que necesita, cuando se elige: las
+herramientas de consulta (reportes, exportación, particiones...) arrancan sin
+cargar NFC.py, los lectores ni RPi.GPIO, y los modos con lector abren el
+hardware dentro de su función, nunca al importar.
+
+Modos con lector (NFC.py y los scripts de lectura):
+    menu          menú principal (por defecto)
+    control       control de acceso directo (entrada/salida)
+    alta          alta de una tarjeta (--masiva: lista + asignación en serie)
+    diagnostico   UID de cualquier tarjeta (test_ui.py)
+    identificar   nombre y matrícula de cada tarjeta (lector_hardware.py)
+    texto         matrículas en texto plano (NFC_Sxx.py)
+
+Herramientas (los argumentos se pasan tal cual al main() de cada módulo):
+    reportes, exportacion, particiones, marcas, estados, almacen, lista,
+    sincronizacion, colector, benchmark
+
+Con --solo-arranque el subcomando se detiene en cuanto está listo para
+trabajar e imprime MARCA_ARRANQUE con los módulos cargados. 'arranque' lo
+usa para medir el arranque en frío de cada subcomando en procesos nuevos.
+
+Uso:
+    python nfc_acceso.py
+    python nfc_acceso.py control
+    python nfc_acceso.py alta --masiva
+    python nfc_acceso.py reportes horas --limite 20
+    python nfc_acceso.py exportacion estado
+    python nfc_acceso.py arranque --repeticiones 10
+    python nfc_acceso.py arranque reportes control --directorio /tmp/nfc_prueba
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+
+MARCA_ARRANQUE = "[arranque completo]"
+MODULOS_HARDWARE = ("RPi", "mfrc522", "spidev", "pirc522")  # No deben cargarse en las herramientas
+REPETICIONES_ARRANQUE = 5
+
+# Subcomando -> (módulo, descripción) de las herramientas delegadas
+HERRAMIENTAS = {
+    'reportes': ("reportes", "Reportes de asistencia"),
+    'exportacion': ("exportacion", "Exportación columnar incremental de los registros"),
+    'particiones': ("particiones", "Registros particionados por tiempo (diario o mensual)"),
+    'marcas': ("marcas_tiempo", "Marcas de tiempo epoch (migrar, mostrar)"),
+    'estados': ("recuperacion_estados", "Recuperar los estados desde el registro de accesos"),
+    'almacen': ("almacen_sqlite", "Motor SQLite (importar, exportar, consultar)"),
+    'lista': ("alta_masiva", "Comprobar o importar una lista de alumnos sin lector"),
+    'sincronizacion': ("sincronizacion", "Bandeja de salida hacia el colector central"),
+    'colector': ("colector_local", "Colector local de eventos (pruebas)"),
+    'benchmark': ("benchmark_accesos", "Benchmark de ráfagas de taps"),
+}
+
+# Entorno de 'arranque' (se respetan los valores ya definidos): lector simulado y
+# servicio de ocupación en un puerto libre para no chocar con un sistema en marcha
+ENTORNO_ARRANQUE = {
+    'NFC_LECTOR': "simulado",
+    'NFC_OCUPACION': "127.0.0.1:0",
+}
+
+# ==============================================================================
+# 1. MODOS CON LECTOR
+# ==============================================================================
+
+def marcar_arranque():
+    """Imprime MARCA_ARRANQUE con el número de módulos cargados y los de hardware, si hay alguno."""
+    hardware = sorted({nombre.split('.')[0] for nombre in sys.modules} & set(MODULOS_HARDWARE))
+    print(f"{MARCA_ARRANQUE} modulos={len(sys.modules)} hardware={','.join(hardware) or 'ninguno'}", flush=True)
+
+def ejecutar_nfc(args, funcion, servicios=True):
+    import NFC
+    return NFC.ejecutar(marcar_arranque if args.solo_arranque else funcion(NFC), servicios)
+
+def ejecutar_menu(args):
+    return ejecutar_nfc(args, lambda NFC: NFC.menu_principal)
+
+def ejecutar_control(args):
+    return ejecutar_nfc(args, lambda NFC: NFC.iniciar_lector_control)
+
+def ejecutar_alta(args):
+    # Sin servicios: un alta no registra accesos ni necesita ocupación o sincronización
+    return ejecutar_nfc(args, lambda NFC: NFC.alta_masiva_usuarios if args.masiva else NFC.registrar_usuario,
+                        servicios=False)
+
+def ejecutar_script(modulo):
+    def ejecutar(args):
+        return importlib.import_module(modulo).main(marcar_arranque if args.solo_arranque else None)
+    return ejecutar
+
+# ==============================================================================
+# 2. HERRAMIENTAS
+# ==============================================================================
+
+def ejecutar_herramienta(modulo):
+    def ejecutar(args):
+        herramienta = importlib.import_module(modulo)
+        if args.solo_arranque:
+            marcar_arranque()
+            return 0
+        return herramienta.main(args.argumentos)
+    return ejecutar
+
+# ==============================================================================
+# 3. MEDICIÓN DEL ARRANQUE EN FRÍO
+# ==============================================================================
+
+def medir_proceso(comando, entorno, directorio):
+    """
+    Lanza 'comando' y devuelve (segundos hasta MARCA_ARRANQUE, línea de la marca).
+    Si el proceso termina sin imprimirla, lanza RuntimeError con su salida.
+    """
+    import subprocess
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(comando, cwd=directorio, env=entorno, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    salida = []
+    with proceso:
+        for linea in proceso.stdout:
+            if linea.startswith(MARCA_ARRANQUE):
+                listo = time.perf_counter() - inicio
+                proceso.stdout.read()  # Dejar que termine (parada y limpieza) sin bloquearse
+                return listo, linea.strip()
+            salida.append(linea)
+    raise RuntimeError(f"terminó (código {proceso.returncode}) sin llegar a estar listo:\n"
+                       + "".join(salida[-10:]))
+
+def medir_arranque(subcomandos, repeticiones=REPETICIONES_ARRANQUE, directorio="."):
+    """
+    Arranque en frío de cada subcomando en un proceso nuevo. Devuelve
+    [(nombre, mínimo, mediana, detalle)] en segundos, empezando por el
+    intérprete vacío ('python -c pass') como referencia.
+    """
+    import statistics  # statistics y subprocess sólo para medir: no cuentan en el arranque de los demás
+    import subprocess
+    entorno = dict(ENTORNO_ARRANQUE, **os.environ)
+    script = os.path.abspath(__file__)
+    resultados = []
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], cwd=directorio, env=entorno, check=True)
+        tiempos.append(time.perf_counter() - inicio)
+    resultados.append(("(python)", min(tiempos), statistics.median(tiempos), ""))
+
+    for subcomando in subcomandos:
+        tiempos = []
+        for _ in range(repeticiones):
+            listo, marca = medir_proceso([sys.executable, script, "--solo-arranque", subcomando],
+                                         entorno, directorio)
+            tiempos.append(listo)
+        resultados.append((subcomando, min(tiempos), statistics.median(tiempos),
+                           marca[len(MARCA_ARRANQUE):].strip()))
+    return resultados
+
+def ejecutar_arranque(args):
+    subcomandos = args.subcomandos or [nombre for nombre in SUBCOMANDOS if nombre != 'arranque']
+    desconocidos = [nombre for nombre in subcomandos if nombre not in SUBCOMANDOS or nombre == 'arranque']
+    if desconocidos:
+        print(f"*** ERROR: subcomandos desconocidos: {', '.join(desconocidos)}")
+        return 2
+    print(f"Arranque en frío ({args.repeticiones} procesos por subcomando, directorio '{args.directorio}'):")
+    print(f"   {'subcomando':<16}{'mín':>9}{'mediana':>10}   detalle")
+    try:
+        for nombre, minimo, mediana, detalle in medir_arranque(subcomandos, args.repeticiones, args.directorio):
+            print(f"   {nombre:<16}{minimo * 1000:>6.0f} ms{mediana * 1000:>7.0f} ms   {detalle}")
+    except RuntimeError as e:
+        print(f"*** ERROR: {e}")
+        return 1
+    return 0
+
+# ==============================================================================
+# INICIO DEL PROGRAMA
+# ==============================================================================
+
+SUBCOMANDOS = {
+    'menu': ejecutar_menu,
+    'control': ejecutar_control,
+    'alta': ejecutar_alta,
+    'diagnostico': ejecutar_script("test_ui"),
+    'identificar': ejecutar_script("lector_hardware"),
+    'texto': ejecutar_script("NFC_Sxx"),
+    **{nombre: ejecutar_herramienta(modulo) for nombre, (modulo, _) in HERRAMIENTAS.items()},
+    'arranque': ejecutar_arranque,
+}
+ALIAS = {'enroll': 'alta', 'diagnose': 'diagnostico', 'text': 'texto'}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sistema unificado de acceso NFC/RFID")
+    parser.add_argument('--solo-arranque', action='store_true',
+                        help="Detenerse en cuanto el subcomando esté listo (ver 'arranque')")
+    subcomandos = parser.add_subparsers(dest='comando')
+
+    subcomandos.add_parser('menu', help="Menú principal (por defecto)")
+    subcomandos.add_parser('control', help="Control de acceso (entrada/salida)")
+    alta = subcomandos.add_parser('alta', aliases=['enroll'], help="Alta de tarjetas")
+    alta.add_argument('--masiva', action='store_true', help="Importar una lista y asignar tarjetas en serie")
+    subcomandos.add_parser('diagnostico', aliases=['diagnose'], help="UID de cualquier tarjeta (comprobar el lector)")
+    subcomandos.add_parser('identificar', help="Nombre y matrícula de cada tarjeta, sin registrar accesos")
+    subcomandos.add_parser('texto', aliases=['text'], help="Registrar matrículas en texto plano")
+
+    for nombre, (modulo, descripcion) in HERRAMIENTAS.items():
+        subcomandos.add_parser(nombre, help=descripcion, add_help=False)
+
+    arranque = subcomandos.add_parser('arranque', help="Medir el arranque en frío de los subcomandos")
+    arranque.add_argument('subcomandos', nargs='*', help="Por defecto, todos")
+    arranque.add_argument('--repeticiones', type=int, default=REPETICIONES_ARRANQUE)
+    arranque.add_argument('--directorio', default=".", help="Directorio de trabajo de los procesos medidos")
+
+    # Lo que sigue al nombre de una herramienta es de su main(), también '-h' y las
+    # opciones iniciales (que argparse.REMAINDER no recoge)
+    argv = sys.argv[1:] if argv is None else list(argv)
+    posicion = next((i for i, argumento in enumerate(argv) if not argumento.startswith('-')), len(argv))
+    argumentos = argv[posicion + 1:] if posicion < len(argv) and argv[posicion] in HERRAMIENTAS else []
+    args = parser.parse_args(argv[:len(argv) - len(argumentos)])
+    args.argumentos = argumentos
+    comando = ALIAS.get(args.comando, args.comando or 'menu')
+    return SUBCOMANDOS[comando](args)
+
+if __name__ == '__main__':
+    sys.exit(main())
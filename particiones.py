@@ -0,0 +1,443 @@
+"""
+Registros particionados por tiempo (diario o mensual) con rotación automática,
+compresión opcional de las particiones cerradas e índice de rangos de tiempo.
+
+Estructura en disco (p. ej. para registro_accesos.csv, partición diaria):
+    registros/registro_accesos/indice.json            <- particiones y su rango desde/hasta
+    registros/registro_accesos/2026-10-16.csv.gz      <- partición cerrada y comprimida
+    registros/registro_accesos/2026-10-16.idx.json
+    registros/registro_accesos/2026-10-17.csv         <- partición activa
+    registros/registro_accesos/2026-10-17.idx.json    <- hora -> byte, matrícula -> [byte, filas]
+
+Una consulta "eventos entre A y B" abre sólo las particiones cuyo rango se
+solapa con [A, B) y salta directamente al byte de la primera hora pedida.
+
+Las marcas de tiempo son segundos epoch (ver marcas_tiempo.py); la clave de
+cada partición es su fecha local y las horas del índice son horas epoch.
+
+Uso:
+    python particiones.py consultar registros/registro_accesos --desde 2026-10-01 --hasta 2026-10-08
+    python particiones.py particionar registro_accesos.csv registros/registro_accesos --granularidad diario
+    python particiones.py reindexar registros/registro_accesos
+"""
+import argparse
+import bisect
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+import threading
+
+import marcas_tiempo
+from escritor_registros import EscritorRegistro
+
+GRANULARIDADES = {"diario": 10, "mensual": 7}  # Caracteres de la fecha local 'YYYY-MM-DD' que forman la clave
+ARCHIVO_INDICE = "indice.json"
+INTERVALO_INDICE = 256  # Filas escritas entre dos guardados del índice
+
+# ==============================================================================
+# 1. UTILIDADES
+# ==============================================================================
+
+def clave_particion(instante, granularidad):
+    """Epoch -> fecha local '2026-10-17' (diario) o '2026-10' (mensual)."""
+    return marcas_tiempo.dia_y_segundo(instante)[0][:GRANULARIDADES[granularidad]]
+
+def clave_hora(instante):
+    """Epoch -> inicio de su hora, como texto (las claves JSON son texto y se ordenan igual: 10 dígitos)."""
+    return str(instante - instante % 3600)
+
+def _cargar_json(ruta, defecto):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return defecto
+
+def _guardar_json(ruta, datos):
+    """Escritura atómica (temporal + rename) de un JSON."""
+    temporal = ruta + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, separators=(',', ':'))
+    os.replace(temporal, ruta)
+
+def _abrir_binario(ruta):
+    return gzip.open(ruta, 'rb') if ruta.endswith('.gz') else open(ruta, 'rb')
+
+def abrir_particion(ruta, desplazamiento=0):
+    """Abre una partición (.csv o .csv.gz) como texto, situada en 'desplazamiento'."""
+    crudo = _abrir_binario(ruta)
+    crudo.seek(desplazamiento)
+    return io.TextIOWrapper(crudo, encoding='utf-8', newline='')
+
+def ruta_indice_particion(directorio, clave):
+    return os.path.join(directorio, clave + ".idx.json")
+
+def cargar_indice_particion(directorio, clave):
+    """Índice de una partición: {'tamano', 'filas', 'desde', 'hasta', 'horas', 'matriculas'}."""
+    indice_particion = _cargar_json(ruta_indice_particion(directorio, clave), indice_particion_vacio())
+    if isinstance(indice_particion['desde'], str):
+        return indice_particion_vacio()  # Índice con marcas de texto: se rehace al indexar la partición
+    return indice_particion
+
+def cargar_indice(directorio):
+    """Índice global: {'particiones': {clave: {'archivo', 'desde', 'hasta', 'filas', 'comprimido'}}}."""
+    indice = _cargar_json(os.path.join(directorio, ARCHIVO_INDICE), {'particiones': {}})
+    for entrada in indice['particiones'].values():
+        # Índices anteriores a las marcas epoch
+        entrada['desde'] = marcas_tiempo.a_epoch(entrada['desde']) or 0
+        entrada['hasta'] = marcas_tiempo.a_epoch(entrada['hasta']) or 0
+    return indice
+
+def rutas_particiones(directorio):
+    """Rutas de todas las particiones en orden cronológico."""
+    indice = cargar_indice(directorio)
+    return [os.path.join(directorio, indice['particiones'][clave]['archivo'])
+            for clave in sorted(indice['particiones'])]
+
+def indice_particion_vacio():
+    return {'tamano': 0, 'filas': 0, 'desde': 0, 'hasta': 0, 'horas': {}, 'matriculas': {}}
+
+def anotar_fila(indice_particion, desplazamiento, instante, matricula):
+    """Añade una fila (ya escrita en 'desplazamiento', con marca epoch 'instante') al índice de su partición."""
+    horas = indice_particion['horas']
+    hora = clave_hora(instante)
+    if hora not in horas:
+        horas[hora] = desplazamiento
+    entrada = indice_particion['matriculas'].get(matricula)
+    if entrada is None:
+        indice_particion['matriculas'][matricula] = [desplazamiento, 1]
+    else:
+        entrada[1] += 1
+    if not indice_particion['desde'] or instante < indice_particion['desde']:
+        indice_particion['desde'] = instante
+    if instante > indice_particion['hasta']:
+        indice_particion['hasta'] = instante
+    indice_particion['filas'] += 1
+
+def indexar_particion(ruta, indice_particion):
+    """
+    Pone al día el índice de una partición leyendo desde el último byte indexado
+    (o desde el principio si el índice apunta más allá del final del archivo).
+    """
+    with _abrir_binario(ruta) as f:
+        tamano_real = f.seek(0, os.SEEK_END)
+        if indice_particion['tamano'] > tamano_real:
+            indice_particion.clear()
+            indice_particion.update(indice_particion_vacio())
+
+        desplazamiento = indice_particion['tamano']
+        f.seek(desplazamiento)
+        for linea in f:
+            if not linea.endswith(b"\n"):
+                break  # Fila a medio escribir: se indexará cuando esté completa
+            if desplazamiento > 0:
+                fila = next(csv.reader([linea.decode('utf-8')]), [])
+                instante = marcas_tiempo.a_epoch(fila[0]) if len(fila) >= 2 else None
+                if instante is not None:
+                    anotar_fila(indice_particion, desplazamiento, instante, fila[1])
+            desplazamiento += len(linea)
+        indice_particion['tamano'] = desplazamiento
+    return indice_particion
+
+def comprimir_archivo(ruta):
+    """Comprime 'ruta' a 'ruta.gz' de forma atómica y borra el original."""
+    temporal = ruta + ".gz.tmp"
+    with open(ruta, 'rb') as origen, gzip.open(temporal, 'wb') as destino:
+        shutil.copyfileobj(origen, destino)
+    os.replace(temporal, ruta + ".gz")
+    os.remove(ruta)
+    return ruta + ".gz"
+
+def descomprimir_archivo(ruta_gz):
+    """Restaura 'x.csv' a partir de 'x.csv.gz' (para añadir filas a una partición cerrada)."""
+    ruta = ruta_gz[:-3]
+    temporal = ruta + ".tmp"
+    with gzip.open(ruta_gz, 'rb') as origen, open(temporal, 'wb') as destino:
+        shutil.copyfileobj(origen, destino)
+    os.replace(temporal, ruta)
+    os.remove(ruta_gz)
+    return ruta
+
+# ==============================================================================
+# 2. ESCRITOR PARTICIONADO
+# ==============================================================================
+
+class EscritorParticionado:
+    """
+    Misma interfaz que EscritorRegistro (escribir/vaciar/cerrar), pero reparte
+    las filas en particiones según su marca epoch (columna 0) e indexa cada fila
+    por hora y por matrícula (columna 1).
+    """
+
+    def __init__(self, directorio, encabezados, granularidad="diario", comprimir=False, **opciones_escritor):
+        if granularidad not in GRANULARIDADES:
+            raise ValueError(f"Granularidad desconocida: '{granularidad}'")
+
+        self.directorio = directorio
+        self.encabezados = encabezados
+        self.granularidad = granularidad
+        self.comprimir = comprimir
+        self.opciones_escritor = opciones_escritor
+        self.ruta = None  # Partición activa
+
+        os.makedirs(directorio, exist_ok=True)
+        self._cerrojo_indice = threading.Lock()  # La compresión en segundo plano también lo modifica
+        self._indice = cargar_indice(directorio)
+        self._indice['granularidad'] = granularidad
+        self._clave = None
+        self._escritor = None
+        self._indice_particion = None
+        self._tamano = 0
+        self._filas_sin_guardar = 0
+        self._compresiones = {}  # Clave: hilo que comprime esa partición cerrada
+
+    def escribir(self, fila):
+        instante = marcas_tiempo.a_epoch(fila[0])
+        if instante is None:
+            raise ValueError(f"Marca de tiempo no válida: '{fila[0]}'")
+        clave = clave_particion(instante, self.granularidad)
+        if clave != self._clave:
+            self._rotar(clave)
+
+        desplazamiento = self._tamano
+        self._tamano += self._escritor.escribir(fila)
+        anotar_fila(self._indice_particion, desplazamiento, instante, str(fila[1]))
+        self._indice_particion['tamano'] = self._tamano
+
+        self._filas_sin_guardar += 1
+        if self._filas_sin_guardar >= INTERVALO_INDICE:
+            self._guardar_indices()
+        return self._tamano - desplazamiento
+
+    def vaciar(self):
+        if self._escritor is not None:
+            self._escritor.vaciar()
+            self._guardar_indices()
+
+    def cerrar(self):
+        if self._escritor is not None:
+            self._cerrar_particion(comprimir=False)
+        for hilo in self._compresiones.values():
+            hilo.join()
+        self._compresiones.clear()
+
+    # --- Rotación ---
+
+    def _rotar(self, clave):
+        if self._escritor is not None:
+            self._cerrar_particion(comprimir=self.comprimir)
+
+        ruta = os.path.join(self.directorio, clave + ".csv")
+        compresion = self._compresiones.pop(clave, None)
+        if compresion is not None:
+            # Fila atrasada para una partición que se está comprimiendo: esperar a que termine
+            # (si no, la compresión borraría el .csv con las filas nuevas ya añadidas)
+            compresion.join()
+        with self._cerrojo_indice:
+            entrada = self._indice['particiones'].get(clave)
+            if entrada and entrada.get('comprimido') and not os.path.exists(ruta):
+                # Fila atrasada para una partición ya comprimida: se reabre
+                descomprimir_archivo(os.path.join(self.directorio, entrada['archivo']))
+
+        self._escritor = EscritorRegistro(ruta, self.encabezados, **self.opciones_escritor)
+        self._clave = clave
+        self.ruta = ruta
+
+        # Poner al día el índice con lo que haya en disco (p. ej. tras un corte de luz)
+        self._indice_particion = cargar_indice_particion(self.directorio, clave)
+        indexar_particion(ruta, self._indice_particion)
+        self._tamano = self._indice_particion['tamano']
+        self._guardar_indices()
+
+    def _cerrar_particion(self, comprimir):
+        self._escritor.cerrar()
+        self._guardar_indices()
+        if comprimir:
+            hilo = threading.Thread(target=self._comprimir, args=(self._clave, self.ruta), daemon=True)
+            hilo.start()
+            self._compresiones = {clave: h for clave, h in self._compresiones.items() if h.is_alive()}
+            self._compresiones[self._clave] = hilo
+        self._escritor = None
+        self._clave = None
+        self.ruta = None
+
+    def _comprimir(self, clave, ruta):
+        try:
+            ruta_gz = comprimir_archivo(ruta)
+        except OSError as e:
+            print(f"*** ERROR al comprimir la partición '{ruta}': {e}")
+            return
+        with self._cerrojo_indice:
+            entrada = self._indice['particiones'][clave]
+            entrada['archivo'] = os.path.basename(ruta_gz)
+            entrada['comprimido'] = True
+            _guardar_json(os.path.join(self.directorio, ARCHIVO_INDICE), self._indice)
+
+    def _guardar_indices(self):
+        """Guarda el índice de la partición activa y su entrada en el índice global."""
+        indice_particion = self._indice_particion
+        _guardar_json(ruta_indice_particion(self.directorio, self._clave), indice_particion)
+        with self._cerrojo_indice:
+            self._indice['particiones'][self._clave] = {
+                'archivo': os.path.basename(self.ruta),
+                'desde': indice_particion['desde'],
+                'hasta': indice_particion['hasta'],
+                'filas': indice_particion['filas'],
+                'comprimido': False,
+            }
+            _guardar_json(os.path.join(self.directorio, ARCHIVO_INDICE), self._indice)
+        self._filas_sin_guardar = 0
+
+# ==============================================================================
+# 3. CONSULTAS
+# ==============================================================================
+
+def _desplazamiento_inicial(indice_particion, desde, matricula):
+    """Byte desde el que leer: la última hora indexada <= 'desde' y la primera fila de la matrícula."""
+    inicio = 0
+    if desde:
+        horas = sorted(indice_particion['horas'])
+        posicion = bisect.bisect_right(horas, clave_hora(desde)) - 1
+        if posicion >= 0:
+            inicio = indice_particion['horas'][horas[posicion]]
+    if matricula and matricula in indice_particion['matriculas']:
+        inicio = max(inicio, indice_particion['matriculas'][matricula][0])
+    return inicio
+
+def consultar(directorio, desde=None, hasta=None, matricula=None, estadisticas=None):
+    """
+    Genera las filas con desde <= Timestamp < hasta (y de 'matricula' si se
+    indica), abriendo sólo las particiones necesarias. 'desde' y 'hasta' son
+    epoch o texto local 'YYYY-MM-DD[ HH:MM:SS]'. 'estadisticas' (dict)
+    recibe 'particiones_leidas' y 'particiones_totales'.
+
+    Dentro de una partición las filas se suponen en orden cronológico (así las
+    escribe el lector de control); una fila atrasada puede quedar fuera del rango.
+    """
+    desde, hasta = marcas_tiempo.a_epoch(desde), marcas_tiempo.a_epoch(hasta)
+    indice = cargar_indice(directorio)
+    claves = sorted(indice['particiones'])
+    leidas = 0
+
+    for posicion, clave in enumerate(claves):
+        entrada = indice['particiones'][clave]
+        activa = posicion == len(claves) - 1  # Su 'hasta' en el índice puede ir retrasado
+        if hasta and entrada['desde'] and entrada['desde'] >= hasta:
+            continue
+        if desde and not activa and (entrada['hasta'] or 0) < desde:
+            continue
+
+        indice_particion = cargar_indice_particion(directorio, clave)
+        if matricula and not activa and matricula not in indice_particion['matriculas']:
+            continue
+
+        inicio = _desplazamiento_inicial(indice_particion, desde, matricula)
+        leidas += 1
+        with abrir_particion(os.path.join(directorio, entrada['archivo']), inicio) as f:
+            lector_csv = csv.reader(f)
+            if inicio == 0:
+                next(lector_csv, None)  # Encabezados
+            for fila in lector_csv:
+                if len(fila) < 2:
+                    continue
+                instante = marcas_tiempo.a_epoch(fila[0])
+                if instante is None or (desde and instante < desde):
+                    continue
+                if hasta and instante >= hasta:
+                    break
+                if matricula and fila[1] != matricula:
+                    continue
+                yield fila
+
+    if estadisticas is not None:
+        estadisticas['particiones_leidas'] = leidas
+        estadisticas['particiones_totales'] = len(claves)
+
+def reindexar(directorio):
+    """Reconstruye los índices de todas las particiones presentes en el directorio."""
+    indice = cargar_indice(directorio)
+    indice['particiones'] = {}
+    for nombre in sorted(os.listdir(directorio)):
+        if not (nombre.endswith(".csv") or nombre.endswith(".csv.gz")):
+            continue
+        clave = nombre.split(".csv")[0]
+        indice_particion = indexar_particion(os.path.join(directorio, nombre), indice_particion_vacio())
+        _guardar_json(ruta_indice_particion(directorio, clave), indice_particion)
+        indice['particiones'][clave] = {
+            'archivo': nombre,
+            'desde': indice_particion['desde'],
+            'hasta': indice_particion['hasta'],
+            'filas': indice_particion['filas'],
+            'comprimido': nombre.endswith(".gz"),
+        }
+    _guardar_json(os.path.join(directorio, ARCHIVO_INDICE), indice)
+    return indice
+
+def particionar(ruta_csv, directorio, granularidad="diario", comprimir=False):
+    """
+    Reparte un registro CSV de un único archivo en particiones (con las marcas
+    ya en epoch). Devuelve las filas copiadas.
+    """
+    filas = 0
+    with open(ruta_csv, mode='r', newline='', encoding='utf-8') as f:
+        lector_csv = csv.reader(f)
+        encabezados = next(lector_csv)
+        escritor = EscritorParticionado(directorio, encabezados, granularidad, comprimir,
+                                        max_filas=1024, max_espera=0, politica_fsync="ninguno")
+        try:
+            for fila in lector_csv:
+                instante = marcas_tiempo.a_epoch(fila[0]) if len(fila) >= 2 else None
+                if instante is not None:
+                    escritor.escribir([instante] + fila[1:])
+                    filas += 1
+        finally:
+            escritor.cerrar()  # La última partición queda sin comprimir para seguir escribiendo en ella
+    return filas
+
+# ==============================================================================
+# INICIO DEL PROGRAMA
+# ==============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registros particionados por tiempo")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    consulta = subcomandos.add_parser('consultar', help="Filas entre dos instantes")
+    consulta.add_argument('directorio')
+    consulta.add_argument('--desde', help="YYYY-MM-DD[ HH:MM:SS] inclusive")
+    consulta.add_argument('--hasta', help="YYYY-MM-DD[ HH:MM:SS] exclusivo")
+    consulta.add_argument('--matricula')
+
+    division = subcomandos.add_parser('particionar', help="Divide un registro existente en particiones")
+    division.add_argument('archivo')
+    division.add_argument('directorio')
+    division.add_argument('--granularidad', choices=sorted(GRANULARIDADES), default='diario')
+    division.add_argument('--comprimir', action='store_true', help="Comprimir las particiones cerradas")
+
+    reindexado = subcomandos.add_parser('reindexar', help="Reconstruye los índices de un directorio")
+    reindexado.add_argument('directorio')
+    args = parser.parse_args(argv)
+
+    if args.comando == 'consultar':
+        estadisticas = {}
+        escritor = csv.writer(sys.stdout)
+        filas = 0
+        for fila in consultar(args.directorio, args.desde, args.hasta, args.matricula, estadisticas):
+            escritor.writerow([marcas_tiempo.formatear(marcas_tiempo.a_epoch(fila[0]))] + fila[1:])
+            filas += 1
+        print(f"-> {filas} filas; {estadisticas.get('particiones_leidas', 0)} de "
+              f"{estadisticas.get('particiones_totales', 0)} particiones leídas", file=sys.stderr)
+    elif args.comando == 'particionar':
+        filas = particionar(args.archivo, args.directorio, args.granularidad, args.comprimir)
+        print(f"-> {filas} filas repartidas en '{args.directorio}'")
+    else:
+        indice = reindexar(args.directorio)
+        print(f"-> {len(indice['particiones'])} particiones indexadas en '{args.directorio}'")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Recarga en caliente de usuarios.csv mientras el lector de control sigue activo.
+
+VigilanteUsuarios observa el archivo (inotify en Linux, sondeo de mtime/tamaño
+en otro caso) y entrega al callback sólo las filas añadidas, modificadas o
+eliminadas:
+
+    al_cambiar(cambios, bajas)   # cambios: {UID: Usuario}, bajas: [UID]
+
+Si el archivo sólo creció por el final (altas desde otra terminal, registrar_
+usuario...) se parsean únicamente los bytes nuevos. Cualquier otra edición
+obliga a releerlo entero y compararlo con el roster actual.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+from roster_usuarios import parsear_roster
+
+INTERVALO_SONDEO = 2.0  # Segundos entre comprobaciones en modo sondeo
+ESPERA_ESCRITURA = 0.2  # Pausa tras un evento para que el escritor termine
+BYTES_FIRMA = 64        # Bytes finales que se comparan para detectar un crecimiento por el final
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+EVENTO_INOTIFY = struct.Struct("iIII")
+
+# ==============================================================================
+# 1. LECTURA DE FILAS
+# ==============================================================================
+
+def parsear_usuarios(texto):
+    """
+    Devuelve el Roster (UID -> Usuario) de las filas válidas de un fragmento
+    CSV sin encabezado, con el mismo parser que cargar_usuarios(): una fila
+    sin matrícula también es un usuario.
+    """
+    return parsear_roster(texto)
+
+def calcular_diferencias(nuevos, actuales):
+    """Compara el CSV completo con el roster actual: devuelve (cambios, bajas)."""
+    cambios = {uid: u for uid, u in nuevos.items() if actuales.get(uid) != u}
+    bajas = [uid for uid in actuales.keys() if uid not in nuevos]
+    return cambios, bajas
+
+# ==============================================================================
+# 2. INOTIFY (ctypes) Y SONDEO
+# ==============================================================================
+
+def _abrir_inotify(directorio):
+    """Devuelve un descriptor inotify que vigila 'directorio', o None si no está disponible."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        mascara = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(fd, os.fsencode(directorio or '.'), mascara) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+def _nombres_en_eventos(datos):
+    """Nombres de archivo contenidos en un bloque de eventos inotify."""
+    nombres = set()
+    posicion = 0
+    while posicion + EVENTO_INOTIFY.size <= len(datos):
+        _, _, _, longitud = EVENTO_INOTIFY.unpack_from(datos, posicion)
+        posicion += EVENTO_INOTIFY.size
+        nombres.add(os.fsdecode(datos[posicion:posicion + longitud].rstrip(b'\0')))
+        posicion += longitud
+    return nombres
+
+# ==============================================================================
+# 3. VIGILANTE
+# ==============================================================================
+
+class VigilanteUsuarios:
+    """Hilo que vigila usuarios.csv y notifica sólo las diferencias."""
+
+    def __init__(self, ruta, obtener_actuales, al_cambiar, usar_inotify=True):
+        self.ruta = ruta
+        # Devuelve el roster vigente (para diffs completos). El hilo lo recorre sin cerrojo: si otros
+        # hilos lo modifican, debe devolver una copia tomada bajo su cerrojo (ver NFC.copiar_usuarios)
+        self.obtener_actuales = obtener_actuales
+        self.al_cambiar = al_cambiar
+        self.usar_inotify = usar_inotify
+        self.modo = None
+
+        self._detener = threading.Event()
+        self._hilo = None
+        self._aviso = None          # Tubería con la que detener() despierta al select() de inotify
+        self._firma_archivo = None  # (inode, mtime_ns, tamaño) ya procesado
+        self._posicion = 0          # Bytes procesados (siempre en un fin de línea)
+        self._cola_procesada = b""  # Últimos BYTES_FIRMA bytes procesados
+        self._marcar_estado_actual()
+
+    def _marcar_estado_actual(self):
+        """Toma el contenido actual del archivo como ya aplicado."""
+        try:
+            with open(self.ruta, 'rb') as f:
+                info = os.fstat(f.fileno())
+                contenido = f.read()
+        except OSError:
+            self._firma_archivo, self._posicion, self._cola_procesada = None, 0, b""
+            return
+        fin = contenido.rfind(b"\n") + 1
+        self._firma_archivo = (info.st_ino, info.st_mtime_ns, info.st_size)
+        self._posicion = fin
+        self._cola_procesada = contenido[max(0, fin - BYTES_FIRMA):fin]
+
+    def iniciar(self):
+        self._aviso = os.pipe()
+        self._hilo = threading.Thread(target=self._ejecutar, daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Para el hilo sin esperar a que venza el select() en curso y cierra sus descriptores."""
+        self._detener.set()
+        if self._aviso is not None:
+            os.write(self._aviso[1], b"\0")
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        if self._aviso is not None:
+            for extremo in self._aviso:
+                os.close(extremo)
+            self._aviso = None
+
+    def _ejecutar(self):
+        fd = _abrir_inotify(os.path.dirname(self.ruta)) if self.usar_inotify else None
+        self.modo = "inotify" if fd is not None else "sondeo"
+        nombre = os.path.basename(self.ruta)
+        try:
+            self._comprobar_sin_fallar()  # Cambios entre el constructor y la vigilancia de inotify
+            while not self._detener.is_set():
+                if fd is not None:
+                    listos, _, _ = select.select([fd, self._aviso[0]], [], [], INTERVALO_SONDEO)
+                    if fd not in listos:
+                        # Sin eventos, o detener() ha escrito en el aviso. Tras un error se reintenta igualmente
+                        if self._firma_archivo is None and not self._detener.is_set():
+                            self._comprobar_sin_fallar()
+                        continue
+                    try:
+                        eventos = os.read(fd, 64 * 1024)
+                    except BlockingIOError:
+                        continue
+                    if nombre not in _nombres_en_eventos(eventos):
+                        continue
+                    # Agrupar ráfagas de eventos de una misma escritura
+                    self._detener.wait(ESPERA_ESCRITURA)
+                    while select.select([fd], [], [], 0)[0]:
+                        try:
+                            os.read(fd, 64 * 1024)
+                        except BlockingIOError:
+                            break
+                else:
+                    self._detener.wait(INTERVALO_SONDEO)
+                self._comprobar_sin_fallar()
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def _comprobar_sin_fallar(self):
+        """comprobar() desde el hilo: un error inesperado se avisa y la recarga sigue viva."""
+        try:
+            self.comprobar()
+        except Exception as e:
+            self._firma_archivo = None  # El próximo intento relee y compara todo el archivo
+            print(f"*** ERROR inesperado al recargar '{self.ruta}': {e!r}")
+
+    def comprobar(self):
+        """Revisa el archivo y notifica sus diferencias. Devuelve (cambios, bajas) o None."""
+        try:
+            info = os.stat(self.ruta)
+        except OSError:
+            return None  # Archivo temporalmente ausente (p. ej. reemplazo en curso)
+
+        firma = (info.st_ino, info.st_mtime_ns, info.st_size)
+        if firma == self._firma_archivo:
+            return None
+
+        try:
+            diferencias = self._leer_diferencias(info)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"*** ERROR al recargar '{self.ruta}': {e}")
+            return None
+
+        cambios, bajas = diferencias
+        if cambios or bajas:
+            self.al_cambiar(cambios, bajas)
+        return cambios, bajas
+
+    def _leer_diferencias(self, info):
+        """Lee sólo lo añadido si el archivo creció por el final; si no, lo relee entero."""
+        with open(self.ruta, 'rb') as f:
+            mismo_archivo = self._firma_archivo is not None and info.st_ino == self._firma_archivo[0]
+            if mismo_archivo and info.st_size >= self._posicion:
+                inicio_firma = self._posicion - len(self._cola_procesada)
+                f.seek(inicio_firma)
+                if f.read(len(self._cola_procesada)) == self._cola_procesada:
+                    nuevos = f.read()
+                    fin = nuevos.rfind(b"\n") + 1  # Una fila a medio escribir se deja para después
+                    self._posicion += fin
+                    self._cola_procesada = (self._cola_procesada + nuevos[:fin])[-BYTES_FIRMA:]
+                    self._firma_archivo = (info.st_ino, info.st_mtime_ns, info.st_size)
+                    actuales = self.obtener_actuales()
+                    cambios = {uid: u for uid, u in parsear_usuarios(nuevos[:fin].decode('utf-8')).items()
+                               if actuales.get(uid) != u}
+                    return cambios, []
+
+            # Edición en medio del archivo o reemplazo: releer y comparar todo
+            f.seek(0)
+            contenido = f.read()
+
+        fin = contenido.rfind(b"\n") + 1
+        texto = contenido[:fin].decode('utf-8')
+        fin_encabezado = texto.find('\n')
+        nuevos = parsear_usuarios(texto[fin_encabezado + 1:] if fin_encabezado >= 0 else "")
+        self._posicion = fin
+        self._cola_procesada = contenido[max(0, fin - BYTES_FIRMA):fin]
+        self._firma_archivo = (info.st_ino, info.st_mtime_ns, info.st_size)
+        return calcular_diferencias(nuevos, self.obtener_actuales())
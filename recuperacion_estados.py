@@ -0,0 +1,182 @@
+"""
+Recuperación rápida de ESTADOS_ACCESO a partir del final del registro de accesos.
+
+Si estados.csv se pierde o queda dañado, el estado de cada usuario es el de su
+ÚLTIMO evento en registro_accesos.csv (ENTRADA -> dentro desde ese instante,
+SALIDA -> fuera). En lugar de reproducir el registro entero, se recorre de
+atrás hacia delante (mmap) y se para en cuanto todas las matrículas del roster
+tienen su último evento, de modo que el coste depende de cuánto hace que se vio
+al usuario menos activo, no del tamaño del registro. 'horizonte' acota además
+la búsqueda: quien no aparece en ese periodo se considera fuera.
+
+Con el registro particionado (ver particiones.py) las particiones se recorren
+de la más reciente a la más antigua y se saltan las que, según su índice, no
+contienen ninguna matrícula pendiente.
+
+Uso:
+    python recuperacion_estados.py [--accesos registro_accesos.csv] [--horizonte-dias 31]
+"""
+import argparse
+import csv
+import gzip
+import mmap
+import os
+import sys
+import time
+from datetime import timedelta
+
+import particiones
+from marcas_tiempo import a_epoch
+from roster_usuarios import cargar_usuarios
+
+# ==============================================================================
+# 1. LECTURA HACIA ATRÁS
+# ==============================================================================
+
+def lineas_hacia_atras(datos):
+    """
+    Genera las filas completas de 'datos' (bytes o mmap) de la última a la
+    primera, sin el encabezado ni una posible fila final a medio escribir.
+    """
+    fin = datos.rfind(b"\n")
+    while fin > 0:
+        inicio = datos.rfind(b"\n", 0, fin) + 1
+        if inicio == 0:
+            return  # Encabezados
+        yield datos[inicio:fin].rstrip(b"\r")
+        fin = inicio - 1
+
+def campos_evento(linea):
+    """b'Timestamp,Matricula,Nombre,Evento[,Puerta]' -> (instante epoch, matricula, evento) o None."""
+    if b'"' in linea:
+        fila = next(csv.reader([linea.decode('utf-8')]), [])
+    else:
+        fila = linea.decode('utf-8').split(",")
+    if len(fila) < 4:
+        return None
+    instante = a_epoch(fila[0])
+    if instante is None:
+        return None
+    return instante, fila[1], fila[3]
+
+def _fuentes(ruta_accesos, directorio_particiones):
+    """
+    Genera (ruta, matrículas indexadas o None) de la fuente más reciente a la más antigua:
+    las particiones (si existen) y después el registro de un único archivo.
+    """
+    if directorio_particiones and os.path.isdir(directorio_particiones):
+        indice = particiones.cargar_indice(directorio_particiones)
+        for clave in sorted(indice['particiones'], reverse=True):
+            indice_particion = particiones.cargar_indice_particion(directorio_particiones, clave)
+            matriculas = set(indice_particion['matriculas']) if indice_particion['tamano'] else None  # Sin índice
+            yield os.path.join(directorio_particiones, indice['particiones'][clave]['archivo']), matriculas
+    if ruta_accesos and os.path.exists(ruta_accesos):
+        yield ruta_accesos, None
+
+def _abrir_datos(ruta):
+    """Devuelve el contenido de la fuente como mmap (CSV) o bytes (CSV.GZ); None si está vacía."""
+    if ruta.endswith('.gz'):
+        with gzip.open(ruta, 'rb') as f:
+            return f.read()
+    with open(ruta, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+# ==============================================================================
+# 2. RECUPERACIÓN
+# ==============================================================================
+
+def hay_eventos(ruta_accesos, directorio_particiones=None):
+    """True si el registro de accesos contiene al menos una fila (sin contar encabezados)."""
+    for ruta, _ in _fuentes(ruta_accesos, directorio_particiones):
+        datos = _abrir_datos(ruta)
+        if datos is None:
+            continue
+        try:
+            if next(lineas_hacia_atras(datos), None) is not None:
+                return True
+        finally:
+            if isinstance(datos, mmap.mmap):
+                datos.close()
+    return False
+
+def recuperar_estados(usuarios, ruta_accesos, directorio_particiones=None, horizonte=None):
+    """
+    Reconstruye {UID: {'estado', 'ultima_entrada'}} desde el final del registro
+    de accesos. 'horizonte' (timedelta) detiene la búsqueda en los eventos más
+    antiguos que el último evento menos 'horizonte'. Devuelve (estados, filas_leidas).
+    """
+    uids_por_matricula = {}
+    for uid, usuario in usuarios.items():
+        uids_por_matricula.setdefault(usuario['matricula'], []).append(uid)
+    pendientes = set(uids_por_matricula)
+
+    estados = {}
+    filas_leidas = 0
+    limite = None
+
+    for posicion, (ruta, matriculas) in enumerate(_fuentes(ruta_accesos, directorio_particiones)):
+        if not pendientes:
+            break
+        # Ninguna matrícula pendiente aparece en esta partición (el índice de la
+        # más reciente puede ir retrasado, así que ésa se lee siempre)
+        if posicion > 0 and matriculas is not None and pendientes.isdisjoint(matriculas):
+            continue
+
+        datos = _abrir_datos(ruta)
+        if datos is None:
+            continue
+        try:
+            for linea in lineas_hacia_atras(datos):
+                campos = campos_evento(linea)
+                if campos is None:
+                    continue
+                filas_leidas += 1
+                instante, matricula, evento = campos
+
+                if limite is None and horizonte is not None:
+                    limite = instante - horizonte.total_seconds()
+                if limite is not None and instante < limite:
+                    pendientes.clear()  # Fuera del horizonte: el resto se considera fuera
+                    break
+
+                if matricula not in pendientes or evento not in ('ENTRADA', 'SALIDA'):
+                    continue
+                pendientes.discard(matricula)
+                estado = {'estado': evento, 'ultima_entrada': instante if evento == 'ENTRADA' else None}
+                for uid in uids_por_matricula[matricula]:
+                    estados[uid] = dict(estado)
+                if not pendientes:
+                    break
+        finally:
+            if isinstance(datos, mmap.mmap):
+                datos.close()
+
+    return estados, filas_leidas
+
+# ==============================================================================
+# INICIO DEL PROGRAMA
+# ==============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconstruye los estados de acceso desde el registro")
+    parser.add_argument('--usuarios', default="usuarios.csv")
+    parser.add_argument('--accesos', default="registro_accesos.csv")
+    parser.add_argument('--particiones', default=None, help="Directorio de particiones del registro de accesos")
+    parser.add_argument('--horizonte-dias', type=float, default=None)
+    args = parser.parse_args(argv)
+
+    usuarios = cargar_usuarios(args.usuarios)
+    horizonte = timedelta(days=args.horizonte_dias) if args.horizonte_dias else None
+    inicio = time.perf_counter()
+    estados, filas = recuperar_estados(usuarios, args.accesos, args.particiones, horizonte)
+    transcurrido = time.perf_counter() - inicio
+
+    dentro = sum(1 for e in estados.values() if e['estado'] == 'ENTRADA')
+    print(f"-> {len(estados)} de {len(usuarios)} usuarios recuperados ({dentro} dentro) "
+          f"leyendo {filas} filas en {transcurrido * 1000:.1f} ms")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
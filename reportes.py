@@ -0,0 +1,300 @@
+"""
+Reportes de asistencia a partir de registro_tiempos.csv y registro_accesos.csv.
+
+Los logs se leen en streaming por bloques de filas (--bloque) y cada reporte
+mantiene sólo agregados: totales por matrícula (acotados por el roster), el
+conjunto de personas presentes y 24 contadores por día. La memoria no depende
+del tamaño de los archivos.
+
+Las marcas de tiempo son epoch (ver marcas_tiempo.py): día y hora locales
+salen de una caché por cuarto de hora, sin parsear texto por fila. Los
+registros aún sin migrar (texto 'YYYY-MM-DD HH:MM:SS') también se aceptan.
+
+Uso:
+    python reportes.py horas [--limite 20]
+    python reportes.py ocupacion [--dia 2026-10-17]
+    python reportes.py pico
+    python reportes.py puntualidad --hora-entrada 08:00 --hora-salida 14:00
+    python reportes.py todo
+    python reportes.py horas --tiempos registros/registro_tiempos   # registro particionado
+"""
+import argparse
+import array
+import csv
+import itertools
+import os
+import sys
+
+import marcas_tiempo
+import particiones
+from marcas_tiempo import a_epoch, dia_y_segundo
+
+ARCHIVO_ACCESOS = "registro_accesos.csv"
+ARCHIVO_TIEMPOS = "registro_tiempos.csv"
+TAMANO_BLOQUE = 50000  # Filas por bloque leído
+
+# ==============================================================================
+# 1. LECTURA EN STREAMING
+# ==============================================================================
+
+def leer_bloques(ruta, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Genera listas de hasta 'tamano_bloque' filas del CSV (sin encabezado).
+    'ruta' puede ser también un directorio de particiones (ver particiones.py):
+    se recorren en orden cronológico, comprimidas o no.
+    """
+    if os.path.isdir(ruta):
+        rutas = particiones.rutas_particiones(ruta)
+    elif os.path.exists(ruta):
+        rutas = [ruta]
+    else:
+        return
+    for ruta_archivo in rutas:
+        with particiones.abrir_particion(ruta_archivo) as f:
+            lector_csv = csv.reader(f)
+            next(lector_csv, None)
+            while True:
+                bloque = list(itertools.islice(lector_csv, tamano_bloque))
+                if not bloque:
+                    break
+                yield bloque
+
+def hora_a_texto(hora):
+    """Normaliza 'H:MM' o 'HH:MM[:SS]' a 'HH:MM:SS' (para mostrarla)."""
+    partes = [int(p) for p in hora.split(':')] + [0, 0]
+    return f"{partes[0]:02d}:{partes[1]:02d}:{partes[2]:02d}"
+
+def formatear_duracion(segundos):
+    """Segundos -> 'H h MM m SS s'."""
+    return f"{segundos // 3600} h {(segundos % 3600) // 60:02d} m {segundos % 60:02d} s"
+
+# ==============================================================================
+# 2. AGREGADOS
+# ==============================================================================
+
+class HorasPorMatricula:
+    """Tiempo total de permanencia y número de visitas por matrícula (registro_tiempos)."""
+
+    def __init__(self):
+        self.segundos = {}  # Matricula: segundos totales
+        self.visitas = {}   # Matricula: número de permanencias
+        self.nombres = {}   # Matricula: último nombre visto
+
+    def procesar_bloque(self, filas):
+        segundos, visitas, nombres = self.segundos, self.visitas, self.nombres
+        for fila in filas:
+            if len(fila) < 6:
+                continue
+            try:
+                duracion = int(fila[3]) * 3600 + int(fila[4]) * 60 + int(fila[5])
+            except ValueError:
+                continue
+            matricula = fila[1]
+            segundos[matricula] = segundos.get(matricula, 0) + duracion
+            visitas[matricula] = visitas.get(matricula, 0) + 1
+            nombres[matricula] = fila[2]
+
+    def imprimir(self, limite=None):
+        print("\n" + "=" * 50)
+        print("      HORAS TOTALES POR MATRÍCULA")
+        print("=" * 50)
+        ordenadas = sorted(self.segundos.items(), key=lambda par: par[1], reverse=True)
+        for matricula, total in ordenadas[:limite]:
+            print(f"{matricula:<12} {self.nombres[matricula][:28]:<28} "
+                  f"{formatear_duracion(total):>16}  ({self.visitas[matricula]} visitas)")
+        print(f"-> {len(self.segundos)} matrículas, {formatear_duracion(sum(self.segundos.values()))} en total")
+
+class Ocupacion:
+    """
+    Barrido de ENTRADA/SALIDA en orden cronológico (registro_accesos):
+    ocupación máxima por día y hora, entradas por hora y pico de ocupación.
+    """
+
+    def __init__(self):
+        self.presentes = set()  # Matrículas dentro ahora mismo (acotado por el roster)
+        self.maximos = {}       # Día: array de 24 ocupaciones máximas
+        self.entradas = {}      # Día: array de 24 entradas
+        self.pico = 0
+        self.instante_pico = None  # Epoch del pico
+        self._dia = None
+        self._hora = None
+
+    def _curvas_del_dia(self, dia):
+        if dia not in self.maximos:
+            self.maximos[dia] = array.array('i', bytes(4 * 24))
+            self.entradas[dia] = array.array('i', bytes(4 * 24))
+        return self.maximos[dia]
+
+    def _avanzar(self, dia, hora):
+        """Las horas sin eventos heredan la ocupación de la hora anterior."""
+        ocupacion = len(self.presentes)
+        if self._dia == dia:
+            maximos = self.maximos[dia]
+            for h in range(self._hora + 1, hora + 1):
+                maximos[h] = max(maximos[h], ocupacion)
+        else:
+            if self._dia is not None:
+                maximos = self.maximos[self._dia]
+                for h in range(self._hora + 1, 24):
+                    maximos[h] = max(maximos[h], ocupacion)
+            maximos = self._curvas_del_dia(dia)
+            for h in range(0, hora + 1):
+                maximos[h] = max(maximos[h], ocupacion)
+        self._dia, self._hora = dia, hora
+
+    def procesar_bloque(self, filas):
+        presentes = self.presentes
+        for fila in filas:
+            if len(fila) < 4:
+                continue
+            instante, matricula, evento = a_epoch(fila[0]), fila[1], fila[3]
+            if instante is None:
+                continue
+            dia, segundo = dia_y_segundo(instante)
+            hora = segundo // 3600
+            if dia != self._dia or hora != self._hora:
+                self._avanzar(dia, hora)
+
+            if evento == 'ENTRADA':
+                presentes.add(matricula)
+                self.entradas[dia][hora] += 1
+            elif evento == 'SALIDA':
+                presentes.discard(matricula)
+            else:
+                continue
+
+            ocupacion = len(presentes)
+            maximos = self.maximos[dia]
+            if ocupacion > maximos[hora]:
+                maximos[hora] = ocupacion
+            if ocupacion > self.pico:
+                self.pico, self.instante_pico = ocupacion, instante
+
+    def imprimir(self, dia=None):
+        print("\n" + "=" * 50)
+        print("      OCUPACIÓN POR DÍA Y HORA (máximo / entradas)")
+        print("=" * 50)
+        dias = [dia] if dia else sorted(self.maximos)
+        for d in dias:
+            if d not in self.maximos:
+                print(f"Sin eventos para {d}.")
+                continue
+            print(f"\n{d}")
+            for h in range(24):
+                maximo, entradas = self.maximos[d][h], self.entradas[d][h]
+                if maximo or entradas:
+                    print(f"  {h:02d}:00  {maximo:5d} {'#' * min(maximo, 40):<40} {entradas:5d} entradas")
+
+    def imprimir_pico(self):
+        print("\n" + "=" * 50)
+        print("      PICO DE OCUPACIÓN")
+        print("=" * 50)
+        print(f"-> Máximo simultáneo: {self.pico} personas ({marcas_tiempo.formatear(self.instante_pico) or 'sin eventos'})")
+        print(f"-> Dentro al final del registro: {len(self.presentes)} personas")
+
+class Puntualidad:
+    """
+    Llegadas tarde (primera ENTRADA del día posterior a 'hora_entrada') y salidas
+    anticipadas (última SALIDA del día anterior a 'hora_salida') por matrícula.
+    """
+
+    def __init__(self, hora_entrada="08:00", hora_salida="14:00"):
+        self.hora_entrada = hora_a_texto(hora_entrada)
+        self.hora_salida = hora_a_texto(hora_salida)
+        self._limite_entrada = marcas_tiempo.segundos_del_dia(hora_entrada)
+        self._limite_salida = marcas_tiempo.segundos_del_dia(hora_salida)
+        self.tardes = {}       # Matricula: llegadas tarde
+        self.anticipadas = {}  # Matricula: salidas anticipadas
+        self.dias = {}         # Matricula: días con asistencia
+        self._dia = None
+        self._primera_entrada = {}  # Matricula: segundo del día de la primera ENTRADA del día en curso
+        self._ultima_salida = {}    # Matricula: segundo del día de la última SALIDA del día en curso
+
+    def _cerrar_dia(self):
+        for matricula, hora in self._primera_entrada.items():
+            self.dias[matricula] = self.dias.get(matricula, 0) + 1
+            if hora > self._limite_entrada:
+                self.tardes[matricula] = self.tardes.get(matricula, 0) + 1
+        for matricula, hora in self._ultima_salida.items():
+            if hora < self._limite_salida:
+                self.anticipadas[matricula] = self.anticipadas.get(matricula, 0) + 1
+        self._primera_entrada.clear()
+        self._ultima_salida.clear()
+
+    def procesar_bloque(self, filas):
+        for fila in filas:
+            if len(fila) < 4:
+                continue
+            instante, matricula, evento = a_epoch(fila[0]), fila[1], fila[3]
+            if instante is None:
+                continue
+            dia, hora = dia_y_segundo(instante)
+            if dia != self._dia:
+                self._cerrar_dia()
+                self._dia = dia
+            if evento == 'ENTRADA':
+                self._primera_entrada.setdefault(matricula, hora)
+            elif evento == 'SALIDA':
+                self._ultima_salida[matricula] = hora
+
+    def imprimir(self, limite=None):
+        self._cerrar_dia()
+        print("\n" + "=" * 50)
+        print(f"      PUNTUALIDAD (entrada {self.hora_entrada} / salida {self.hora_salida})")
+        print("=" * 50)
+        matriculas = sorted(self.dias, key=lambda m: (self.tardes.get(m, 0) + self.anticipadas.get(m, 0)),
+                            reverse=True)
+        for matricula in matriculas[:limite]:
+            print(f"{matricula:<12} {self.dias[matricula]:4d} días | {self.tardes.get(matricula, 0):4d} tarde "
+                  f"| {self.anticipadas.get(matricula, 0):4d} salidas anticipadas")
+        dias_totales = sum(self.dias.values())
+        print(f"-> {sum(self.tardes.values())} llegadas tarde y {sum(self.anticipadas.values())} "
+              f"salidas anticipadas en {dias_totales} días-persona")
+
+# ==============================================================================
+# 3. EJECUCIÓN
+# ==============================================================================
+
+def procesar(ruta, agregados, tamano_bloque=TAMANO_BLOQUE):
+    """Pasa cada bloque del archivo por todos los agregados (una sola lectura)."""
+    filas = 0
+    for bloque in leer_bloques(ruta, tamano_bloque):
+        for agregado in agregados:
+            agregado.procesar_bloque(bloque)
+        filas += len(bloque)
+    return filas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reportes de asistencia del sistema NFC")
+    parser.add_argument('reporte', choices=['horas', 'ocupacion', 'pico', 'puntualidad', 'todo'])
+    parser.add_argument('--accesos', default=ARCHIVO_ACCESOS)
+    parser.add_argument('--tiempos', default=ARCHIVO_TIEMPOS)
+    parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE, help="Filas por bloque")
+    parser.add_argument('--limite', type=int, default=None, help="Máximo de matrículas listadas")
+    parser.add_argument('--dia', default=None, help="Sólo este día en 'ocupacion' (YYYY-MM-DD)")
+    parser.add_argument('--hora-entrada', default="08:00")
+    parser.add_argument('--hora-salida', default="14:00")
+    args = parser.parse_args(argv)
+
+    quiere = lambda nombre: args.reporte in (nombre, 'todo')
+
+    if quiere('horas'):
+        horas = HorasPorMatricula()
+        procesar(args.tiempos, [horas], args.bloque)
+        horas.imprimir(args.limite)
+
+    ocupacion = Ocupacion() if quiere('ocupacion') or quiere('pico') else None
+    puntualidad = Puntualidad(args.hora_entrada, args.hora_salida) if quiere('puntualidad') else None
+    agregados_accesos = [a for a in (ocupacion, puntualidad) if a is not None]
+    if agregados_accesos:
+        procesar(args.accesos, agregados_accesos, args.bloque)
+    if quiere('ocupacion'):
+        ocupacion.imprimir(args.dia)
+    if quiere('pico'):
+        ocupacion.imprimir_pico()
+    if puntualidad is not None:
+        puntualidad.imprimir(args.limite)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Servicio HTTP local de ocupación en vivo, junto al lector de control.
+
+Responde a partir de PRESENTES (ver NFC.py): un diccionario UID -> datos de la
+última ENTRADA que el hilo procesador actualiza en cada transición
+ENTRADA/SALIDA. Nunca recorre ESTADOS_ACCESO ni lee estados.csv, y no toma
+CERROJO_USUARIOS: cada consulta copia los valores del diccionario (una
+operación atómica en CPython) y trabaja sobre esa copia, así que un panel que
+consulte cada pocos segundos no retrasa ningún tap. Además, las respuestas
+sin filtro se reutilizan durante VIGENCIA_RESPUESTA segundos, de modo que muchos
+paneles a la vez no multiplican el trabajo.
+
+    GET /ocupacion                  -> {"ocupacion": 12, "instante": "..."}
+    GET /presentes                  -> {"ocupacion": 12, "instante": "...", "presentes": [...]}
+    GET /presentes?matricula=A0123  -> sólo esa matrícula
+    GET /metrics                    -> métricas del lector en texto de Prometheus (si están activas)
+
+Cada presente: uid, nombre, matricula, entrada, puerta y segundos_dentro. La
+entrada está en PRESENTES como epoch (ver marcas_tiempo.py): el tiempo dentro
+es una resta y el texto de la fecha sólo se genera al serializar.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from marcas_tiempo import formatear
+TIPO_PROMETHEUS = 'text/plain; version=0.0.4; charset=utf-8'
+VIGENCIA_RESPUESTA = 1.0  # Segundos que se reutiliza una respuesta ya serializada (resolución de segundos_dentro)
+
+def parsear_direccion(texto):
+    """'127.0.0.1:8765' -> ('127.0.0.1', 8765); '' o 'no' -> None (servicio desactivado)."""
+    if not texto or texto.strip().lower() in ("no", "0", "ninguno"):
+        return None
+    host, _, puerto = texto.strip().rpartition(":")
+    return host or "127.0.0.1", int(puerto)
+
+def serializar(datos):
+    return json.dumps(datos, ensure_ascii=False).encode('utf-8')
+
+# ==============================================================================
+# 1. MANEJADOR HTTP
+# ==============================================================================
+
+class ManejadorOcupacion(BaseHTTPRequestHandler):
+    servicio = None  # Se fija al crear el servidor (ver ServicioOcupacion.iniciar)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/ocupacion':
+            self._responder(200, serializar(self.servicio.ocupacion()))  # O(1): siempre al día
+        elif url.path == '/presentes':
+            matricula = parse_qs(url.query).get('matricula', [None])[0]
+            if matricula is None:
+                self._responder(200, self.servicio.respuesta('presentes', self.servicio.presentes))
+            else:
+                self._responder(200, serializar(self.servicio.presentes(matricula)))
+        elif url.path == '/metrics' and self.servicio.metricas is not None:
+            self._responder(200, self.servicio.metricas().encode('utf-8'), TIPO_PROMETHEUS)
+        else:
+            self._responder(404, serializar({'error': f"Ruta desconocida: '{url.path}'"}))
+
+    def _responder(self, codigo, cuerpo, tipo='application/json; charset=utf-8'):
+        self.send_response(codigo)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *argumentos):
+        pass  # La consola es la del lector de control: no ensuciarla con cada consulta
+
+# ==============================================================================
+# 2. SERVICIO
+# ==============================================================================
+
+class ServicioOcupacion:
+    """Servidor HTTP en un hilo propio que publica el contenido de 'presentes'."""
+
+    def __init__(self, presentes, direccion=("127.0.0.1", 8765), metricas=None):
+        self.presentes_actuales = presentes  # UID: {'nombre', 'matricula', 'entrada' (epoch), 'puerta'}
+        self.direccion = direccion
+        self.metricas = metricas  # Función que devuelve el texto de /metrics (None: ruta desactivada)
+        self._servidor = None
+        self._hilo = None
+        self._respuestas = {}  # Ruta: (instante monotónico, cuerpo JSON)
+
+    def iniciar(self):
+        manejador = type('Manejador', (ManejadorOcupacion,), {'servicio': self})
+        self._servidor = ThreadingHTTPServer(self.direccion, manejador)
+        self._servidor.daemon_threads = True
+        self.direccion = self._servidor.server_address[:2]  # Puerto real si se pidió el 0
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._hilo.join()
+            self._servidor = None
+
+    def respuesta(self, ruta, generar):
+        """Cuerpo JSON de 'ruta' (listados completos), reutilizado mientras tenga menos de VIGENCIA_RESPUESTA segundos."""
+        ahora = time.monotonic()
+        guardada = self._respuestas.get(ruta)
+        if guardada is not None and ahora - guardada[0] < VIGENCIA_RESPUESTA:
+            return guardada[1]
+        cuerpo = serializar(generar())
+        self._respuestas[ruta] = (ahora, cuerpo)
+        return cuerpo
+
+    def ocupacion(self):
+        return {'ocupacion': len(self.presentes_actuales), 'instante': formatear(time.time())}
+
+    def presentes(self, matricula=None):
+        ahora = time.time()
+        instantanea = list(self.presentes_actuales.items())  # Copia atómica; las entradas no se modifican
+        seleccion = sorted(((uid, datos) for uid, datos in instantanea
+                            if matricula is None or datos['matricula'] == matricula),
+                           key=lambda par: par[1]['entrada'] or 0)
+        listado = [
+            {'uid': uid, 'nombre': datos['nombre'], 'matricula': datos['matricula'],
+             'entrada': formatear(datos['entrada']), 'puerta': datos['puerta'],
+             'segundos_dentro': None if datos['entrada'] is None else max(0, int(ahora - datos['entrada']))}
+            for uid, datos in seleccion
+        ]
+        return {'ocupacion': len(instantanea), 'instante': formatear(ahora), 'presentes': listado}
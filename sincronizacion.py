@@ -0,0 +1,359 @@
+"""
+Sincronización offline-first de eventos con un colector central (HTTP).
+
+Cada evento registrado (acceso o permanencia) se encola con un ID único y
+llega al colector aunque la red falle durante horas:
+
+1. El hilo de la puerta sólo añade el evento a una cola en memoria y avisa
+   al hilo de volcado (O(1), nunca espera a disco ni a red).
+2. El hilo de volcado lo pasa enseguida a la BANDEJA DE SALIDA (SQLite en
+   modo WAL con synchronous=FULL, una transacción por ráfaga de hasta
+   ESPERA_VOLCADO segundos): un corte de luz no pierde más que esa ráfaga.
+3. El hilo de envío manda lotes de hasta MAX_LOTE eventos de la bandeja,
+   comprimidos con gzip, al colector. Sólo borra de la bandeja lo que el
+   colector ha confirmado.
+4. Si el envío falla, reintenta con espera exponencial (con jitter) hasta
+   ESPERA_MAXIMA. Un lote reenviado lleva los mismos IDs, así que el colector
+   descarta los duplicados (idempotencia).
+5. Contrapresión: lo que no cabe en la bandeja (MAX_PENDIENTES) o en la cola
+   en memoria (MAX_MEMORIA, si el volcado se atasca) se descarta en lugar de
+   bloquear la puerta, pero cada descarte se cuenta (descartados y la
+   métrica sync_descartados) y se avisa por pantalla. Los CSV locales siguen
+   siendo el registro completo.
+
+Protocolo: POST <url> con Content-Encoding: gzip y cuerpo JSON
+{"dispositivo": "...", "eventos": [{"id": ..., "tipo": "acceso"|"tiempo", ...}]};
+el colector responde 2xx con {"aceptados": n, "duplicados": m}
+(ver colector_local.py).
+
+Uso:
+    python sincronizacion.py estado
+    python sincronizacion.py enviar --url http://127.0.0.1:8780/eventos
+"""
+import argparse
+import collections
+import gzip
+import json
+import random
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+import metricas
+from marcas_tiempo import formatear
+
+ARCHIVO_BANDEJA = "bandeja_salida.db"
+MAX_LOTE = 500               # Eventos por envío
+MAX_MEMORIA = 10000          # Eventos en la cola en memoria antes de descartar
+MAX_PENDIENTES = 1000000     # Eventos en la bandeja antes de dejar de aceptar más
+INTERVALO_ENVIO = 5.0        # Segundos entre envíos cuando no hay nada pendiente
+ESPERA_VOLCADO = 0.05        # Segundos que el volcado agrupa una ráfaga de eventos en una transacción
+ESPERA_TRAS_ERROR = 1.0      # Pausa del volcado tras un error de la bandeja antes de reintentar
+ESPERA_INICIAL = 1.0         # Primera espera tras un fallo (se duplica en cada fallo seguido)
+ESPERA_MAXIMA = 300.0        # Tope de la espera entre reintentos
+TIEMPO_LIMITE_HTTP = 10.0    # Segundos de timeout de cada envío
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS bandeja (
+    secuencia INTEGER PRIMARY KEY,
+    id        TEXT NOT NULL UNIQUE,
+    evento    TEXT NOT NULL
+);
+"""
+
+class ErrorEnvio(Exception):
+    """El colector no confirmó el lote (red caída, timeout o respuesta no 2xx)."""
+
+    def __init__(self, mensaje, codigo=None):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+# ==============================================================================
+# 1. BANDEJA DE SALIDA (DURABLE)
+# ==============================================================================
+
+class BandejaSalida:
+    """Eventos pendientes de confirmar por el colector, en orden de llegada."""
+
+    def __init__(self, ruta=ARCHIVO_BANDEJA):
+        self.ruta = ruta
+        # La comparten los hilos de volcado y de envío: el cerrojo serializa sus transacciones
+        self._conexion = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False)
+        self._cerrojo = threading.Lock()
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        # FULL: cada transacción confirmada sobrevive también a un corte de luz (NORMAL sólo a un cierre brusco)
+        self._conexion.execute("PRAGMA synchronous=FULL")
+        self._conexion.executescript(ESQUEMA)
+        # Contador en memoria: COUNT(*) recorre toda la tabla y volcar() lo consulta en cada volcado
+        self._pendientes = self._conexion.execute("SELECT COUNT(*) FROM bandeja").fetchone()[0]
+
+    def __len__(self):
+        return self._pendientes
+
+    def guardar(self, eventos):
+        """Añade 'eventos' (dicts con 'id') en una sola transacción; ignora IDs ya guardados."""
+        with self._cerrojo, self._conexion:
+            self._conexion.execute("BEGIN")
+            antes = self._conexion.total_changes
+            self._conexion.executemany(
+                "INSERT OR IGNORE INTO bandeja (id, evento) VALUES (?, ?)",
+                ((evento['id'], json.dumps(evento, ensure_ascii=False)) for evento in eventos))
+            insertados = self._conexion.total_changes - antes
+        self._pendientes += insertados
+
+    def pendientes(self, limite=MAX_LOTE):
+        """Lista [(secuencia, evento)] de los 'limite' eventos más antiguos."""
+        with self._cerrojo:
+            filas = self._conexion.execute(
+                "SELECT secuencia, evento FROM bandeja ORDER BY secuencia LIMIT ?", (limite,)).fetchall()
+        return [(secuencia, json.loads(evento)) for secuencia, evento in filas]
+
+    def confirmar(self, hasta_secuencia):
+        """Borra los eventos ya confirmados (todos los de secuencia <= 'hasta_secuencia')."""
+        with self._cerrojo:
+            borrados = self._conexion.execute("DELETE FROM bandeja WHERE secuencia <= ?",
+                                              (hasta_secuencia,)).rowcount
+            self._pendientes -= borrados
+
+    def cerrar(self):
+        with self._cerrojo:
+            self._conexion.close()
+
+# ==============================================================================
+# 2. ENVÍO AL COLECTOR
+# ==============================================================================
+
+def comprimir_lote(dispositivo, eventos):
+    return gzip.compress(json.dumps({'dispositivo': dispositivo, 'eventos': eventos},
+                                    ensure_ascii=False).encode('utf-8'), compresslevel=6)
+
+def enviar_lote(url, dispositivo, eventos, tiempo_limite=TIEMPO_LIMITE_HTTP):
+    """Envía un lote comprimido. Devuelve la respuesta del colector o lanza ErrorEnvio."""
+    import urllib.error  # urllib.request (http.client, ssl, email...) sólo cuando hay algo que enviar
+    import urllib.request
+    peticion = urllib.request.Request(url, data=comprimir_lote(dispositivo, eventos), method='POST', headers={
+        'Content-Type': 'application/json; charset=utf-8',
+        'Content-Encoding': 'gzip',
+    })
+    try:
+        with urllib.request.urlopen(peticion, timeout=tiempo_limite) as respuesta:
+            cuerpo = respuesta.read()
+    except urllib.error.HTTPError as e:
+        raise ErrorEnvio(f"el colector respondió {e.code}", e.code) from e
+    except (urllib.error.URLError, OSError) as e:
+        raise ErrorEnvio(f"no se pudo contactar con el colector: {e}") from e
+    try:
+        return json.loads(cuerpo) if cuerpo else {}
+    except ValueError:
+        return {}
+
+def espera_reintento(fallos_seguidos):
+    """Espera exponencial con jitter: entre la mitad y el total de ESPERA_INICIAL * 2^(fallos-1)."""
+    espera = min(ESPERA_MAXIMA, ESPERA_INICIAL * 2 ** (fallos_seguidos - 1))
+    return espera * random.uniform(0.5, 1.0)
+
+# ==============================================================================
+# 3. SINCRONIZADOR (HILO EN SEGUNDO PLANO)
+# ==============================================================================
+
+class Sincronizador:
+    """Cola en memoria -> bandeja de salida (hilo de volcado) -> colector (hilo de envío)."""
+
+    def __init__(self, url, dispositivo=None, ruta_bandeja=ARCHIVO_BANDEJA, max_lote=MAX_LOTE,
+                 intervalo=INTERVALO_ENVIO, imprimir=print):
+        self.url = url
+        self.dispositivo = dispositivo or socket.gethostname()
+        self.bandeja = BandejaSalida(ruta_bandeja)
+        self.max_lote = max_lote
+        self.intervalo = intervalo
+        self.imprimir = imprimir
+        self.descartados = 0
+        self.enviados = 0
+        self._memoria = collections.deque()
+        self._hay_eventos = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._hilo_volcado = None
+        self._fallos_seguidos = 0
+        self._proximo_intento = 0.0
+        self._descartes_sin_avisar = collections.Counter()  # Motivo: eventos descartados aún no avisados
+        self._cerrojo_descartes = threading.Lock()          # La puerta descarta y el volcado avisa
+
+    # --- Lado de la puerta ---
+
+    def encolar(self, tipo, datos):
+        """
+        Añade un evento con ID único y despierta al hilo de volcado. Nunca
+        bloquea: si la cola está llena (el volcado está atascado), lo descarta.
+        """
+        if len(self._memoria) >= MAX_MEMORIA:
+            self._descartar(1, "cola en memoria llena")  # El hilo de volcado lo avisa (aquí no se imprime)
+            return None
+        evento = dict(datos, id=uuid.uuid4().hex, tipo=tipo)
+        self._memoria.append(evento)  # deque.append es atómico: no hace falta cerrojo
+        self._hay_eventos.set()
+        return evento['id']
+
+    def _descartar(self, cantidad, motivo):
+        with self._cerrojo_descartes:
+            self.descartados += cantidad
+            self._descartes_sin_avisar[motivo] += cantidad
+        metricas.contar('sync_descartados', cantidad)
+
+    def avisar_descartes(self):
+        """Imprime los descartes acumulados desde el último aviso (desde los hilos del sincronizador)."""
+        with self._cerrojo_descartes:
+            if not self._descartes_sin_avisar:
+                return
+            motivos = ", ".join(f"{cantidad} por {motivo}" for motivo, cantidad in self._descartes_sin_avisar.items())
+            self._descartes_sin_avisar.clear()
+        self.imprimir(f"*** ADVERTENCIA: eventos descartados para la sincronización ({motivos}); "
+                      f"{self.descartados} en total")
+
+    # --- Hilos del sincronizador ---
+
+    def iniciar(self):
+        self._hilo_volcado = threading.Thread(target=self._volcar_al_llegar, daemon=True)
+        self._hilo_volcado.start()
+        self._hilo = threading.Thread(target=self._ejecutar, daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Para los hilos y guarda en la bandeja lo que quede en memoria (se enviará en el próximo arranque)."""
+        self._detener.set()
+        self._hay_eventos.set()
+        for hilo in (self._hilo_volcado, self._hilo):
+            if hilo is not None:
+                hilo.join()
+        try:
+            self.volcar()
+        except sqlite3.Error as e:
+            self._descartar(len(self._memoria), "error de la bandeja al cerrar")
+            self._memoria.clear()
+            self.imprimir(f"*** ERROR en la bandeja de salida: {e}")
+        self.avisar_descartes()
+        self.bandeja.cerrar()
+
+    def _volcar_al_llegar(self):
+        """Hilo de volcado: guarda cada ráfaga de eventos en cuanto llega, sin esperar al envío."""
+        while True:
+            self._hay_eventos.wait()
+            if self._detener.is_set():
+                return  # detener() hace el último volcado
+            # Unos milisegundos para que los taps de una misma ráfaga compartan transacción (y fsync)
+            self._detener.wait(ESPERA_VOLCADO)
+            self._hay_eventos.clear()
+            try:
+                self.volcar()
+            except sqlite3.Error as e:
+                metricas.contar('errores_io')
+                self.imprimir(f"*** ERROR en la bandeja de salida: {e}")
+                self._hay_eventos.set()  # Los eventos siguen en memoria: reintentar tras una pausa
+                self._detener.wait(ESPERA_TRAS_ERROR)
+            self.avisar_descartes()
+
+    def _ejecutar(self):
+        """Hilo de envío: manda lo que hay en la bandeja cada 'intervalo' (o seguido si queda más)."""
+        while not self._detener.is_set():
+            try:
+                pendiente = self.sincronizar_lote()
+            except sqlite3.Error as e:
+                metricas.contar('errores_io')
+                self.imprimir(f"*** ERROR en la bandeja de salida: {e}")
+                pendiente = False
+            if not pendiente:
+                self._detener.wait(max(self.intervalo, self._proximo_intento - time.monotonic()))
+
+    def volcar(self):
+        """
+        Pasa los eventos en memoria a la bandeja durable. Los que no caben
+        (bandeja con MAX_PENDIENTES) se descartan y se cuentan. Si la bandeja
+        falla, los eventos vuelven a la memoria y se relanza el error.
+        """
+        eventos = []
+        while self._memoria:
+            eventos.append(self._memoria.popleft())
+        if not eventos:
+            return
+        libres = max(0, MAX_PENDIENTES - len(self.bandeja))
+        if len(eventos) > libres:
+            self._descartar(len(eventos) - libres, f"bandeja de salida llena ({MAX_PENDIENTES} sin confirmar)")
+            eventos = eventos[:libres]  # Se conservan los más antiguos, en orden
+            if not eventos:
+                return
+        try:
+            self.bandeja.guardar(eventos)
+        except sqlite3.Error:
+            self._memoria.extendleft(reversed(eventos))
+            raise
+
+    def sincronizar_lote(self):
+        """
+        Envía el lote más antiguo si toca (respetando la espera tras un fallo).
+        Devuelve True si quedan más eventos listos para enviar sin esperar.
+        """
+        if time.monotonic() < self._proximo_intento:
+            return False
+        lote = self.bandeja.pendientes(self.max_lote)
+        if not lote:
+            return False
+
+        try:
+            enviar_lote(self.url, self.dispositivo, [evento for _, evento in lote])
+        except ErrorEnvio as e:
+            if e.codigo == 413 and self.max_lote > 1:
+                self.max_lote //= 2  # Lote demasiado grande para el colector: reintentar con la mitad
+            self._fallos_seguidos += 1
+            espera = espera_reintento(self._fallos_seguidos)
+            self._proximo_intento = time.monotonic() + espera
+            metricas.contar('sync_fallos')
+            if self._fallos_seguidos == 1 or self._fallos_seguidos % 10 == 0:
+                self.imprimir(f"*** ADVERTENCIA: sincronización fallida ({e}); "
+                              f"reintento en {espera:.0f} s ({len(self.bandeja)} eventos pendientes)")
+            return False
+
+        self.bandeja.confirmar(lote[-1][0])
+        self.enviados += len(lote)
+        self._fallos_seguidos = 0
+        self._proximo_intento = 0.0
+        metricas.contar('sync_enviados', len(lote))
+        return len(lote) == self.max_lote
+
+# ==============================================================================
+# INICIO DEL PROGRAMA
+# ==============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bandeja de salida de eventos hacia el colector central")
+    parser.add_argument('--bandeja', default=ARCHIVO_BANDEJA, help="Ruta de la bandeja de salida")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    subcomandos.add_parser('estado', help="Eventos pendientes de confirmar")
+    enviar = subcomandos.add_parser('enviar', help="Enviar ahora todo lo pendiente")
+    enviar.add_argument('--url', required=True, help="URL del colector (POST)")
+    enviar.add_argument('--dispositivo', default=None, help="Identificador de este lector (por defecto, el hostname)")
+    args = parser.parse_args(argv)
+
+    if args.comando == 'estado':
+        bandeja = BandejaSalida(args.bandeja)
+        pendientes = bandeja.pendientes(1)
+        print(f"{len(bandeja)} eventos pendientes en '{args.bandeja}'")
+        if pendientes:
+            print(f"   Más antiguo: {formatear(pendientes[0][1].get('timestamp'))} ({pendientes[0][1]['id']})")
+        bandeja.cerrar()
+        return 0
+
+    sincronizador = Sincronizador(args.url, args.dispositivo, args.bandeja)
+    try:
+        while sincronizador.sincronizar_lote():
+            pass
+        restantes = len(sincronizador.bandeja)
+        print(f"{sincronizador.enviados} eventos enviados, {restantes} pendientes")
+        return 0 if restantes == 0 else 1
+    finally:
+        sincronizador.bandeja.cerrar()
+
+if __name__ == '__main__':
+    sys.exit(main())
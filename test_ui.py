@@ -1,30 +1,53 @@
-import RPi.GPIO as GPIO
-from mfrc522 import SimpleMFRC522
+"""
+Diagnóstico del lector: muestra el UID de cualquier tarjeta que se acerque.
+
+Uso:
+    python test_ui.py
+    python nfc_acceso.py diagnostico
+"""
+import sys
 import time
 
-# Crea una instancia de la clase SimpleMFRC522
-reader = SimpleMFRC522()
-
-print("--- Diagnóstico: Lectura de ID Único (UID) ---")
-print("Coloca CUALQUIER tarjeta cerca del lector para ver su ID...")
-
-try:
-    while True:
-        # read_id() lee solo el UID y bloquea el programa hasta que lo encuentra.
-        # Es la forma más simple de verificar la comunicación SPI/Hardware.
-        id_unico = reader.read_id()
-        
-        if id_unico:
-            print("-" * 40)
-            print(f"¡Hardware OK! ID Único detectado: {id_unico}")
-            print("-" * 40)
-            time.sleep(2) # Espera 2 segundos antes de volver a buscar
-        
-        # Nota: read_id() ya bloquea el programa, por lo que el sleep(0.1) anterior no es necesario.
-
-except KeyboardInterrupt:
-    print("\nPrograma detenido.")
-
-finally:
-    GPIO.cleanup()
-    print("Limpieza de GPIO completada.")
\ No newline at end of file
+from lectores import crear_lector, liberar_gpio
+
+# --- Funciones ---
+
+def main(al_arrancar=None):
+    """Bucle de diagnóstico. Con 'al_arrancar' lo llama tras abrir el lector y sale sin leer."""
+    # Crea el lector (MFRC522 o simulado según NFC_LECTOR; ver lectores.py)
+    reader = crear_lector()
+
+    print("--- Diagnóstico: Lectura de ID Único (UID) ---")
+    print("Coloca CUALQUIER tarjeta cerca del lector para ver su ID...")
+
+    try:
+        if al_arrancar is not None:
+            al_arrancar()
+            return 0
+
+        while True:
+            # read_id() lee solo el UID y bloquea el programa hasta que lo encuentra.
+            # Es la forma más simple de verificar la comunicación SPI/Hardware.
+            id_unico = reader.read_id()
+
+            if id_unico:
+                print("-" * 40)
+                print(f"¡Hardware OK! ID Único detectado: {id_unico}")
+                print("-" * 40)
+                time.sleep(2) # Espera 2 segundos antes de volver a buscar
+
+            # Nota: read_id() ya bloquea el programa, por lo que el sleep(0.1) anterior no es necesario.
+
+    except KeyboardInterrupt:
+        print("\nPrograma detenido.")
+        return 0
+
+    finally:
+        reader.cerrar()
+        liberar_gpio()
+        print("Limpieza de GPIO completada.")
+
+# --- Programa Principal ---
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""Utilidades comunes de las pruebas (sin hardware: lectores y GPIO simulados)."""
+import csv
+
+import pytest
+
+# UID, Nombre, Matricula
+USUARIOS_PRUEBA = [
+    (111111111111, "Ana Pérez", "S22000001"),
+    (222222222222, "Beto Ruiz", "S22000002"),
+]
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    """Directorio de trabajo vacío: los archivos del sistema usan rutas relativas."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def nfc(directorio, monkeypatch):
+    """NFC.py con el motor CSV, sin particiones y con usuarios.csv de USUARIOS_PRUEBA."""
+    import NFC
+    monkeypatch.setattr(NFC, 'MOTOR_ALMACENAMIENTO', 'csv')
+    monkeypatch.setattr(NFC, 'PARTICIONADO_REGISTROS', 'ninguno')
+    monkeypatch.setattr(NFC, 'REGISTROS_DIARIO', 0)
+    with open(NFC.ARCHIVO_USUARIOS, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(NFC.ENCABEZADOS[NFC.ARCHIVO_USUARIOS])
+        escritor.writerows(USUARIOS_PRUEBA)
+    yield NFC
+    NFC.cerrar_escritores()
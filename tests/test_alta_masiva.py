@@ -0,0 +1,82 @@
+"""Alta masiva: lectura y validación de listas, asignación por escaneo e importación sin tocar estados."""
+import os
+
+import alta_masiva
+from alta_masiva import SesionAsignacion, leer_lista, validar_lista
+from lectores import LectorSimulado
+from roster_usuarios import Roster, Usuario, cargar_usuarios
+
+from conftest import USUARIOS_PRUEBA
+
+UID_ANA = USUARIOS_PRUEBA[0][0]
+
+def roster_prueba():
+    roster = Roster()
+    for uid, nombre, matricula in USUARIOS_PRUEBA:
+        roster[uid] = Usuario(nombre, matricula)
+    return roster
+
+def test_leer_lista_con_y_sin_encabezado(directorio):
+    (directorio / "con.csv").write_text("﻿Matrícula,Nombre Completo,UID\nS1,Ana,123\nS2,Beto,\n,Sin,\nS4,Dora,x\n",
+                                        encoding='utf-8')
+    filas, errores = leer_lista("con.csv")
+    assert [(f['linea'], f['uid'], f['nombre'], f['matricula']) for f in filas] == \
+        [(2, 123, "Ana", "S1"), (3, None, "Beto", "S2")]
+    assert errores == [(4, "nombre o matrícula vacíos"), (5, "UID no numérico 'x'")]
+
+    (directorio / "sin.csv").write_text("Carla,S3\nDora\n")
+    filas, errores = leer_lista("sin.csv")
+    assert [(f['linea'], f['nombre'], f['matricula']) for f in filas] == [(1, "Carla", "S3")]
+    assert errores == [(2, "faltan columnas")]
+
+def test_validar_rechaza_repetidas_en_la_lista_y_en_el_roster():
+    filas = [
+        {'linea': 2, 'uid': UID_ANA, 'nombre': "Otra", 'matricula': "S9"},         # Tarjeta ya registrada
+        {'linea': 3, 'uid': None, 'nombre': "Otra", 'matricula': "s22000002"},    # Matrícula registrada
+        {'linea': 4, 'uid': 5, 'nombre': "Carla", 'matricula': "S3"},
+        {'linea': 5, 'uid': 5, 'nombre': "Dora", 'matricula': "S4"},              # UID repetido en la lista
+        {'linea': 6, 'uid': None, 'nombre': "Eva", 'matricula': "s3"},            # Matrícula repetida en la lista
+        {'linea': 7, 'uid': None, 'nombre': "Fran", 'matricula': "S6"},
+    ]
+    validas, errores = validar_lista(filas, roster_prueba())
+    assert [fila['linea'] for fila in validas] == [4, 7]
+    assert [linea for linea, _ in errores] == [2, 3, 5, 6]
+
+def test_escanear_y_asignar_en_orden():
+    pendientes = [{'linea': 2, 'uid': None, 'nombre': "Carla", 'matricula': "S3"},
+                  {'linea': 3, 'uid': None, 'nombre': "Dora", 'matricula': "S4"}]
+    # La misma tarjeta dos veces seguidas (sigue sobre el lector), una ya registrada y dos nuevas
+    lector = LectorSimulado(guion=[501, 501, UID_ANA, 502], taps_por_segundo=0)
+    sesion = SesionAsignacion(pendientes, roster_prueba(), lector, ventana_repeticion=60)
+    asignadas = sesion.ejecutar()
+    assert [(fila['nombre'], fila['uid']) for fila in asignadas] == [("Carla", 501), ("Dora", 502)]
+    assert sesion.restantes == []
+
+def test_asignar_rechaza_tarjetas_repetidas_y_filas_agotadas():
+    sesion = SesionAsignacion([{'linea': 2, 'uid': None, 'nombre': "Carla", 'matricula': "S3"},
+                               {'linea': 3, 'uid': None, 'nombre': "Dora", 'matricula': "S4"}],
+                              roster_prueba(), lector=None)
+    assert sesion.asignar(UID_ANA)[0] is None
+    assert sesion.asignar(501)[0]['nombre'] == "Carla"
+    assert sesion.asignar(501) == (None, "la tarjeta ya se asignó en esta sesión")
+    assert [fila['nombre'] for fila in sesion.restantes] == ["Dora"]
+    sesion.asignar(502)
+    assert sesion.asignar(503) == (None, "no quedan filas pendientes")
+
+def test_importar_no_toca_los_estados_de_la_puerta(nfc):
+    # Estado de un proceso de la puerta en marcha: snapshot más diario sin compactar
+    with open(nfc.ARCHIVO_ESTADOS, 'w') as f:
+        f.write(f"UID,Estado,Ultima_Entrada_Timestamp\n{UID_ANA},SALIDA,\n")
+    with open(nfc.ARCHIVO_DIARIO_ESTADOS, 'w') as f:
+        f.write(f"{UID_ANA},ENTRADA,1760700000\n")
+    antes = {ruta: open(ruta).read() for ruta in (nfc.ARCHIVO_ESTADOS, nfc.ARCHIVO_DIARIO_ESTADOS)}
+    with open("lista.csv", 'w') as f:
+        f.write("UID,Nombre,Matricula\n333333333333,Carla Díaz,S22000003\n,Dora Gil,S22000004\n")
+
+    assert alta_masiva.main(['importar', 'lista.csv']) == 0
+
+    assert {ruta: open(ruta).read() for ruta in antes} == antes
+    assert not os.path.exists(nfc.ARCHIVO_ESTADOS + ".tmp")
+    usuarios = cargar_usuarios(nfc.ARCHIVO_USUARIOS, usar_cache=False)
+    assert usuarios.get(333333333333) == Usuario("Carla Díaz", "S22000003")
+    assert len(usuarios) == len(USUARIOS_PRUEBA) + 1  # Dora no tiene tarjeta: no se da de alta
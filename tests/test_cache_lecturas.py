@@ -0,0 +1,58 @@
+"""Cachés acotadas de NFC_Sxx.py: ventana de tarjetas vistas (TTL + LRU) y textos por UID."""
+import NFC_Sxx
+from cache_lecturas import CacheTextos, VentanaVistos
+from lectores import LectorSimulado
+
+def test_ventana_caduca_y_no_se_alarga_con_repeticiones():
+    vistas = VentanaVistos(ttl=10, max_entradas=100)
+    assert vistas.visto("a", ahora=0) is False
+    assert vistas.visto("a", ahora=9) is True   # Dentro de la ventana
+    assert vistas.visto("a", ahora=10) is False  # Cuenta desde el registro, no desde la repetición
+    assert vistas.visto("b", ahora=25) is False
+    assert len(vistas) == 1  # 'a' caducó y se purgó
+
+def test_ventana_acotada_olvida_la_mas_antigua():
+    vistas = VentanaVistos(ttl=1000, max_entradas=3)
+    for instante, clave in enumerate("abcd"):
+        vistas.visto(clave, ahora=instante)
+    assert len(vistas) == 3
+    assert vistas.visto("a", ahora=5) is False  # Expulsada por el tope: se registra de nuevo
+    assert vistas.visto("d", ahora=5) is True
+
+def test_textos_lru_y_caducidad():
+    textos = CacheTextos(max_entradas=2, ttl=100)
+    textos.guardar(1, "S1", ahora=0)
+    textos.guardar(2, "S2", ahora=0)
+    assert textos.get(1, ahora=1) == "S1"  # 1 pasa a ser el más reciente
+    textos.guardar(3, "S3", ahora=2)
+    assert textos.get(2, ahora=2) is None and len(textos) == 2
+    assert textos.get(1, ahora=100) is None  # Caducado: se relee la tarjeta
+    assert textos.get(3, ahora=50) == "S3"
+
+class LectorContado(LectorSimulado):
+    """Lector simulado que cuenta las lecturas de texto y sale con Ctrl+C al agotar el guion."""
+
+    def __init__(self, *args, **opciones):
+        super().__init__(*args, **opciones)
+        self.lecturas_texto = 0
+
+    def read_id(self):
+        if self.agotado:
+            raise KeyboardInterrupt
+        return super().read_id()
+
+    def read(self):
+        self.lecturas_texto += 1
+        return super().read()
+
+def test_nfc_sxx_lee_cada_texto_una_vez_y_no_repite_registros(directorio, monkeypatch):
+    lector = LectorContado(guion=[1, 2, 1, 1, 2, 3], taps_por_segundo=0,
+                           textos={1: "S22000001 ", 2: "S22000002", 3: ""})
+    monkeypatch.setattr(NFC_Sxx, 'crear_lector', lambda: lector)
+    monkeypatch.setattr(NFC_Sxx.time, 'sleep', lambda segundos: None)
+
+    assert NFC_Sxx.main() == 0
+
+    with open(NFC_Sxx.NOMBRE_ARCHIVO) as f:
+        assert [linea.split(",")[0] for linea in f] == ["S22000001", "S22000002"]
+    assert lector.lecturas_texto == 3  # Una por tarjeta: 1 y 2 salen de la caché; 3 no tiene texto
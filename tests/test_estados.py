@@ -0,0 +1,68 @@
+"""Estados de acceso: diario con un registro truncado y pérdida del snapshot (estados.csv)."""
+import csv
+import os
+
+from marcas_tiempo import ahora
+
+from conftest import USUARIOS_PRUEBA
+
+UID_ANA, UID_BETO = USUARIOS_PRUEBA[0][0], USUARIOS_PRUEBA[1][0]
+
+def leer_snapshot(nfc):
+    with open(nfc.ARCHIVO_ESTADOS, newline='', encoding='utf-8') as f:
+        return {int(uid): estado for uid, estado, _ in list(csv.reader(f))[1:]}
+
+def arrancar(nfc):
+    nfc.inicializar_archivos()
+    assert nfc.cargar_datos()
+
+def test_instalacion_nueva_crea_el_snapshot_sin_recuperar(nfc, capsys):
+    arrancar(nfc)
+    assert os.path.exists(nfc.ARCHIVO_ESTADOS)
+    assert nfc.ESTADOS_ACCESO == {}
+    assert "ADVERTENCIA" not in capsys.readouterr().out
+
+def test_diario_con_ultimo_registro_truncado(nfc):
+    instante = ahora()
+    with open(nfc.ARCHIVO_ESTADOS, 'w', newline='', encoding='utf-8') as f:
+        f.write(f"UID,Estado,Ultima_Entrada_Timestamp\n{UID_ANA},SALIDA,\n{UID_BETO},SALIDA,\n")
+    with open(nfc.ARCHIVO_DIARIO_ESTADOS, 'w', newline='', encoding='utf-8') as f:
+        f.write(f"{UID_ANA},ENTRADA,{instante}\n{UID_BETO},ENTR")  # Corte de luz a mitad del segundo registro
+
+    arrancar(nfc)
+
+    assert nfc.ESTADOS_ACCESO[UID_ANA] == {'estado': 'ENTRADA', 'ultima_entrada': instante}
+    assert nfc.ESTADOS_ACCESO[UID_BETO]['estado'] == 'SALIDA'
+    assert list(nfc.PRESENTES) == [UID_ANA]
+    # Compactado al arrancar: el snapshot tiene el registro completo y el diario queda vacío
+    assert leer_snapshot(nfc) == {UID_ANA: 'ENTRADA', UID_BETO: 'SALIDA'}
+    assert os.path.getsize(nfc.ARCHIVO_DIARIO_ESTADOS) == 0
+
+def test_snapshot_perdido_se_recupera_del_registro_de_accesos(nfc, capsys):
+    arrancar(nfc)
+    with nfc.transaccion():
+        nfc.procesar_tarjeta(UID_ANA, 'principal')
+    nfc.cerrar_escritores()
+    assert os.path.getsize(nfc.ARCHIVO_DIARIO_ESTADOS) > 0  # El cambio sólo está en el diario
+    os.remove(nfc.ARCHIVO_ESTADOS)
+    capsys.readouterr()
+
+    arrancar(nfc)
+
+    assert "Reconstruyendo estados" in capsys.readouterr().out
+    assert nfc.ESTADOS_ACCESO[UID_ANA]['estado'] == 'ENTRADA'
+    assert UID_ANA in nfc.PRESENTES
+    assert leer_snapshot(nfc)[UID_ANA] == 'ENTRADA'
+
+def test_snapshot_danado_se_recupera_del_registro_de_accesos(nfc):
+    arrancar(nfc)
+    with nfc.transaccion():
+        nfc.procesar_tarjeta(UID_BETO, 'principal')
+    nfc.guardar_estados()
+    nfc.cerrar_escritores()
+    with open(nfc.ARCHIVO_ESTADOS, 'r+b') as f:
+        f.truncate(os.path.getsize(nfc.ARCHIVO_ESTADOS) - 3)  # Fila cortada
+
+    arrancar(nfc)
+
+    assert nfc.ESTADOS_ACCESO[UID_BETO]['estado'] == 'ENTRADA'
@@ -0,0 +1,53 @@
+"""Marca de agua de exportacion.py: sólo se exportan las filas nuevas y completas."""
+import os
+
+import exportacion
+from marcas_tiempo import formatear
+
+ENCABEZADO = "Timestamp,Matricula,Nombre,Evento,Puerta\n"
+INICIO = 1760700000
+
+def fila(i, instante=None):
+    instante = INICIO + i * 60 if instante is None else instante
+    return f"{instante},S2200000{i % 3},Alumno {i % 3},{'ENTRADA' if i % 2 == 0 else 'SALIDA'},principal\n"
+
+def exportar(directorio):
+    return exportacion.exportar(str(directorio / "exportacion"), accesos=str(directorio / "accesos.csv"),
+                                tiempos=None)
+
+def marca(directorio):
+    return exportacion.cargar_manifiesto(str(directorio / "exportacion"))['tablas']['accesos']['marcas']['accesos.csv']
+
+def instantes(directorio):
+    return list(exportacion.cargar_tabla(str(directorio / "exportacion"), 'accesos')['timestamp'])
+
+def test_solo_exporta_lo_nuevo(directorio):
+    registro = directorio / "accesos.csv"
+    registro.write_text(ENCABEZADO + fila(0) + fila(1) + fila(2)[:10])  # La última fila, a medio escribir
+    assert exportar(directorio) == {'accesos': 2}
+    assert marca(directorio)['desplazamiento'] == len(ENCABEZADO + fila(0) + fila(1))
+
+    with open(registro, 'a') as f:
+        f.write(fila(2)[10:] + fila(3))
+    assert exportar(directorio) == {'accesos': 2}
+    assert exportar(directorio) == {'accesos': 0}  # Sin cambios: ni filas ni trozo nuevo
+
+    manifiesto = exportacion.cargar_manifiesto(str(directorio / "exportacion"))
+    assert [trozo['filas'] for trozo in manifiesto['tablas']['accesos']['trozos']] == [2, 2]
+    assert marca(directorio)['desplazamiento'] == os.path.getsize(registro)
+    assert instantes(directorio) == [INICIO + i * 60 for i in range(4)]
+
+    columnas = exportacion.cargar_tabla(str(directorio / "exportacion"), 'accesos')
+    matriculas = manifiesto['categorias']['matricula']
+    assert [matriculas[codigo] for codigo in columnas['matricula']] == [f"S2200000{i % 3}" for i in range(4)]
+
+def test_archivo_reescrito_no_duplica_filas(directorio):
+    registro = directorio / "accesos.csv"
+    registro.write_text(ENCABEZADO + "".join(fila(i) for i in range(3)))
+    assert exportar(directorio) == {'accesos': 3}
+
+    # Reescrito con las marcas en texto (otros bytes, mismas filas) y una fila nueva al final
+    reescritas = [fila(i, formatear(INICIO + i * 60)) for i in range(3)]
+    registro.write_text(ENCABEZADO + "".join(reescritas) + fila(3))
+    assert exportar(directorio) == {'accesos': 1}
+    assert instantes(directorio) == [INICIO + i * 60 for i in range(4)]
@@ -0,0 +1,119 @@
+"""Índices secundarios del Roster (matrícula y prefijo de nombre) y su construcción fuera del cerrojo."""
+import random
+import threading
+
+from roster_usuarios import Roster, Usuario, construir_indices, normalizar, normalizar_matricula
+
+from conftest import USUARIOS_PRUEBA
+
+def roster(*usuarios):
+    r = Roster()
+    for uid, nombre, matricula in usuarios:
+        r[uid] = Usuario(nombre, matricula)
+    return r
+
+def test_matricula_sin_distinguir_mayusculas_y_tras_cambios():
+    r = roster((1, "José Pérez López", "S22000001"), (2, "María Gómez", "S22000002"))
+    assert r.uid_por_matricula("s22000001 ") == 1
+    r[1] = Usuario("José Pérez López", "S22000009")
+    assert r.uid_por_matricula("S22000001") is None
+    assert r.uid_por_matricula("S22000009") == 1
+    del r[2]
+    assert r.uid_por_matricula("S22000002") is None
+
+def test_matricula_repetida_sobrevive_a_la_baja_de_uno():
+    r = roster((1, "Ana", "S1"), (2, "Beto", "S1"), (3, "Sin matrícula", ""))
+    assert r.uid_por_matricula("S1") == 2  # Gana el último, como al construir desde el CSV
+    del r[2]
+    assert r.uid_por_matricula("S1") == 1
+    assert r.uid_por_matricula("") is None
+
+def test_prefijo_de_cualquier_palabra_sin_acentos():
+    r = roster((1, "José Pérez López", "S1"), (2, "Pedro Páramo", "S2"), (3, "Ana Perea", "S3"))
+    assert r.buscar_nombre("perez lo") == [1]
+    assert sorted(r.buscar_nombre("PE")) == [1, 2, 3]
+    assert r.buscar_nombre("jose") == [1]
+    r[1] = Usuario("José Ruiz", "S1")
+    assert r.buscar_nombre("perez") == []
+    assert r.buscar_nombre("ruiz") == [1]
+
+def test_baja_no_deja_filas_huerfanas():
+    r = roster(*USUARIOS_PRUEBA, (333, "Carla Díaz", "S22000003"))
+    del r[USUARIOS_PRUEBA[0][0]]
+    assert len(r.uids) == len(r.nombres) == len(r.matriculas) == len(r) == 2
+    assert r[333] == Usuario("Carla Díaz", "S22000003")
+    assert r.buscar_nombre("carla") == [333]
+
+def test_uids_repetidos_en_las_columnas_se_compactan():
+    import array
+    r = Roster(array.array('q', [1, 2, 1]), ["Ana", "Beto", "Ana María"], ["S1", "S2", "S1"])
+    assert len(r.uids) == len(r) == 2
+    assert r[1] == Usuario("Ana María", "S1")
+    del r[2]
+    assert list(r.items()) == [(1, Usuario("Ana María", "S1"))]
+
+def test_cambios_durante_la_construccion_se_aplican_al_instalar():
+    r = roster((1, "Ana Pérez", "S1"), (2, "Beto Ruiz", "S2"), (3, "Carla Díaz", "S3"))
+    copia = r.copiar_para_indices()
+    # Lo que ocurre mientras otro hilo construye los índices sobre la copia
+    r[4] = Usuario("Dora Pérez", "S4")
+    r[2] = Usuario("Beto Ruiz", "S9")
+    del r[3]
+    assert r.instalar_indices(copia, construir_indices(*copia))
+
+    assert sorted(r.buscar_nombre("perez")) == [1, 4]
+    assert r.buscar_nombre("carla") == []
+    assert r.uid_por_matricula("S2") is None and r.uid_por_matricula("S9") == 2
+    assert r.uid_por_matricula("S3") is None
+
+def test_copia_obsoleta_no_se_instala():
+    r = roster((1, "Ana", "S1"))
+    copia = r.copiar_para_indices()
+    r.clear()
+    assert not r.instalar_indices(copia, construir_indices(*copia))
+    assert not r.indexado
+
+def test_indices_coinciden_con_un_recorrido_completo():
+    aleatorio = random.Random(7)
+    nombres = ["Ana Pérez", "Beto Ruiz", "Carla Díaz", "Dora Pérez Gil", "Elías Núñez"]
+    r = Roster()
+    r.indexar()
+    for _ in range(2000):
+        uid = aleatorio.randrange(50)
+        if uid in r and aleatorio.random() < 0.3:
+            del r[uid]
+        else:
+            r[uid] = Usuario(aleatorio.choice(nombres), f"S{aleatorio.randrange(40)}")
+
+    for matricula in [f"S{i}" for i in range(40)]:
+        esperados = [uid for uid, u in r.items() if normalizar_matricula(u.matricula) == matricula]
+        assert (r.uid_por_matricula(matricula) in esperados) if esperados else r.uid_por_matricula(matricula) is None
+    for prefijo in ["pe", "perez g", "nu", "gil", "x"]:
+        esperados = {uid for uid, u in r.items()
+                     if any(clave.startswith(prefijo) for clave in [" ".join(normalizar(u.nombre).split()[i:])
+                                                                   for i in range(len(u.nombre.split()))])}
+        assert set(r.buscar_nombre(prefijo, limite=100)) == esperados
+    assert len(r.uids) == len(r)
+
+def test_nfc_construye_los_indices_sin_el_cerrojo_de_los_taps(nfc, monkeypatch):
+    construir = nfc.construir_indices
+    libre = []
+
+    def construir_comprobando(*copia):
+        # Un tap de otro hilo tiene que poder tomar CERROJO_USUARIOS durante la construcción
+        hilo = threading.Thread(target=lambda: libre.append(nfc.CERROJO_USUARIOS.acquire(timeout=1)
+                                                            and nfc.CERROJO_USUARIOS.release() is None))
+        hilo.start()
+        hilo.join()
+        return construir(*copia)
+
+    monkeypatch.setattr(nfc, 'construir_indices', construir_comprobando)
+    nfc.inicializar_archivos()
+    assert nfc.cargar_datos()
+    nfc.esperar_indices_usuarios()
+
+    assert libre == [True]
+    assert nfc.USUARIOS.indexado
+    uid, usuario, estado = nfc.buscar_usuarios("perez")[0]
+    assert (uid, usuario.matricula, estado) == (USUARIOS_PRUEBA[0][0], "S22000001", 'SALIDA')
+    assert nfc.buscar_usuarios("s22000002")[0][0] == USUARIOS_PRUEBA[1][0]
@@ -0,0 +1,90 @@
+"""Lector por IRQ (flancos de GPIOSimulado y fuente simulada) y vuelta al sondeo."""
+import threading
+import time
+
+import pytest
+
+import lectores
+from lectores import (FuenteIRQGPIO, GPIOSimulado, LectorIRQ, LectorSimulado,
+                      abrir_lector_irq, crear_lector)
+
+PIN = 18
+UID = 584191835132
+
+@pytest.fixture
+def gpio():
+    return GPIOSimulado()
+
+@pytest.fixture
+def lector_irq(gpio):
+    # taps_por_segundo=0: la tarjeta está en el campo desde el principio
+    lector = LectorIRQ(LectorSimulado(guion=[UID], taps_por_segundo=0), FuenteIRQGPIO(PIN, gpio))
+    yield lector
+    lector.cerrar()
+
+def test_sin_flanco_no_consulta_el_lector(lector_irq):
+    assert lector_irq.esperar_tarjeta(0.05) is False
+    assert lector_irq.entregados == 0  # Ni un read_id_no_block() mientras no hay IRQ
+
+def test_flanco_despierta_la_lectura(lector_irq, gpio):
+    threading.Timer(0.05, gpio.flanco, args=(PIN,)).start()
+    inicio = time.monotonic()
+    assert lector_irq.read_id() == UID
+    assert time.monotonic() - inicio < 1.0
+    assert lector_irq.fuente.flancos == 1
+
+def test_flanco_en_otro_pin_no_despierta(lector_irq, gpio):
+    gpio.flanco(PIN + 1)
+    assert lector_irq.esperar_tarjeta(0.05) is False
+
+def test_cerrar_despierta_la_espera_y_libera_el_pin(lector_irq, gpio):
+    resultado = []
+    hilo = threading.Thread(target=lambda: resultado.append(lector_irq.esperar_tarjeta()))
+    hilo.start()
+    time.sleep(0.05)
+    lector_irq.cerrar()
+    hilo.join(1.0)
+    assert resultado == [False]
+    assert PIN not in gpio.callbacks
+
+def test_rearme_descarta_flancos_anteriores(gpio):
+    rearmes = []
+    lector = LectorIRQ(LectorSimulado(guion=[UID], taps_por_segundo=0), FuenteIRQGPIO(PIN, gpio),
+                       rearmar=lambda: rearmes.append(1), intervalo_rearme=0.01)
+    gpio.flanco(PIN)  # Flanco de una lectura anterior: el rearme lo borra
+    assert lector.esperar_tarjeta(0.05) is False
+    assert len(rearmes) > 1
+    lector.cerrar()
+
+def test_fuente_simulada_sigue_el_ritmo_de_los_taps():
+    lector = crear_lector("simulado_irq", guion=[1, 2, 3], taps_por_segundo=50)
+    inicio = time.monotonic()
+    assert [lector.read_id() for _ in range(3)] == [1, 2, 3]
+    assert time.monotonic() - inicio == pytest.approx(2 / 50, abs=0.05)
+    assert lector.fuente.flancos == 3
+    lector.cerrar()
+
+class _MFRC522Falso:
+    def __init__(self, bus=0, device=0, pin_rst=None):
+        self.rearmes = 0
+
+    def armar_irq(self):
+        self.rearmes += 1
+
+def test_sin_deteccion_de_flancos_vuelve_al_sondeo(monkeypatch, capsys):
+    def sin_flancos(pin):
+        raise RuntimeError("Failed to add edge detection")
+    monkeypatch.setattr(lectores, 'LectorMFRC522', _MFRC522Falso)
+    monkeypatch.setattr(lectores, 'FuenteIRQGPIO', sin_flancos)
+    lector = abrir_lector_irq(pin_irq=PIN)
+    assert isinstance(lector, _MFRC522Falso)
+    assert "sondeo" in capsys.readouterr().out
+
+def test_con_deteccion_de_flancos_usa_la_irq(monkeypatch, gpio):
+    monkeypatch.setattr(lectores, 'LectorMFRC522', _MFRC522Falso)
+    monkeypatch.setattr(lectores, 'FuenteIRQGPIO', lambda pin: FuenteIRQGPIO(pin, gpio))
+    lector = abrir_lector_irq(pin_irq=PIN)
+    assert isinstance(lector, LectorIRQ)
+    assert PIN in gpio.callbacks
+    lector.esperar_tarjeta(0.02)
+    assert lector._lector.rearmes >= 1  # Petición REQA enviada mientras espera
@@ -0,0 +1,83 @@
+"""Registros particionados: rotación, compresión de las particiones cerradas y consultas por rango."""
+import gzip
+import os
+import shutil
+import threading
+import time
+
+import particiones
+from marcas_tiempo import a_epoch
+from particiones import EscritorParticionado, cargar_indice, consultar
+
+ENCABEZADOS = ['Timestamp', 'Matricula', 'Nombre', 'Evento', 'Puerta']
+OPCIONES = dict(max_filas=1, max_espera=0, politica_fsync="ninguno")
+
+def fila(texto, matricula="S1"):
+    return [a_epoch(texto), matricula, "Ana", 'ENTRADA', 'principal']
+
+def instantes(directorio, **filtros):
+    return [int(f[0]) for f in consultar(directorio, **filtros)]
+
+def test_rotacion_diaria_y_consulta_por_rango(directorio):
+    escritor = EscritorParticionado("accesos", ENCABEZADOS, "diario", **OPCIONES)
+    for texto in ("2026-10-15 09:00", "2026-10-16 09:00", "2026-10-16 18:30", "2026-10-17 08:00"):
+        escritor.escribir(fila(texto, "S2" if texto.endswith("18:30") else "S1"))
+    escritor.cerrar()
+
+    assert sorted(cargar_indice("accesos")['particiones']) == ["2026-10-15", "2026-10-16", "2026-10-17"]
+    estadisticas = {}
+    assert instantes("accesos", desde="2026-10-16", hasta="2026-10-17", estadisticas=estadisticas) == \
+        [a_epoch("2026-10-16 09:00"), a_epoch("2026-10-16 18:30")]
+    assert estadisticas['particiones_leidas'] < estadisticas['particiones_totales']
+    assert instantes("accesos", matricula="S2") == [a_epoch("2026-10-16 18:30")]
+
+def test_particiones_cerradas_se_comprimen(directorio):
+    escritor = EscritorParticionado("accesos", ENCABEZADOS, "diario", comprimir=True, **OPCIONES)
+    escritor.escribir(fila("2026-10-15 09:00"))
+    escritor.escribir(fila("2026-10-16 09:00"))
+    escritor.cerrar()
+
+    entradas = cargar_indice("accesos")['particiones']
+    assert entradas["2026-10-15"]['comprimido'] and entradas["2026-10-15"]['archivo'] == "2026-10-15.csv.gz"
+    assert not entradas["2026-10-16"]['comprimido']  # La activa queda sin comprimir
+    assert sorted(os.listdir("accesos")) == ["2026-10-15.csv.gz", "2026-10-15.idx.json", "2026-10-16.csv",
+                                             "2026-10-16.idx.json", "indice.json"]
+    assert len(instantes("accesos")) == 2
+
+def test_fila_atrasada_reabre_una_particion_comprimida(directorio):
+    escritor = EscritorParticionado("accesos", ENCABEZADOS, "diario", comprimir=True, **OPCIONES)
+    escritor.escribir(fila("2026-10-15 09:00"))
+    escritor.escribir(fila("2026-10-16 09:00"))
+    while not cargar_indice("accesos")['particiones']["2026-10-15"]['comprimido']:
+        time.sleep(0.01)
+    escritor.escribir(fila("2026-10-15 23:59"))  # Llega tarde: se descomprime y se añade
+    escritor.cerrar()
+
+    assert instantes("accesos") == [a_epoch(t) for t in ("2026-10-15 09:00", "2026-10-15 23:59", "2026-10-16 09:00")]
+    assert cargar_indice("accesos")['particiones']["2026-10-15"]['filas'] == 2
+
+def test_fila_atrasada_durante_la_compresion_no_se_pierde(directorio, monkeypatch):
+    empezada, seguir = threading.Event(), threading.Event()
+
+    def comprimir_lento(ruta):
+        # Como comprimir_archivo(), pero con el .csv ya leído mucho antes de sustituirlo
+        with open(ruta, 'rb') as origen, gzip.open(ruta + ".gz.tmp", 'wb') as destino:
+            shutil.copyfileobj(origen, destino)
+        empezada.set()
+        seguir.wait(5)
+        os.replace(ruta + ".gz.tmp", ruta + ".gz")
+        os.remove(ruta)
+        return ruta + ".gz"
+
+    monkeypatch.setattr(particiones, 'comprimir_archivo', comprimir_lento)
+    escritor = EscritorParticionado("accesos", ENCABEZADOS, "diario", comprimir=True, **OPCIONES)
+    escritor.escribir(fila("2026-10-15 09:00"))
+    escritor.escribir(fila("2026-10-16 09:00"))
+    assert empezada.wait(5)
+    threading.Timer(0.1, seguir.set).start()  # La compresión termina mientras la fila atrasada espera
+    escritor.escribir(fila("2026-10-15 23:59"))
+    escritor.escribir(fila("2026-10-16 10:00"))
+    escritor.cerrar()
+
+    assert instantes("accesos") == [a_epoch(t) for t in ("2026-10-15 09:00", "2026-10-15 23:59",
+                                                         "2026-10-16 09:00", "2026-10-16 10:00")]
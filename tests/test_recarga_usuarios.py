@@ -0,0 +1,114 @@
+"""Recarga en caliente de usuarios.csv (VigilanteUsuarios)."""
+import time
+
+from recarga_usuarios import VigilanteUsuarios
+from roster_usuarios import Usuario, cargar_usuarios
+
+from conftest import USUARIOS_PRUEBA
+
+ENCABEZADO = "UID,Nombre,Matricula\n"
+
+def vigilante(ruta):
+    """Vigilante sin hilo: las pruebas llaman a comprobar() directamente."""
+    roster = cargar_usuarios(str(ruta), usar_cache=False)
+    avisos = []
+
+    def al_cambiar(cambios, bajas):
+        avisos.append((cambios, bajas))
+        for uid, usuario in cambios.items():
+            roster[uid] = usuario
+        for uid in bajas:
+            del roster[uid]
+
+    return VigilanteUsuarios(str(ruta), lambda: roster, al_cambiar, usar_inotify=False), roster, avisos
+
+def test_edicion_intermedia_conserva_usuarios_sin_matricula(directorio):
+    ruta = directorio / "usuarios.csv"
+    ruta.write_text(ENCABEZADO + "111,Ana,S1\n222,Beto\n333,Carla,S3\n")
+    vigilante_usuarios, roster, _ = vigilante(ruta)
+    assert roster.get(222) == Usuario("Beto", "")
+
+    ruta.write_text(ENCABEZADO + "111,Ana María,S1\n222,Beto\n333,Carla,S3\n")  # No es un añadido al final
+    assert vigilante_usuarios.comprobar() == ({111: Usuario("Ana María", "S1")}, [])
+    assert roster.get(222) == Usuario("Beto", "")
+
+def test_alta_sin_matricula_por_el_final(directorio):
+    ruta = directorio / "usuarios.csv"
+    ruta.write_text(ENCABEZADO + "111,Ana,S1\n")
+    vigilante_usuarios, roster, _ = vigilante(ruta)
+
+    with open(ruta, 'a') as f:
+        f.write("444,Dora\n")
+    assert vigilante_usuarios.comprobar() == ({444: Usuario("Dora", "")}, [])
+
+def test_altas_por_el_final_cambios_y_bajas(directorio):
+    ruta = directorio / "usuarios.csv"
+    ruta.write_text(ENCABEZADO + "111,Ana,S1\n222,Beto,S2\n")
+    vigilante_usuarios, roster, avisos = vigilante(ruta)
+    assert vigilante_usuarios.comprobar() is None  # Sin cambios desde la carga
+
+    with open(ruta, 'a') as f:
+        f.write("333,Carla,S3\n444,Do")  # La última fila, a medio escribir
+    assert vigilante_usuarios.comprobar() == ({333: Usuario("Carla", "S3")}, [])
+    with open(ruta, 'a') as f:
+        f.write("ra,S4\n")
+    assert vigilante_usuarios.comprobar() == ({444: Usuario("Dora", "S4")}, [])
+
+    ruta.write_text(ENCABEZADO + "111,Ana,S9\n333,Carla,S3\n444,Dora,S4\n")
+    assert vigilante_usuarios.comprobar() == ({111: Usuario("Ana", "S9")}, [222])
+    assert sorted(roster) == [111, 333, 444] and len(avisos) == 3
+
+def test_error_inesperado_no_para_el_hilo(directorio, monkeypatch, capsys):
+    import recarga_usuarios
+    monkeypatch.setattr(recarga_usuarios, 'INTERVALO_SONDEO', 0.02)
+    ruta = directorio / "usuarios.csv"
+    ruta.write_text(ENCABEZADO + "111,Ana,S1\n")
+    vigilante_usuarios, roster, _ = vigilante(ruta)
+    obtener = vigilante_usuarios.obtener_actuales
+    fallos = []
+
+    def obtener_fallando():
+        if not fallos:
+            fallos.append(True)
+            raise RuntimeError("dictionary changed size during iteration")
+        return obtener()
+
+    vigilante_usuarios.obtener_actuales = obtener_fallando
+    vigilante_usuarios.iniciar()
+    try:
+        ruta.write_text(ENCABEZADO + "111,Ana María,S1\n")
+        fin = time.monotonic() + 3
+        while roster.get(111) != Usuario("Ana María", "S1") and time.monotonic() < fin:
+            time.sleep(0.01)
+    finally:
+        vigilante_usuarios.detener()
+    assert fallos and roster.get(111) == Usuario("Ana María", "S1")  # Reintentado tras el error
+    assert "ERROR inesperado" in capsys.readouterr().out
+
+def test_nfc_aplica_la_recarga_sobre_una_copia(nfc, monkeypatch):
+    import recarga_usuarios
+    monkeypatch.setattr(recarga_usuarios, 'INTERVALO_SONDEO', 0.02)
+    nfc.inicializar_archivos()
+    assert nfc.cargar_datos()
+    uid_ana, uid_beto = USUARIOS_PRUEBA[0][0], USUARIOS_PRUEBA[1][0]
+    nfc.procesar_tarjeta(uid_beto, 'principal')
+    assert uid_beto in nfc.PRESENTES
+
+    copia = nfc.copiar_usuarios()
+    assert copia is not nfc.USUARIOS and dict(copia.items()) == dict(nfc.USUARIOS.items())
+    nfc.registrar_usuarios_en_lote([{'uid': 333, 'nombre': "Carla", 'matricula': "S3"}])
+    assert 333 not in copia  # El vigilante compara con la copia, no con el roster vivo
+
+    monkeypatch.setattr(nfc, 'VIGILANTE_USUARIOS', None)
+    nfc.iniciar_recarga_usuarios()
+    try:
+        with open(nfc.ARCHIVO_USUARIOS, 'w') as f:
+            f.write(f"{ENCABEZADO}{uid_ana},Ana Pérez,S22000001\n333,Carla,S3\n")  # Baja de Beto
+        fin = time.monotonic() + 3
+        while uid_beto in nfc.USUARIOS and time.monotonic() < fin:
+            time.sleep(0.01)
+    finally:
+        nfc.VIGILANTE_USUARIOS.detener()
+    assert uid_beto not in nfc.USUARIOS
+    assert uid_beto not in nfc.ESTADOS_ACCESO and uid_beto not in nfc.PRESENTES
+    assert 333 in nfc.USUARIOS
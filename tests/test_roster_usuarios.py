@@ -0,0 +1,74 @@
+"""Carga de usuarios.csv a través de su caché binaria (usuarios.csv.cache)."""
+import os
+
+import roster_usuarios
+from roster_usuarios import EXTENSION_CACHE, Usuario, cargar_usuarios
+
+ENCABEZADO = "UID,Nombre,Matricula\n"
+
+def escribir(ruta, texto, mtime_ns=None):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(texto)
+    if mtime_ns is not None:
+        os.utime(ruta, ns=(mtime_ns, mtime_ns))
+
+def como_dict(roster):
+    return dict(roster.items())
+
+def test_cache_al_dia_no_vuelve_a_leer_el_csv(directorio):
+    escribir("usuarios.csv", ENCABEZADO + "1,Ana,S1\n2,Beto,S2\n")
+    primera = cargar_usuarios("usuarios.csv")
+    assert os.path.exists("usuarios.csv" + EXTENSION_CACHE)
+
+    # Mismo tamaño y mtime pero otro contenido: si se leyera el CSV, cambiaría el resultado
+    mtime = os.stat("usuarios.csv").st_mtime_ns
+    escribir("usuarios.csv", ENCABEZADO + "1,Xxx,S1\n2,Yyyy,S2\n", mtime)
+    assert como_dict(cargar_usuarios("usuarios.csv")) == como_dict(primera)
+
+def test_mismo_contenido_con_otro_mtime(directorio, monkeypatch):
+    escribir("usuarios.csv", ENCABEZADO + "1,Ana,S1\n")
+    cargar_usuarios("usuarios.csv")
+    os.utime("usuarios.csv", ns=(10**18, 10**18))
+
+    def sin_parsear(*argumentos):
+        raise AssertionError("no debería parsear filas")
+
+    monkeypatch.setattr(roster_usuarios, '_parsear_filas', sin_parsear)
+    assert como_dict(cargar_usuarios("usuarios.csv")) == {1: Usuario("Ana", "S1")}
+
+def test_crecimiento_por_el_final_parsea_solo_lo_nuevo(directorio, monkeypatch):
+    escribir("usuarios.csv", ENCABEZADO + "1,Ana,S1\n")
+    cargar_usuarios("usuarios.csv")
+    with open("usuarios.csv", 'a', encoding='utf-8') as f:
+        f.write("2,Beto\n3,Carla,S3\n")
+
+    parsear = roster_usuarios._parsear_filas
+    parseadas = []
+
+    def parsear_contando(lineas, *columnas):
+        texto = lineas.read()
+        parseadas.append(texto)
+        parsear(iter(texto.splitlines(keepends=True)), *columnas)
+
+    monkeypatch.setattr(roster_usuarios, '_parsear_filas', parsear_contando)
+    assert como_dict(cargar_usuarios("usuarios.csv")) == {
+        1: Usuario("Ana", "S1"), 2: Usuario("Beto", ""), 3: Usuario("Carla", "S3")}
+    assert parseadas == ["2,Beto\n3,Carla,S3\n"]
+
+def test_edicion_intermedia_y_uid_repetido(directorio):
+    escribir("usuarios.csv", ENCABEZADO + "1,Ana,S1\n2,Beto,S2\n")
+    cargar_usuarios("usuarios.csv")
+    escribir("usuarios.csv", ENCABEZADO + "1,Ana María,S1\n2,Beto,S2\n1,Ana Gil,S1\n")
+    roster = cargar_usuarios("usuarios.csv")
+    assert como_dict(roster) == {1: Usuario("Ana Gil", "S1"), 2: Usuario("Beto", "S2")}  # Gana la última fila
+    assert len(roster.uids) == 2
+
+def test_cache_danada_o_de_otra_version_se_rehace(directorio, monkeypatch):
+    escribir("usuarios.csv", ENCABEZADO + "1,Ana,S1\n")
+    escribir("usuarios.csv" + EXTENSION_CACHE, "basura")
+    assert como_dict(cargar_usuarios("usuarios.csv")) == {1: Usuario("Ana", "S1")}
+    assert roster_usuarios._leer_cache("usuarios.csv" + EXTENSION_CACHE) is not None
+
+    monkeypatch.setattr(roster_usuarios, 'VERSION_CACHE', roster_usuarios.VERSION_CACHE + 1)
+    assert roster_usuarios._leer_cache("usuarios.csv" + EXTENSION_CACHE) is None
+    assert como_dict(cargar_usuarios("usuarios.csv")) == {1: Usuario("Ana", "S1")}
@@ -0,0 +1,121 @@
+"""Bandeja de salida: durabilidad sin esperar al envío, idempotencia y contrapresión."""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import sincronizacion
+from colector_local import AlmacenColector, crear_servidor
+from sincronizacion import BandejaSalida, Sincronizador, enviar_lote
+
+SIN_COLECTOR = "http://127.0.0.1:9/eventos"  # Puerto discard: el envío falla enseguida
+
+def filas_en_disco(ruta):
+    """Eventos en la bandeja vistos desde otra conexión (lo que sobreviviría a un corte)."""
+    with sqlite3.connect(ruta) as conexion:
+        return conexion.execute("SELECT COUNT(*) FROM bandeja").fetchone()[0]
+
+def esperar(condicion, limite=3.0):
+    fin = time.monotonic() + limite
+    while not condicion():
+        if time.monotonic() > fin:
+            return False
+        time.sleep(0.01)
+    return True
+
+@pytest.fixture
+def colector(directorio):
+    almacen = AlmacenColector(str(directorio / "colector.db"))
+    servidor = crear_servidor(almacen, ('127.0.0.1', 0))
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield almacen, f"http://127.0.0.1:{servidor.server_address[1]}/eventos"
+    servidor.shutdown()
+    servidor.server_close()
+    almacen.cerrar()
+
+def test_evento_llega_a_disco_sin_esperar_al_envio(directorio):
+    ruta = str(directorio / "bandeja.db")
+    # Un intervalo de envío enorme: si el evento llega a disco no es gracias al hilo de envío
+    sincronizador = Sincronizador(SIN_COLECTOR, "puerta-1", ruta, intervalo=3600, imprimir=lambda _: None)
+    sincronizador.iniciar()
+    try:
+        inicio = time.monotonic()
+        sincronizador.encolar('acceso', {'timestamp': 1760700000, 'matricula': "S1"})
+        assert esperar(lambda: filas_en_disco(ruta) == 1)
+        assert time.monotonic() - inicio < 1.0
+    finally:
+        sincronizador.detener()
+    assert filas_en_disco(ruta) == 1  # Sin colector: sigue pendiente para el próximo arranque
+
+def test_guardar_dos_veces_el_mismo_evento_no_lo_duplica(directorio):
+    bandeja = BandejaSalida(str(directorio / "bandeja.db"))
+    eventos = [{'id': "a", 'tipo': 'acceso'}, {'id': "b", 'tipo': 'acceso'}]
+    bandeja.guardar(eventos)
+    bandeja.guardar(eventos)
+    assert len(bandeja) == 2
+    bandeja.confirmar(bandeja.pendientes()[0][0])
+    assert len(bandeja) == 1 == filas_en_disco(bandeja.ruta)
+    bandeja.cerrar()
+
+def test_lote_reenviado_no_duplica_en_el_colector(colector):
+    almacen, url = colector
+    eventos = [{'id': f"e{i}", 'tipo': 'acceso', 'timestamp': 1760700000 + i} for i in range(3)]
+    assert enviar_lote(url, "puerta-1", eventos) == {'aceptados': 3, 'duplicados': 0}
+    # Reintento tras perder la respuesta: mismos IDs
+    assert enviar_lote(url, "puerta-1", eventos) == {'aceptados': 0, 'duplicados': 3}
+    assert almacen.resumen() == [{'dispositivo': "puerta-1", 'tipo': 'acceso', 'eventos': 3}]
+
+def test_envia_y_vacia_la_bandeja(colector):
+    almacen, url = colector
+    sincronizador = Sincronizador(url, "puerta-1", "bandeja.db", max_lote=4, intervalo=0.05)
+    sincronizador.iniciar()
+    try:
+        for i in range(10):
+            sincronizador.encolar('acceso', {'timestamp': 1760700000 + i})
+        assert esperar(lambda: sincronizador.enviados == 10)
+        assert len(sincronizador.bandeja) == 0
+    finally:
+        sincronizador.detener()
+    assert almacen.resumen()[0]['eventos'] == 10
+
+def test_bandeja_llena_descarta_contando_y_avisando(directorio, monkeypatch):
+    monkeypatch.setattr(sincronizacion, 'MAX_PENDIENTES', 3)
+    avisos = []
+    sincronizador = Sincronizador(SIN_COLECTOR, "puerta-1", "bandeja.db", imprimir=avisos.append)
+    ids = [sincronizador.encolar('acceso', {'timestamp': 1760700000 + i}) for i in range(5)]
+    sincronizador.volcar()
+    assert len(sincronizador.bandeja) == 3 and sincronizador.descartados == 2
+    assert [evento['id'] for _, evento in sincronizador.bandeja.pendientes()] == ids[:3]  # Los más antiguos
+
+    # También lo que queda al detener con la bandeja llena
+    sincronizador.encolar('acceso', {'timestamp': 1760700010})
+    sincronizador.detener()
+    assert sincronizador.descartados == 3
+    assert len(avisos) == 1 and "3 en total" in avisos[0] and "bandeja de salida llena" in avisos[0]
+
+def test_cola_en_memoria_llena_descarta_contando(directorio, monkeypatch):
+    monkeypatch.setattr(sincronizacion, 'MAX_MEMORIA', 2)
+    avisos = []
+    sincronizador = Sincronizador(SIN_COLECTOR, "puerta-1", "bandeja.db", imprimir=avisos.append)
+    resultados = [sincronizador.encolar('acceso', {'timestamp': 1760700000 + i}) for i in range(4)]
+    assert resultados[2:] == [None, None] and sincronizador.descartados == 2
+    sincronizador.detener()
+    assert filas_en_disco("bandeja.db") == 2
+    assert "2 por cola en memoria llena" in avisos[0]
+
+def test_error_de_la_bandeja_devuelve_los_eventos_a_la_memoria(directorio):
+    sincronizador = Sincronizador(SIN_COLECTOR, "puerta-1", "bandeja.db", imprimir=lambda _: None)
+    sincronizador.encolar('acceso', {'timestamp': 1760700000})
+
+    def fallar(eventos):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    sincronizador.bandeja.guardar = fallar
+    with pytest.raises(sqlite3.OperationalError):
+        sincronizador.volcar()
+    assert len(sincronizador._memoria) == 1
+    del sincronizador.bandeja.guardar  # Disco recuperado
+    sincronizador.detener()
+    assert filas_en_disco("bandeja.db") == 1